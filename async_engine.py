@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# --- Configuration ---
+DEFAULT_MAX_WORKERS = 64      # Threads available for blocking file operations
+DEFAULT_PER_DEST_LIMIT = 16   # Outstanding operations allowed per destination
+
+
+class AsyncSyncEngine:
+    """Runs file operations for every task on one shared asyncio event loop.
+
+    Blocking calls (``shutil``/``os``) are offloaded to a thread pool while the
+    loop keeps a bounded number of them in flight per destination. Operations
+    are tracked per task so stopping a task cancels everything it still has
+    queued. Operations that are already running in the pool finish normally.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, per_dest_limit=DEFAULT_PER_DEST_LIMIT):
+        self.max_workers = max_workers
+        self.per_dest_limit = per_dest_limit
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+        # The following are only touched from the loop thread
+        self._dest_limits = {}   # dest_root -> asyncio.Semaphore
+        self._task_ops = {}      # task_id -> set of asyncio.Task
+        self._path_tails = {}    # (dest_root, relative_path) -> last asyncio.Task for that path
+        self._path_subtree = {}  # (dest_root, relative_path) -> asyncio.Tasks pending on paths below it
+
+    # --- Lifecycle ---
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="SyncIO")
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="AsyncSyncEngine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            logging.info(f"Async sync engine started ({self.max_workers} workers, {self.per_dest_limit} ops per destination).")
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self._loop)
+            for op in pending:
+                op.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def shutdown(self, timeout=5):
+        with self._lock:
+            if not self.is_running():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logging.warning("Async sync engine loop did not stop within timeout.")
+            self._executor.shutdown(wait=False)
+            self._thread = None
+            logging.info("Async sync engine stopped.")
+
+    # --- Thread-safe API ---
+
+    def submit(self, task_id, dest_root, func, *args, key=None, limit=None):
+        """Schedules ``func(*args)`` for a task against one destination.
+
+        Operations sharing a ``key`` (normally the relative path) run in the
+        order they were submitted, and an operation also waits for pending
+        operations on any parent path and on any path below its own (so a
+        directory delete runs after the copies into it). ``limit`` sets the destination's
+        concurrency the first time it is seen. Returns a ``concurrent.futures.Future``.
+        """
+        if not self.is_running():
+            self.start()
+        coro = self._run_op(task_id, dest_root, key, func, args, limit)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def cancel_task(self, task_id):
+        """Cancels all queued operations of a task."""
+        if self.is_running():
+            # Deferred one turn: operations submitted just before have not registered yet
+            # (their first step is scheduled behind this callback)
+            self._loop.call_soon_threadsafe(self._loop.call_soon, self._cancel_task_ops, task_id)
+
+    def run_initial_sync(self, task_id, source_root, dest_roots, copy_function=shutil.copy2, ignore=None, workers=None):
+        """Copies the source tree into every destination concurrently.
+
+        Returns a future resolving to ``{dest_root: [(src, dst, error), ...]}``.
+        """
+        if not self.is_running():
+            self.start()
+        coro = self._track(task_id, self._initial_sync(task_id, source_root, dest_roots, copy_function, ignore,
+                                                       workers or self.per_dest_limit))
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def wait(self, future, stop_event, task_id, poll_interval=0.5):
+        """Blocks on ``future`` until done, cancelling the task's work if ``stop_event`` is set.
+
+        Returns the future's result, or ``None`` if the task was stopped.
+        """
+        while True:
+            if stop_event.is_set():
+                self.cancel_task(task_id)
+                future.cancel()
+                return None
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeoutError:
+                continue
+
+    # --- Loop-side helpers ---
+
+    def _limit_for(self, dest_root, size=None):
+        limit = self._dest_limits.get(dest_root)
+        if limit is None:
+            limit = asyncio.Semaphore(size or self.per_dest_limit)
+            self._dest_limits[dest_root] = limit
+        return limit
+
+    def _cancel_task_ops(self, task_id):
+        ops = self._task_ops.get(task_id)
+        if ops:
+            logging.info(f"[Task {task_id}] Cancelling {len(ops)} queued operation(s).")
+            for op in list(ops):
+                op.cancel()
+
+    async def _track(self, task_id, coro):
+        current = asyncio.current_task()
+        self._task_ops.setdefault(task_id, set()).add(current)
+        try:
+            return await coro
+        finally:
+            ops = self._task_ops.get(task_id)
+            if ops is not None:
+                ops.discard(current)
+                if not ops:
+                    del self._task_ops[task_id]
+
+    async def _run_op(self, task_id, dest_root, key, func, args, limit=None):
+        current = asyncio.current_task()
+        waits = []
+        parents = []
+        if key is not None:
+            # Registration happens before the first await, so submission order is kept
+            waits.extend(op for op in self._path_subtree.get((dest_root, key), ()) if not op.done())
+            path = key
+            while True:
+                prior = self._path_tails.get((dest_root, path))
+                if prior is not None and not prior.done():
+                    waits.append(prior)
+                parent = os.path.dirname(path)
+                if not parent or parent == path:
+                    break
+                path = parent
+                parents.append((dest_root, path))
+            self._path_tails[(dest_root, key)] = current
+            for parent_key in parents:
+                self._path_subtree.setdefault(parent_key, set()).add(current)
+
+        async def op():
+            if waits:
+                # asyncio.wait (unlike gather) never cancels the operations it waits on
+                await asyncio.wait(waits)
+            async with self._limit_for(dest_root, limit):
+                return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+        try:
+            return await self._track(task_id, op())
+        finally:
+            if key is not None and self._path_tails.get((dest_root, key)) is current:
+                del self._path_tails[(dest_root, key)]
+            for parent_key in parents:
+                below = self._path_subtree[parent_key]
+                below.discard(current)
+                if not below:
+                    del self._path_subtree[parent_key]
+
+    async def _initial_sync(self, task_id, source_root, dest_roots, copy_function, ignore, workers):
+        loop = asyncio.get_running_loop()
+        dirs, files = await loop.run_in_executor(None, _walk_tree, source_root, ignore)
+        logging.info(f"[Task {task_id}] Async initial sync: {len(dirs)} directories, {len(files)} files.")
+        results = await asyncio.gather(*[
+            self._sync_tree_to(dest_root, source_root, dirs, files, copy_function, workers) for dest_root in dest_roots
+        ])
+        return dict(zip(dest_roots, results))
+
+    async def _sync_tree_to(self, dest_root, source_root, dirs, files, copy_function, workers):
+        loop = asyncio.get_running_loop()
+        errors = []
+        limit = self._limit_for(dest_root, workers)
+
+        def make_dirs():
+            os.makedirs(dest_root, exist_ok=True)
+            for rel_dir in dirs:
+                os.makedirs(os.path.join(dest_root, rel_dir), exist_ok=True)
+
+        try:
+            await loop.run_in_executor(None, make_dirs)
+        except OSError as e:
+            return [(source_root, dest_root, str(e))]
+
+        pending = iter(files)
+
+        async def copy_worker():
+            for rel_file in pending:
+                src = os.path.join(source_root, rel_file)
+                dst = os.path.join(dest_root, rel_file)
+                async with limit:
+                    try:
+                        await loop.run_in_executor(None, copy_function, src, dst)
+                    except OSError as e:
+                        errors.append((src, dst, str(e)))
+
+        await asyncio.gather(*[copy_worker() for _ in range(workers)])
+        for stat_src, stat_dst in [(os.path.join(source_root, d), os.path.join(dest_root, d)) for d in reversed(dirs)]:
+            try:
+                shutil.copystat(stat_src, stat_dst)
+            except OSError:
+                pass
+        return errors
+
+
+def _walk_tree(source_root, ignore=None):
+    """Lists directories and files under ``source_root`` as relative paths, parents first."""
+    dirs, files = [], []
+    for root, dir_names, file_names in os.walk(source_root):
+        if ignore is not None:
+            ignored = ignore(root, dir_names + file_names)
+            dir_names[:] = [d for d in dir_names if d not in ignored]
+            file_names = [f for f in file_names if f not in ignored]
+        rel_root = os.path.relpath(root, source_root)
+        for d in dir_names:
+            dirs.append(os.path.normpath(os.path.join(rel_root, d)))
+        for f in file_names:
+            files.append(os.path.normpath(os.path.join(rel_root, f)))
+    return dirs, files
+
+
+# --- Shared Engine ---
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Returns the process-wide engine, starting it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncSyncEngine()
+        if not _engine.is_running():
+            _engine.start()
+        return _engine
+
+def running_engine():
+    """Returns the process-wide engine if it is running, else None; never starts it."""
+    with _engine_lock:
+        if _engine is not None and _engine.is_running():
+            return _engine
+        return None
+
+def shutdown_engine():
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
@@ -0,0 +1,379 @@
+import os
+import json
+import time
+import stat
+import logging
+import threading
+from watchdog.events import FileSystemEventHandler
+from path_store import PathStore, ROOT_ID, relative_to_root
+from planner import TreeIndex, ABSENT, FILE, DIRECTORY, MTIME_TOLERANCE_NS
+from event_queue import SpillingEventQueue
+from snapshots import RESERVED_NAMES
+from config_store import atomic_write_json
+
+# --- Configuration ---
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".syncapp", "two_way")
+STATE_SAVE_INTERVAL = 30.0       # Seconds between saves of changed state indexes while running
+CONFLICT_POLICIES = ("newer_wins", "source_wins", "keep_both")
+SIDE_NAMES = ("source", "dest")
+TEMP_SUFFIX = ".synctmp"         # Files being written by atomic_copy; never synced
+
+
+def _stat_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ABSENT, 0, 0
+    if stat.S_ISDIR(st.st_mode):
+        return DIRECTORY, 0, 0
+    return FILE, st.st_size, st.st_mtime_ns
+
+def _unchanged(old, current):
+    """Whether a side still is as it was at the last sync (directories compare by kind only)."""
+    return old[0] == current[0] and (old[0] != FILE or old[1:] == current[1:])
+
+def _same_content(a, b):
+    return a[0] == b[0] and (a[0] != FILE or (a[1] == b[1] and abs(a[2] - b[2]) <= MTIME_TOLERANCE_NS))
+
+def conflict_name(relative_path, side):
+    base, ext = os.path.splitext(relative_path)
+    return f"{base}.conflict-{SIDE_NAMES[side]}-{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+
+
+class TwoWaySync(threading.Thread):
+    """Keeps a source and one destination in sync in both directions.
+
+    For each side it keeps an index of every path as it was after the last
+    sync (kind, size, mtime), so comparing a path's current state with the
+    index tells which side changed it. A change on one side is copied to the
+    other; the index is then updated with the state of both copies, so the
+    events caused by our own write find nothing new and are dropped (echo
+    suppression). Paths changed on both sides are conflicts, resolved by
+    ``policy``: ``newer_wins``, ``source_wins`` or ``keep_both`` (the older
+    version is kept on both sides under a ``.conflict-<side>-<time>`` name).
+    A file on one side against a directory on the other is always kept both
+    ways: the file is the one renamed. An edit always wins over a delete. Side 0 is the source, side 1 the
+    destination.
+    """
+
+    def __init__(self, task_id, source_root, dest_root, copy_function, remove_function,
+                 policy="newer_wins", excluded=None, state_dir=STATE_DIR):
+        super().__init__(name=f"SyncTwoWay-{task_id}", daemon=True)
+        self.task_id = task_id
+        self.roots = (os.path.abspath(source_root), os.path.abspath(dest_root))
+        self.copy_function = copy_function        # Must write atomically (temp file and rename)
+        self.remove_function = remove_function    # remove_function(root, relative_path)
+        self.policy = policy if policy in CONFLICT_POLICIES else CONFLICT_POLICIES[0]
+        self.excluded = excluded
+        self.state_path = os.path.join(state_dir, f"{task_id}.json")
+        self.log_prefix = f"[Task {task_id}] "
+        self.paths = PathStore()
+        self.synced = (TreeIndex(self.paths), TreeIndex(self.paths))
+        self.queue = SpillingEventQueue()
+        self.stability = None # StabilityTracker set by the task runtime
+        self.checked = self.echoes = self.copied = self.deleted = self.moved = self.conflicts = 0
+        self._dirty = False
+        self._stopping = threading.Event()
+
+    def __len__(self):
+        return len(self.queue)
+
+    # --- State Indexes ---
+
+    def load_state(self):
+        """Loads the indexes of the last run; returns False when there are none for these roots."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning(f"{self.log_prefix}Two-way: ignoring unreadable state {self.state_path}: {e}")
+            return False
+        if data.get("roots") != list(self.roots):
+            logging.info(f"{self.log_prefix}Two-way: saved state is for other folders; starting fresh.")
+            return False
+        for rel_path, *states in data.get("entries", []):
+            path_id = self.paths.add(rel_path)
+            for side in (0, 1):
+                self.synced[side].set_entry(path_id, *states[side * 3:side * 3 + 3])
+        return True
+
+    def save_state(self):
+        entries = []
+        live = bytearray(len(self.paths)) # Entries under a deleted directory are dropped
+        live[ROOT_ID] = 1
+        for path_id in range(1, len(self.paths)):
+            a, b = self.synced[0].entry(path_id), self.synced[1].entry(path_id)
+            if live[self.paths.parent(path_id)] and (a[0] or b[0]):
+                live[path_id] = 1
+                entries.append([self.paths.path(path_id), *a, *b])
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            atomic_write_json(self.state_path, {"roots": list(self.roots), "entries": entries})
+            self._dirty = False
+        except OSError as e:
+            logging.error(f"{self.log_prefix}Two-way: could not save state: {e}")
+
+    def _record(self, path_id, side, state):
+        self.synced[side].set_entry(path_id, *state)
+        self._dirty = True
+
+    def _record_ancestors(self, path_id):
+        # Parent directories made while copying are in sync too
+        parent = self.paths.parent(path_id)
+        while parent != ROOT_ID:
+            for side in (0, 1):
+                if self.synced[side].kind(parent) != DIRECTORY:
+                    self._record(parent, side, (DIRECTORY, 0, 0))
+            parent = self.paths.parent(parent)
+
+    # --- Reconciliation ---
+
+    def reconcile(self, relative_path="", stop_event=None):
+        """Compares both sides under ``relative_path`` with the indexes and syncs what changed.
+
+        Returns False if ``stop_event`` was set before it finished.
+        """
+        start_id = self.paths.add(relative_path)
+        current = (TreeIndex(self.paths), TreeIndex(self.paths))
+        for side in (0, 1):
+            state = _stat_state(os.path.join(self.roots[side], relative_path) if relative_path else self.roots[side])
+            current[side].set_entry(start_id, *state)
+            if state[0] == DIRECTORY:
+                current[side].scan(self.roots[side], self._is_excluded, RESERVED_NAMES, start=relative_path)
+        deleted_dirs = set()
+        for path_id in range(start_id if relative_path else 1, len(self.paths)):
+            if stop_event is not None and stop_event.is_set():
+                return False
+            if relative_path and path_id != start_id and not self._is_under(path_id, start_id):
+                continue
+            if self.paths.parent(path_id) in deleted_dirs:
+                # Went with its deleted parent
+                if self.synced[0].kind(path_id) or self.synced[1].kind(path_id):
+                    self._record(path_id, 0, (ABSENT, 0, 0))
+                    self._record(path_id, 1, (ABSENT, 0, 0))
+                deleted_dirs.add(path_id)
+                continue
+            states = [current[0].entry(path_id), current[1].entry(path_id)]
+            if self._decide(path_id, states, current) == "deleted_dir":
+                deleted_dirs.add(path_id)
+        return True
+
+    def check(self, relative_path):
+        """Syncs one path after an event on either side."""
+        self.checked += 1
+        path_id = self.paths.add(relative_path)
+        states = [_stat_state(os.path.join(root, relative_path)) for root in self.roots]
+        if DIRECTORY in (states[0][0], states[1][0], self.synced[0].kind(path_id), self.synced[1].kind(path_id)):
+            self.reconcile(relative_path) # Created, moved in or deleted directories bring their contents
+        elif self._decide(path_id, states) is None:
+            self.echoes += 1
+
+    def move(self, old_path, new_path):
+        """Repeats a rename from one side on the other when that side still has the old item unchanged."""
+        old_id, new_id = self.paths.add(old_path), self.paths.add(new_path)
+        old = [_stat_state(os.path.join(root, old_path)) for root in self.roots]
+        new = [_stat_state(os.path.join(root, new_path)) for root in self.roots]
+        for side in (0, 1):
+            other = 1 - side
+            before = self.synced[side].entry(old_id)
+            if (old[side][0] == ABSENT and before[0] != ABSENT and _unchanged(before, new[side])
+                    and before[0] == new[side][0] and _unchanged(self.synced[other].entry(old_id), old[other])
+                    and new[other][0] == ABSENT):
+                target = os.path.join(self.roots[other], new_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(os.path.join(self.roots[other], old_path), target)
+                logging.info(f"{self.log_prefix}Two-way: renamed {old_path} -> {new_path} on {SIDE_NAMES[other]}")
+                self.moved += 1
+                self.reconcile(old_path)
+                self.reconcile(new_path)
+                return
+        self.check(old_path)
+        self.check(new_path)
+
+    def _decide(self, path_id, states, current=None):
+        """Syncs one path given the current state of both sides; returns what was done, or None."""
+        old = [self.synced[0].entry(path_id), self.synced[1].entry(path_id)]
+        changed = [not _unchanged(old[side], states[side]) for side in (0, 1)]
+        if not any(changed):
+            return None
+        relative_path = self.paths.path(path_id)
+        if changed[0] and changed[1]:
+            if _same_content(states[0], states[1]):
+                # Same change on both sides (or our own copy seen from the other side)
+                self._record(path_id, 0, states[0])
+                self._record(path_id, 1, states[1])
+                return "recorded"
+            if ABSENT in (states[0][0], states[1][0]):
+                winner = 0 if states[1][0] == ABSENT else 1 # An edit wins over a delete
+            else:
+                return self._resolve_conflict(path_id, relative_path, states)
+        else:
+            winner = 0 if changed[0] else 1
+        loser = 1 - winner
+        if (states[winner][0] == ABSENT and states[loser][0] == DIRECTORY
+                and self._subtree_changed(loser, path_id, relative_path, current)):
+            # Deleted on one side while something inside changed on the other: keep the directory
+            winner, loser = loser, winner
+        return self._propagate(path_id, relative_path, winner, states)
+
+    def _subtree_changed(self, side, path_id, relative_path, current):
+        if current is None:
+            current = (TreeIndex(self.paths), TreeIndex(self.paths))
+            current[side].scan(self.roots[side], self._is_excluded, RESERVED_NAMES, start=relative_path)
+        for child_id in range(path_id + 1, len(self.paths)):
+            if self._is_under(child_id, path_id) and not _unchanged(self.synced[side].entry(child_id),
+                                                                      current[side].entry(child_id)):
+                return True
+        return False
+
+    def _propagate(self, path_id, relative_path, source_side, states):
+        """Makes the other side match ``source_side`` for one path."""
+        target_side = 1 - source_side
+        source = os.path.join(self.roots[source_side], relative_path)
+        target = os.path.join(self.roots[target_side], relative_path)
+        kind = states[source_side][0]
+        result = "copied"
+        if kind == ABSENT:
+            if os.path.lexists(target):
+                self.remove_function(self.roots[target_side], relative_path)
+                self.deleted += 1
+                logging.info(f"{self.log_prefix}Two-way: deleted {relative_path} on {SIDE_NAMES[target_side]}")
+            result = "deleted_dir" if states[target_side][0] == DIRECTORY else "deleted"
+        else:
+            if states[target_side][0] not in (ABSENT, kind):
+                self.remove_function(self.roots[target_side], relative_path)
+            if kind == DIRECTORY:
+                os.makedirs(target, exist_ok=True)
+                result = "mkdir"
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                self.copy_function(source, target)
+                self.copied += 1
+                logging.info(f"{self.log_prefix}Two-way: copied {relative_path} to {SIDE_NAMES[target_side]}")
+            self._record_ancestors(path_id)
+        self._record(path_id, source_side, states[source_side])
+        self._record(path_id, target_side, _stat_state(target))
+        return result
+
+    def _resolve_conflict(self, path_id, relative_path, states):
+        self.conflicts += 1
+        keep_both = self.policy == "keep_both"
+        if states[0][0] != states[1][0]:
+            # A file on one side, a directory on the other: there is no newer version to pick (directories
+            # carry no mtime here) and dropping either could lose a whole tree, so the file moves aside
+            winner = 0 if states[0][0] == DIRECTORY else 1
+            keep_both = True
+            logging.warning(f"{self.log_prefix}Two-way: conflict on {relative_path} (a file on the "
+                            f"{SIDE_NAMES[1 - winner]}, a directory on the {SIDE_NAMES[winner]}); both are kept, "
+                            f"resolve it by hand")
+        else:
+            if self.policy == "source_wins":
+                winner = 0
+            else:
+                winner = 1 if states[1][2] > states[0][2] else 0
+            logging.warning(f"{self.log_prefix}Two-way: conflict on {relative_path} (changed on both sides); "
+                            f"{self.policy} keeps the {SIDE_NAMES[winner]} version")
+        loser = 1 - winner
+        if keep_both:
+            kept = conflict_name(relative_path, loser)
+            os.replace(os.path.join(self.roots[loser], relative_path), os.path.join(self.roots[loser], kept))
+            logging.info(f"{self.log_prefix}Two-way: {SIDE_NAMES[loser]} version kept as {kept}")
+            states = list(states)
+            states[loser] = (ABSENT, 0, 0)
+            self.reconcile(kept) # Copies the kept version to the winner's side
+        return self._propagate(path_id, relative_path, winner, states)
+
+    # --- Helpers ---
+
+    def _is_under(self, path_id, ancestor_id):
+        while path_id != ROOT_ID:
+            path_id = self.paths.parent(path_id)
+            if path_id == ancestor_id:
+                return True
+        return ancestor_id == ROOT_ID
+
+    def _is_excluded(self, relative_path, is_dir=False):
+        if os.path.basename(relative_path).endswith(TEMP_SUFFIX):
+            return True
+        return bool(self.excluded and self.excluded(relative_path, is_dir))
+
+    # --- Worker ---
+
+    def notify(self, relative_path):
+        self.queue.put(relative_path, "check")
+
+    def notify_move(self, old_path, new_path):
+        self.queue.put(old_path, "move", new_path)
+        self.queue.put(new_path, "check")
+
+    def stop(self):
+        self._stopping.set()
+        self.queue.close()
+
+    def run(self):
+        last_save = time.monotonic()
+        while not self._stopping.is_set():
+            item = self.queue.get(timeout=1.0)
+            if item is not None:
+                relative_path, op, new_path = item
+                try:
+                    if op == "move":
+                        self.move(relative_path, new_path)
+                    else:
+                        self.check(relative_path)
+                except OSError as e:
+                    logging.error(f"{self.log_prefix}Two-way: could not sync {relative_path}: {e}")
+            if self._dirty and time.monotonic() - last_save >= STATE_SAVE_INTERVAL:
+                self.save_state()
+                last_save = time.monotonic()
+        self.save_state()
+        logging.info(f"{self.log_prefix}Two-way: stopped ({self.checked} checks, {self.echoes} echoes suppressed, "
+                     f"{self.copied} copied, {self.deleted} deleted, {self.moved} renamed, {self.conflicts} conflicts).")
+
+
+class TwoWayEventHandler(FileSystemEventHandler):
+    """Feeds the events of one side of a two-way task to its ``TwoWaySync``."""
+
+    def __init__(self, sync, side):
+        super().__init__()
+        self.sync = sync
+        self.side = side
+        self.root_prefix = sync.roots[side] + os.sep
+        self.event_count = 0
+
+    def _relative(self, path, is_dir):
+        relative_path = relative_to_root(os.path.normpath(path), self.root_prefix) if path else None
+        if not relative_path or relative_path == ".":
+            return None
+        if relative_path.split(os.sep, 1)[0] in RESERVED_NAMES or self.sync._is_excluded(relative_path, is_dir):
+            return None
+        return relative_path
+
+    def on_any_event(self, event):
+        if event.event_type not in ("created", "modified", "deleted", "moved", "closed"):
+            return
+        if event.is_directory and event.event_type == "modified":
+            return
+        self.event_count += 1
+        relative_path = self._relative(event.src_path, event.is_directory)
+        stability = self.sync.stability
+        if event.event_type == "moved":
+            new_path = self._relative(event.dest_path, event.is_directory)
+            if relative_path and new_path:
+                self.sync.notify_move(relative_path, new_path)
+            elif relative_path or new_path:
+                self.sync.notify(relative_path or new_path) # A temp file renamed into place, or moved in/out
+        elif relative_path is None:
+            return
+        elif event.event_type == "closed":
+            if stability is not None:
+                stability.closed((self.side, relative_path), event.src_path)
+        elif stability is not None and event.event_type in ("created", "modified") and not event.is_directory:
+            # Still being written; the tracker hands it over once closed or settled
+            stability.hold((self.side, relative_path), event.src_path)
+        else:
+            if stability is not None:
+                stability.forget((self.side, relative_path))
+            self.sync.notify(relative_path)
@@ -0,0 +1,253 @@
+import os
+import json
+import copy
+import fnmatch
+import logging
+import threading
+
+# --- Configuration ---
+SCHEMA_VERSION = 2
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_LIMIT = 500 # Journal entries replayed into a fresh snapshot once exceeded
+REMOTE_PREFIX = "sync://"    # Destinations served by a sync agent (remote_transport.URL_SCHEME)
+
+# Per-task tuning fields and their defaults. Older configs get these filled in on load.
+# Behaviour that changes how files are copied or deleted is off unless the task opts in.
+TASK_DEFAULTS = {
+    "engine": "thread",        # "thread" or "async"
+    "mode": "one_way",         # "one_way", or "two_way" (exactly one destination, changes flow both ways)
+    "conflict_policy": "newer_wins", # Two-way edits on both sides: "newer_wins", "source_wins" or "keep_both"
+    "watcher": "native",       # "native" (watchdog) or "scan" (snapshot scanning for network shares)
+    "workers": 0,              # Concurrent file ops per destination (async engine); 0 = engine default
+    "throttle_mbps": 0.0,      # Copy bandwidth cap per task in MB/s; 0 = unlimited
+    "filters": {"include": [], "exclude": []}, # Glob patterns matched against relative paths
+    "trash_retention_hours": 0.0, # Deleted items wait this long in the destination's trash; 0 = delete at once
+    "versions_keep": 0,        # Hardlinked snapshots kept per destination; 0 = no versioning
+    "version_interval_minutes": 60, # Minimum time between snapshots of a changed destination
+    "large_file_threshold_mb": 0, # Files this big are copied in parallel ranges; 0 = never
+    "large_file_verify": "sample",  # Check of chunked copies: "none", "sample" (read-back) or "hash"
+    "stable_seconds": 0.0,     # Hold written files until closed or unchanged this long; 0 = copy on every event
+    "append_tail": False,      # Copy only the new tail of files that grew by appending (off while versioning)
+    "mirror_deletes": False,   # Initial sync removes destination items that are not in the source
+}
+PERSISTED_FIELDS = ("source", "dests") + tuple(TASK_DEFAULTS)
+
+
+def normalize_task(task):
+    """Returns the persisted fields of a task with defaults filled in and types checked."""
+    normalized = {"source": task["source"], "dests": list(task["dests"])}
+    for field, default in TASK_DEFAULTS.items():
+        value = task.get(field, default)
+        normalized[field] = copy.deepcopy(value if value is not None else default)
+    try:
+        normalized["workers"] = max(0, int(normalized["workers"]))
+    except (TypeError, ValueError):
+        normalized["workers"] = TASK_DEFAULTS["workers"]
+    try:
+        normalized["throttle_mbps"] = max(0.0, float(normalized["throttle_mbps"]))
+    except (TypeError, ValueError):
+        normalized["throttle_mbps"] = TASK_DEFAULTS["throttle_mbps"]
+    for field in ("versions_keep", "version_interval_minutes", "large_file_threshold_mb"):
+        try:
+            normalized[field] = max(0, int(normalized[field]))
+        except (TypeError, ValueError):
+            normalized[field] = TASK_DEFAULTS[field]
+    if normalized["mode"] not in ("one_way", "two_way"):
+        normalized["mode"] = TASK_DEFAULTS["mode"]
+    if normalized["conflict_policy"] not in ("newer_wins", "source_wins", "keep_both"):
+        normalized["conflict_policy"] = TASK_DEFAULTS["conflict_policy"]
+    if normalized["large_file_verify"] not in ("none", "sample", "hash"):
+        normalized["large_file_verify"] = TASK_DEFAULTS["large_file_verify"]
+    for field in ("trash_retention_hours", "stable_seconds"):
+        try:
+            normalized[field] = max(0.0, float(normalized[field]))
+        except (TypeError, ValueError):
+            normalized[field] = TASK_DEFAULTS[field]
+    normalized["append_tail"] = bool(normalized["append_tail"])
+    normalized["mirror_deletes"] = bool(normalized["mirror_deletes"])
+    filters = normalized["filters"] if isinstance(normalized["filters"], dict) else {}
+    normalized["filters"] = {"include": list(filters.get("include", [])), "exclude": list(filters.get("exclude", []))}
+    return normalized
+
+
+def path_is_excluded(relative_path, filters, is_dir=False):
+    """Checks a relative path against a task's include/exclude glob patterns.
+
+    Exclude patterns match the whole relative path or any single component.
+    Include patterns (if any) must match the path or file name; they never
+    apply to directories, so traversal still reaches matching files.
+    """
+    if not filters or relative_path in (None, "."):
+        return False
+    exclude = filters.get("exclude")
+    include = filters.get("include")
+    if not exclude and not include:
+        return False
+    posix_path = relative_path.replace(os.sep, "/")
+    if exclude:
+        parts = posix_path.split("/")
+        for pattern in exclude:
+            if fnmatch.fnmatch(posix_path, pattern) or any(fnmatch.fnmatch(part, pattern) for part in parts):
+                return True
+    if include and not is_dir:
+        name = posix_path.rsplit("/", 1)[-1]
+        return not any(fnmatch.fnmatch(posix_path, p) or fnmatch.fnmatch(name, p) for p in include)
+    return False
+
+def is_remote(dest_root):
+    """Checks for a sync agent destination without loading remote_transport (the agent keeps its own copy)."""
+    return isinstance(dest_root, str) and dest_root.startswith(REMOTE_PREFIX)
+
+def _migrate(data):
+    """Upgrades a loaded snapshot to the current schema and returns its task dict."""
+    if not isinstance(data, dict):
+        raise ValueError("config root is not an object")
+    version = data.get("schema_version", 1) if "tasks" in data else 1
+    if version == 1:
+        # v1: a flat {task_id: {"source", "dests"}} mapping
+        data = {"schema_version": 2, "tasks": data}
+        version = 2
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"config schema {version} is newer than supported ({SCHEMA_VERSION})")
+    tasks = {}
+    for task_id, task in data["tasks"].items():
+        try:
+            tasks[task_id] = normalize_task(task)
+        except (KeyError, TypeError) as e:
+            logging.warning(f"Skipping invalid task {task_id} in config: {e}")
+    return tasks
+
+
+def atomic_write_json(path, data, indent=None):
+    """Writes JSON to a temp file in the same directory, fsyncs it and renames it over ``path``."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ConfigStore:
+    """Task configuration kept as a JSON snapshot plus an append-only journal.
+
+    Adding or removing a task appends one journal line instead of rewriting
+    the whole file. Once the journal grows past ``journal_limit`` entries it
+    is folded into a new snapshot, which is written to a temp file and
+    renamed into place. A crash can only lose the last, partially written
+    journal line, and that line is skipped on load.
+    """
+
+    def __init__(self, path, legacy_paths=(), journal_limit=JOURNAL_COMPACT_LIMIT):
+        self.path = os.path.abspath(path)
+        self.journal_path = self.path + JOURNAL_SUFFIX
+        self.legacy_paths = [os.path.abspath(p) for p in legacy_paths if os.path.abspath(p) != self.path]
+        self.journal_limit = journal_limit
+        self._tasks = {}
+        self._journal_entries = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Reads the snapshot and replays the journal. Returns ``{task_id: task}``."""
+        with self._lock:
+            self._tasks = {}
+            migrated = False
+            source = self.path
+            if not os.path.exists(source):
+                source = next((p for p in self.legacy_paths if os.path.exists(p)), None)
+                if source:
+                    logging.info(f"Migrating config from legacy location {source} to {self.path}")
+            if source:
+                try:
+                    with open(source, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    migrated = not isinstance(data, dict) or data.get("schema_version") != SCHEMA_VERSION
+                    self._tasks = _migrate(data)
+                except (json.JSONDecodeError, ValueError, IOError) as e:
+                    logging.error(f"Error loading {source}: {e}. Starting fresh.")
+            else:
+                logging.info(f"Config file {self.path} not found. Starting fresh.")
+            self._journal_entries = self._replay_journal()
+            if source != self.path or migrated or self._journal_entries > self.journal_limit:
+                self._write_snapshot()
+            logging.info(f"Loaded {len(self._tasks)} tasks from {self.path}")
+            return copy.deepcopy(self._tasks)
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        entries = 0
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # Drop a torn last write so later appends start on a clean line
+            logging.warning(f"Discarding incomplete last entry in {self.journal_path}")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(complete)
+        for line_no, line in enumerate(data[:complete].splitlines(), 1):
+            try:
+                entry = json.loads(line)
+                if entry["op"] == "put":
+                    self._tasks[entry["id"]] = normalize_task(entry["task"])
+                elif entry["op"] == "delete":
+                    self._tasks.pop(entry["id"], None)
+                elif entry["op"] == "clear":
+                    self._tasks.clear()
+                entries += 1
+            except (ValueError, KeyError, TypeError):
+                logging.warning(f"Ignoring unreadable journal entry {line_no} in {self.journal_path}")
+        return entries
+
+    def _append(self, entry):
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_entries += 1
+        except IOError as e:
+            logging.error(f"Error writing config journal {self.journal_path}: {e}")
+            return
+        if self._journal_entries > self.journal_limit:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        try:
+            atomic_write_json(self.path, {"schema_version": SCHEMA_VERSION, "tasks": self._tasks}, indent=4)
+            # The snapshot now contains every journaled change
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
+            logging.info(f"Saved {len(self._tasks)} tasks to {self.path}")
+        except (IOError, OSError) as e:
+            logging.error(f"Error saving {self.path}: {e}")
+
+    def put(self, task_id, task):
+        with self._lock:
+            normalized = normalize_task(task)
+            if self._tasks.get(task_id) == normalized:
+                return
+            self._tasks[task_id] = normalized
+            self._append({"op": "put", "id": task_id, "task": normalized})
+
+    def delete(self, task_id):
+        with self._lock:
+            if self._tasks.pop(task_id, None) is not None:
+                self._append({"op": "delete", "id": task_id})
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self._append({"op": "clear"})
+
+    def compact(self):
+        """Folds the journal into the snapshot (e.g. on shutdown)."""
+        with self._lock:
+            if self._journal_entries or not os.path.exists(self.path):
+                self._write_snapshot()
@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import heapq
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent import futures
+from event_queue import SpillingEventQueue
+from config_store import is_remote
+
+# --- Configuration ---
+RETRY_BASE_DELAY = 1.0      # Seconds before the first retry of a failed operation
+RETRY_MAX_DELAY = 300.0     # Cap for the exponential backoff (also between probes of an offline destination)
+MAX_ATTEMPTS = 5            # Tries on a reachable destination before an operation is parked in the backlog
+MAX_IN_FLIGHT = 256         # Async operations a destination queue submits before it waits for some to finish
+BACKLOG_DIR = os.path.join(os.path.expanduser("~"), ".syncapp", "backlog")
+
+# Destination health states
+HEALTHY = "healthy"
+DEGRADED = "degraded"       # Reachable, but operations are failing and being retried
+OFFLINE = "offline"         # Destination root is gone (unmounted disk, dropped share)
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with a little jitter so destinations do not retry in lockstep."""
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(0, attempts - 1)) * random.uniform(0.8, 1.2)
+
+def backlog_path(task_id, dest_root, backlog_dir=BACKLOG_DIR):
+    digest = hashlib.sha1((dest_root if is_remote(dest_root) else os.path.abspath(dest_root)).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(backlog_dir, f"{task_id}-{digest}.jsonl")
+
+
+class DestinationQueue(threading.Thread):
+    """Pending operations of one task against one destination, with health tracking.
+
+    Every destination gets its own coalescing queue and worker thread, so a
+    slow or missing destination only holds up itself. A failed operation is
+    retried with exponential backoff. When the destination root disappears the
+    queue goes offline: failed operations are parked in a durable backlog file
+    and the root is probed with backoff until it returns, at which point the
+    backlog is replayed. Retried and replayed operations are re-derived from the
+    current source state, so replaying them out of order is safe.
+    """
+
+    def __init__(self, task_id, index, dest_root, handler, on_state_change=None, resync=None,
+                 max_in_flight=MAX_IN_FLIGHT, backlog_dir=BACKLOG_DIR):
+        super().__init__(name=f"SyncDest-{task_id}-{index}", daemon=True)
+        self.task_id = task_id
+        self.dest_root = dest_root
+        self.handler = handler
+        self.on_state_change = on_state_change
+        self.resync = resync            # Full copy of the source, run when the initial sync could not finish
+        self.max_in_flight = max_in_flight
+        self.backlog_file = backlog_path(task_id, dest_root, backlog_dir)
+        self.queue = SpillingEventQueue(os.path.join(tempfile.gettempdir(), f"syncapp-{task_id}-{index}-{os.getpid()}.spill"))
+        self.state = HEALTHY
+        self.failures = 0               # Consecutive failed operations
+        self.completed = 0
+        self._retries = []              # Heap of (due, seq, relative_path, attempts)
+        self._retry_seq = 0
+        self._probe_attempts = 0
+        self._next_probe = 0.0
+        self._backlog_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.log_prefix = f"[Task {task_id}] [{os.path.basename(dest_root) or dest_root}] "
+
+    def put(self, relative_path, op, src_path=None):
+        if not self.queue.put(relative_path, op, src_path):
+            # The queue has stopped; keep the operation for the next run instead of dropping it
+            logging.debug(f"{self.log_prefix}Stopped; parked {op} of {relative_path} in the backlog.")
+            self._park(relative_path, op)
+
+    def __len__(self):
+        return len(self.queue) + len(self._retries)
+
+    def stop(self):
+        self._stopping.set()
+
+    def reachable(self):
+        if is_remote(self.dest_root):
+            from remote_transport import get_client
+            return get_client(self.dest_root).ping()
+        return os.path.isdir(self.dest_root)
+
+    # --- Worker ---
+
+    def run(self):
+        in_flight = {}
+        # Deletes left over from an earlier run; the initial sync already covered the copies
+        self._replay_backlog(deletes_only=True)
+        if self.resync is not None:
+            if self.reachable():
+                self._set_state(DEGRADED)
+            else:
+                self._go_offline()
+        while not self._stopping.is_set():
+            if self.state == OFFLINE or self.resync is not None:
+                if not self._recover():
+                    self._stopping.wait(0.5)
+                    in_flight = self._collect(in_flight, block=False)
+                    continue
+            item = self._next_item(timeout=0.1 if (in_flight or self._retries) else 0.5)
+            if item is not None:
+                in_flight[self._start(item[0], item[1], item[2])] = item
+            in_flight = self._collect(in_flight, block=len(in_flight) >= self.max_in_flight)
+        if in_flight:
+            futures.wait(in_flight, timeout=5)
+        for future, (relative_path, op, _, _) in in_flight.items():
+            if not future.done() or future.cancelled() or not self._succeeded(future):
+                self._park(relative_path, op)
+        self._persist_pending()
+        logging.info(f"{self.log_prefix}Destination queue stopped ({self.state}, {self.completed} operation(s) done).")
+
+    def _next_item(self, timeout):
+        """Returns ``(relative_path, op, src_path, attempts)``: a due retry first, else the next queued operation."""
+        if self._retries and self._retries[0][0] <= time.monotonic():
+            _, _, relative_path, attempts = heapq.heappop(self._retries)
+            op, src_path = self._current_op(relative_path)
+            return relative_path, op, src_path, attempts
+        if self._retries:
+            timeout = max(0.01, min(timeout, self._retries[0][0] - time.monotonic()))
+        item = self.queue.get(timeout=timeout)
+        return None if item is None else (item[0], item[1], item[2], 0)
+
+    def _start(self, relative_path, op, src_path):
+        func, args = self.handler.operation(op, relative_path, src_path, self.dest_root)
+        if self.handler.engine:
+            return self.handler.engine.submit(self.task_id, self.dest_root, func, *args, key=relative_path,
+                                              limit=self.handler.options.get("workers") or None)
+        future = futures.Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _collect(self, in_flight, block):
+        if not in_flight:
+            return in_flight
+        if block:
+            futures.wait(in_flight, timeout=1.0, return_when=futures.FIRST_COMPLETED)
+        for future in [f for f in in_flight if f.done()]:
+            relative_path, op, _, attempts = in_flight.pop(future)
+            if future.cancelled():
+                continue
+            if self._succeeded(future):
+                self.completed += 1
+                self.failures = 0
+                if self.state == DEGRADED and not self._retries:
+                    self._set_state(HEALTHY)
+            else:
+                self._failed(relative_path, op, attempts + 1)
+        return in_flight
+
+    @staticmethod
+    def _succeeded(future):
+        return future.exception() is None and future.result() is not False
+
+    def _failed(self, relative_path, op, attempts):
+        self.failures += 1
+        if not self.reachable():
+            self._park(relative_path, op)
+            self._go_offline()
+        elif attempts >= MAX_ATTEMPTS:
+            logging.error(f"{self.log_prefix}Giving up on {op} of {relative_path} after {attempts} attempts; "
+                          f"kept in backlog {self.backlog_file}.")
+            self._park(relative_path, op)
+        else:
+            delay = backoff_delay(attempts)
+            logging.warning(f"{self.log_prefix}{op} of {relative_path} failed (attempt {attempts}); retrying in {delay:.1f}s.")
+            self._retry_seq += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._retry_seq, relative_path, attempts))
+            if self.state == HEALTHY:
+                self._set_state(DEGRADED)
+
+    # --- Health ---
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        if state == HEALTHY:
+            logging.info(f"{self.log_prefix}Destination is healthy again.")
+        else:
+            logging.warning(f"{self.log_prefix}Destination is now {state}.")
+        self.state = state
+        if self.on_state_change:
+            try:
+                self.on_state_change(self)
+            except Exception as e:
+                logging.error(f"{self.log_prefix}State change callback failed: {e}")
+
+    def _go_offline(self):
+        # Retries cannot succeed either; they wait in the backlog for the destination to return
+        while self._retries:
+            _, _, relative_path, _ = heapq.heappop(self._retries)
+            self._park(relative_path, None)
+        if self.state == OFFLINE:
+            return
+        self._probe_attempts = 1
+        self._next_probe = time.monotonic() + backoff_delay(1)
+        self._set_state(OFFLINE)
+
+    def _recover(self):
+        """Probes an offline destination and runs a pending resync. Returns True once it is usable."""
+        now = time.monotonic()
+        if now < self._next_probe:
+            return False
+        if not self.reachable():
+            self._probe_attempts += 1
+            self._next_probe = now + backoff_delay(self._probe_attempts)
+            if self.state != OFFLINE:
+                self._go_offline()
+            return False
+        if self.resync is not None:
+            try:
+                logging.info(f"{self.log_prefix}Re-running initial sync.")
+                self.resync()
+                self.resync = None
+            except Exception as e:
+                logging.error(f"{self.log_prefix}Initial sync failed again: {e}")
+                self._probe_attempts += 1
+                self._next_probe = now + backoff_delay(self._probe_attempts)
+                if not self.reachable():
+                    self._go_offline()
+                return False
+            self._replay_backlog(deletes_only=True)
+        else:
+            logging.info(f"{self.log_prefix}Destination is reachable again; replaying backlog.")
+            self._replay_backlog()
+        self._probe_attempts = 0
+        self.failures = 0
+        self._set_state(HEALTHY)
+        return True
+
+    # --- Durable backlog ---
+
+    def _current_op(self, relative_path):
+        """Re-derives a retried operation from the source as it is now."""
+        src_path = os.path.join(self.handler.source_root, relative_path)
+        if os.path.lexists(src_path):
+            return "sync", src_path
+        return "delete", None
+
+    def _park(self, relative_path, op):
+        with self._backlog_lock:
+            try:
+                os.makedirs(os.path.dirname(self.backlog_file), exist_ok=True)
+                with open(self.backlog_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps([relative_path, op], separators=(",", ":")) + "\n")
+            except OSError as e:
+                logging.error(f"{self.log_prefix}Could not write backlog {self.backlog_file}: {e}")
+
+    def _replay_backlog(self, deletes_only=False):
+        with self._backlog_lock:
+            try:
+                with open(self.backlog_file, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+                os.remove(self.backlog_file)
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                logging.error(f"{self.log_prefix}Could not read backlog {self.backlog_file}: {e}")
+                return
+        replayed = 0
+        for line in dict.fromkeys(lines): # Same path parked twice: replay it once
+            try:
+                relative_path = json.loads(line)[0]
+            except (ValueError, IndexError):
+                continue
+            op, src_path = self._current_op(relative_path)
+            if deletes_only and op != "delete":
+                continue
+            self.queue.put(relative_path, op, src_path)
+            replayed += 1
+        if replayed:
+            logging.info(f"{self.log_prefix}Replaying {replayed} operation(s) from the backlog.")
+
+    def parked_paths(self):
+        """Relative paths waiting in the durable backlog."""
+        with self._backlog_lock:
+            try:
+                with open(self.backlog_file, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                return []
+        parked = []
+        for line in lines:
+            try:
+                parked.append(json.loads(line)[0])
+            except (ValueError, IndexError):
+                continue
+        return parked
+
+    def _persist_pending(self):
+        """Closes the queue and parks everything still in it, so it survives the task being stopped."""
+        parked = 0
+        while self._retries:
+            self._park(heapq.heappop(self._retries)[2], None)
+            parked += 1
+        # Closing hands back what is left in one step; a later put() parks its operation itself
+        for relative_path, op, _ in self.queue.close():
+            self._park(relative_path, op)
+            parked += 1
+        if parked:
+            logging.info(f"{self.log_prefix}Kept {parked} pending operation(s) in backlog {self.backlog_file}.")
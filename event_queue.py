@@ -0,0 +1,159 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, deque
+
+# --- Configuration ---
+DEFAULT_MAX_ITEMS = 50000              # Pending operations kept in memory before spilling
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024   # Approximate memory budget for pending operations
+ENTRY_OVERHEAD = 160                   # Rough per-entry cost of the dict slot, tuple and strings
+SPILL_READ_BATCH = 1024                # Spilled entries read back per disk read
+
+
+class SpillingEventQueue:
+    """Bounded queue of pending sync operations, coalesced by path.
+
+    Each entry is ``(key, op, payload)``; a newer operation for a key that is
+    still in memory replaces the older one. When the in-memory part exceeds
+    ``max_items`` or ``max_bytes``, its oldest half is appended to an on-disk
+    log. Spilled entries are always handed out before in-memory ones, so
+    operations come out in the order they were queued and nothing is dropped.
+
+    Spilled entries are not coalesced: a later ``put`` for a spilled key is
+    queued as well, and both come out, the older first. Tracking spilled keys
+    would bring back the memory the spill log exists to save, and the
+    consumers re-derive each operation from the current source state, so the
+    older entry only costs a redundant operation.
+    """
+
+    def __init__(self, spill_path=None, max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        self.spill_path = spill_path or os.path.join(tempfile.gettempdir(), f"syncapp-{os.getpid()}-{id(self)}.spill")
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._pending = OrderedDict()   # key -> (op, payload)
+        self._pending_bytes = 0
+        self._spill_file = None
+        self._spill_read_pos = 0
+        self._spilled = 0               # Entries on disk not yet handed out
+        self._spill_buffer = deque()    # Entries read back from disk, in order
+        self._closed = False
+        self._cond = threading.Condition()
+        self.total_spilled = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending) + self._spilled + len(self._spill_buffer)
+
+    @property
+    def spilled(self):
+        with self._cond:
+            return self._spilled + len(self._spill_buffer)
+
+    def put(self, key, op, payload=None):
+        """Queues an operation. Returns False, queuing nothing, once the queue is closed."""
+        with self._cond:
+            if self._closed:
+                return False
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                self._pending_bytes -= _entry_size(key, previous[1])
+            self._pending[key] = (op, payload)
+            self._pending_bytes += _entry_size(key, payload)
+            if len(self._pending) > self.max_items or self._pending_bytes > self.max_bytes:
+                self._spill()
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Returns the next ``(key, op, payload)``, or ``None`` on timeout or close."""
+        with self._cond:
+            while True:
+                if self._spill_buffer or self._spilled:
+                    if not self._spill_buffer:
+                        self._read_spilled()
+                    if self._spill_buffer:
+                        return self._spill_buffer.popleft()
+                if self._pending:
+                    key, (op, payload) = self._pending.popitem(last=False)
+                    self._pending_bytes -= _entry_size(key, payload)
+                    return key, op, payload
+                if self._closed or not self._cond.wait(timeout):
+                    return None
+
+    def close(self):
+        """Closes the queue and returns the entries still in it, spilled ones included, in order."""
+        with self._cond:
+            if self._closed:
+                return []
+            self._closed = True
+            left = list(self._spill_buffer)
+            self._spill_buffer.clear()
+            while self._spilled:
+                self._read_spilled()
+                if not self._spill_buffer:
+                    break # Log cut short
+                left.extend(self._spill_buffer)
+                self._spill_buffer.clear()
+            self._spilled = 0
+            left.extend((key, op, payload) for key, (op, payload) in self._pending.items())
+            self._pending.clear()
+            self._pending_bytes = 0
+            self._close_spill_file()
+            self._cond.notify_all()
+            return left
+
+    # --- Spill log (called with the condition held) ---
+
+    def _spill(self):
+        target = len(self._pending) // 2
+        try:
+            if self._spill_file is None:
+                self._spill_file = open(self.spill_path, "w+b")
+                self._spill_read_pos = 0
+            self._spill_file.seek(0, os.SEEK_END)
+            lines = []
+            while len(self._pending) > target:
+                key, (op, payload) = self._pending.popitem(last=False)
+                self._pending_bytes -= _entry_size(key, payload)
+                lines.append(json.dumps([key, op, payload], separators=(",", ":")).encode("utf-8"))
+            self._spill_file.write(b"\n".join(lines) + b"\n")
+            self._spill_file.flush()
+        except OSError as e:
+            # Keep everything in memory rather than lose events
+            logging.error(f"Could not spill pending events to {self.spill_path}: {e}")
+            return
+        self._spilled += len(lines)
+        self.total_spilled += len(lines)
+        logging.warning(f"Event queue over its memory budget: spilled {len(lines)} pending operation(s) to disk "
+                        f"({self._spilled} on disk).")
+
+    def _read_spilled(self):
+        self._spill_file.seek(self._spill_read_pos)
+        for _ in range(min(SPILL_READ_BATCH, self._spilled)):
+            line = self._spill_file.readline()
+            if not line:
+                break
+            key, op, payload = json.loads(line)
+            self._spill_buffer.append((key, op, payload))
+            self._spilled -= 1
+        self._spill_read_pos = self._spill_file.tell()
+        if not self._spilled:
+            # Everything has been read back; start the log over
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read_pos = 0
+
+    def _close_spill_file(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+
+
+def _entry_size(key, payload):
+    return ENTRY_OVERHEAD + len(key) + (len(payload) if payload else 0)
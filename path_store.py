@@ -0,0 +1,146 @@
+import os
+import sys
+from array import array
+
+# --- Configuration ---
+ROOT_ID = 0                 # The tree root ("")
+INITIAL_SLOTS = 1024        # Hash slots to start with; always a power of two
+MAX_LOAD = 0.6              # Slot occupancy that triggers doubling
+
+
+class PathStore:
+    """Compact table of relative paths, one small integer ID per path.
+
+    A path is stored as ``(parent ID, name ID)`` in two ``array('I')`` columns,
+    and each distinct file or directory name is kept once however many
+    directories it appears in. Looking up a child goes through an open
+    addressing hash table that is also a flat ``array('I')``. Apart from the
+    name text, a path costs about 20 bytes, against well over 100 bytes for a
+    ``str`` in a dict or set. IDs never change, so callers can keep their own
+    per-path data in parallel arrays indexed by ID. Nothing is ever removed;
+    a long-lived owner whose tree churns rebuilds a fresh store from its live
+    paths instead (see ``ScanningObserver._compact``).
+    """
+
+    def __init__(self):
+        self._parents = array("I", [ROOT_ID])
+        self._names = array("I", [0])
+        self._name_ids = {"": 0}
+        self._name_list = [""]
+        self._slots = array("I", bytes(4 * INITIAL_SLOTS))  # path ID + 1; 0 = empty
+        self._mask = INITIAL_SLOTS - 1
+
+    def __len__(self):
+        return len(self._parents)
+
+    # --- Names ---
+
+    def intern_name(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._name_list)
+            self._name_list.append(name)
+        return name_id
+
+    def name_of(self, name_id):
+        return self._name_list[name_id]
+
+    def name_count(self):
+        return len(self._name_list)
+
+    # --- Paths ---
+
+    def child(self, parent_id, name, create=True):
+        """Returns the ID of ``name`` inside ``parent_id``, adding it if ``create``; else None when unknown."""
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            if not create:
+                return None
+            name_id = self.intern_name(name)
+        slot = self._find_slot(parent_id, name_id)
+        if self._slots[slot]:
+            return self._slots[slot] - 1
+        if not create:
+            return None
+        path_id = len(self._parents)
+        self._parents.append(parent_id)
+        self._names.append(name_id)
+        self._slots[slot] = path_id + 1
+        if len(self._parents) > MAX_LOAD * len(self._slots):
+            self._grow()
+        return path_id
+
+    def add(self, relative_path):
+        """Returns the ID of a relative path, adding it and its ancestors as needed."""
+        path_id = ROOT_ID
+        if relative_path and relative_path != ".":
+            for name in relative_path.split(os.sep):
+                path_id = self.child(path_id, name)
+        return path_id
+
+    def lookup(self, relative_path):
+        """Returns the ID of a known relative path, or None."""
+        path_id = ROOT_ID
+        if relative_path and relative_path != ".":
+            for name in relative_path.split(os.sep):
+                path_id = self.child(path_id, name, create=False)
+                if path_id is None:
+                    return None
+        return path_id
+
+    def parent(self, path_id):
+        return self._parents[path_id]
+
+    def name(self, path_id):
+        return self._name_list[self._names[path_id]]
+
+    def path(self, path_id):
+        """Rebuilds the relative path of an ID ("" for the root)."""
+        names = []
+        while path_id != ROOT_ID:
+            names.append(self._name_list[self._names[path_id]])
+            path_id = self._parents[path_id]
+        return os.sep.join(reversed(names))
+
+    def join(self, path_id, name):
+        """Relative path of ``name`` inside ``path_id`` without adding it."""
+        parent = self.path(path_id)
+        return os.path.join(parent, name) if parent else name
+
+    def memory_usage(self):
+        """Approximate bytes held by the table, name text included."""
+        names = sum(sys.getsizeof(n) for n in self._name_list) + sys.getsizeof(self._name_ids)
+        return (self._parents.itemsize * len(self._parents) * 2 + self._slots.itemsize * len(self._slots)
+                + names + sys.getsizeof(self._name_list))
+
+    # --- Hash table ---
+
+    def _find_slot(self, parent_id, name_id):
+        slot = ((parent_id * 0x9E3779B1) ^ (name_id * 0x85EBCA77)) & self._mask
+        slots, parents, names = self._slots, self._parents, self._names
+        while True:
+            entry = slots[slot]
+            if not entry or (parents[entry - 1] == parent_id and names[entry - 1] == name_id):
+                return slot
+            slot = (slot + 1) & self._mask
+
+    def _grow(self):
+        size = len(self._slots) * 2
+        self._slots = array("I", bytes(4 * size))
+        self._mask = size - 1
+        for path_id in range(1, len(self._parents)):
+            self._slots[self._find_slot(self._parents[path_id], self._names[path_id])] = path_id + 1
+
+
+def relative_to_root(path, root_prefix):
+    """Relative path of ``path`` under a root given as ``root + os.sep``, or None if it is outside.
+
+    A plain prefix check and slice; watchdog reports paths built from the root
+    it was given, so no ``normpath``/``relpath`` is needed on the hot path.
+    """
+    if path.startswith(root_prefix):
+        relative_path = path[len(root_prefix):]
+        return relative_path.rstrip(os.sep) or "."
+    if path == root_prefix[:-1]:
+        return "."
+    return None
@@ -0,0 +1,509 @@
+import os
+import json
+import hashlib
+import time
+import shutil
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from path_store import PathStore
+from snapshots import RESERVED_NAMES
+from config_store import atomic_write_json
+from profiling import traced
+
+# --- Configuration ---
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".syncapp")
+PLAN_DIR = os.path.join(STATE_DIR, "plans")
+CHECKPOINT_DIR = os.path.join(STATE_DIR, "checkpoints")
+CHECKPOINT_VERSION = 1
+THROUGHPUT_FILE = os.path.join(STATE_DIR, "throughput.json")
+PLAN_MAX_AGE = 600.0                    # Seconds a cached plan may be executed after it was made
+MTIME_TOLERANCE_NS = 2 * 10**9          # FAT/exFAT and some SMB servers keep mtimes at 2 s precision
+DEFAULT_BYTES_PER_SEC = 50 * 1024 * 1024 # Assumed until a destination has been measured
+DEFAULT_FILES_PER_SEC = 200.0
+THROUGHPUT_SMOOTHING = 0.5              # Weight of the newest measurement
+MIN_MEASURED_BYTES = 4 * 1024 * 1024    # Smaller runs are too noisy to learn from
+PLAN_WORKERS = 8                        # Parallel copies when executing a plan
+
+# Entry kinds in a TreeIndex
+ABSENT, FILE, DIRECTORY = 0, 1, 2
+
+
+class TreeIndex:
+    """Kind, size and mtime of every entry of one tree, in arrays indexed by PathStore ID."""
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.kinds = bytearray()
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.linked_dirs = set() # IDs of symlinks to directories; indexed, but not descended into
+
+    def set_entry(self, path_id, kind, size=0, mtime_ns=0):
+        missing = path_id + 1 - len(self.kinds)
+        if missing > 0:
+            self.kinds.extend(bytes(missing))
+            self.sizes.extend([0] * missing)
+            self.mtimes.extend([0] * missing)
+        self.kinds[path_id] = kind
+        self.sizes[path_id] = size
+        self.mtimes[path_id] = mtime_ns
+
+    def kind(self, path_id):
+        return self.kinds[path_id] if path_id < len(self.kinds) else ABSENT
+
+    def entry(self, path_id):
+        """``(kind, size, mtime_ns)`` of an ID; ``(ABSENT, 0, 0)`` when not indexed."""
+        if path_id >= len(self.kinds) or not self.kinds[path_id]:
+            return ABSENT, 0, 0
+        return self.kinds[path_id], self.sizes[path_id], self.mtimes[path_id]
+
+    def scan(self, root, excluded=None, skip_top=(), start=""):
+        """Indexes ``root`` (or only its subdirectory ``start``). ``excluded(relative_path, is_dir)`` filters
+        entries; ``skip_top`` names are ignored at the top level. A symlinked file is indexed with its target's
+        size and mtime, since ``copy2`` copies the target. A symlinked directory is never descended into (a link
+        to a parent would loop) and only goes into ``linked_dirs``. Returns ``{relative dir: mtime_ns}`` for the
+        directories seen."""
+        dir_mtimes = {start: os.stat(os.path.join(root, start) if start else root).st_mtime_ns}
+        pending = [(self.paths.add(start), start)]
+        while pending:
+            dir_id, rel_dir = pending.pop()
+            try:
+                entries = list(os.scandir(os.path.join(root, rel_dir) if rel_dir else root))
+            except OSError as e:
+                logging.warning(f"Planner: cannot list {os.path.join(root, rel_dir)}: {e}")
+                continue
+            for entry in entries:
+                if not rel_dir and entry.name in skip_top:
+                    continue
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    is_link = entry.is_symlink()
+                    is_dir = entry.is_dir() # Follows a symlink
+                    st = entry.stat()
+                except OSError:
+                    continue # Vanished, or a dangling symlink
+                if excluded and excluded(rel_path, is_dir):
+                    continue
+                path_id = self.paths.child(dir_id, entry.name)
+                if is_link and is_dir:
+                    self.linked_dirs.add(path_id)
+                elif is_dir:
+                    self.set_entry(path_id, DIRECTORY, 0, st.st_mtime_ns)
+                    dir_mtimes[rel_path] = st.st_mtime_ns
+                    pending.append((path_id, rel_path))
+                else:
+                    self.set_entry(path_id, FILE, st.st_size, st.st_mtime_ns)
+        return dir_mtimes
+
+
+class DestinationPlan:
+    """What a run will do to one destination."""
+
+    def __init__(self, dest_root):
+        self.dest_root = dest_root
+        self.replace = []   # Relative paths whose type changes (file <-> directory); removed first
+        self.mkdirs = []
+        self.renames = []   # (old relative path, new relative path), moves within the destination
+        self.copies = []    # (relative path, size)
+        self.deletes = []   # Extraneous items (mirror_deletes); top-most paths only
+        self.unchanged = 0
+        self.estimated_seconds = 0.0
+
+    @property
+    def copy_bytes(self):
+        return sum(size for _, size in self.copies)
+
+    def summary(self):
+        return (f"{len(self.copies)} copies ({_format_bytes(self.copy_bytes)}), {len(self.renames)} renames, "
+                f"{len(self.deletes) + len(self.replace)} deletes, {len(self.mkdirs)} new directories, "
+                f"{self.unchanged} unchanged; about {_format_duration(self.estimated_seconds)}")
+
+    def operations(self):
+        """One line per planned operation, in execution order."""
+        lines = [f"delete  {rel_path}" for rel_path in self.replace + self.deletes]
+        lines += [f"rename  {old_path} -> {new_path}" for old_path, new_path in self.renames]
+        lines += [f"mkdir   {rel_path}" for rel_path in self.mkdirs]
+        lines += [f"copy    {rel_path} ({_format_bytes(size)})" for rel_path, size in self.copies]
+        return lines
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in ("dest_root", "replace", "mkdirs", "renames", "copies",
+                                                     "deletes", "unchanged", "estimated_seconds")}
+
+    @classmethod
+    def from_dict(cls, data):
+        plan = cls(data["dest_root"])
+        for key, value in data.items():
+            setattr(plan, key, [tuple(v) for v in value] if key in ("renames", "copies") else value)
+        return plan
+
+
+class SyncPlan:
+    """The operations an initial sync of one task will perform, per destination."""
+
+    def __init__(self, task_id, source_root, created=None):
+        self.task_id = task_id
+        self.source_root = source_root
+        self.created = created or time.time()
+        self.source_dir_mtimes = {}  # Used to tell whether a cached plan is still current
+        self.source_files = {}       # relative path -> [size, mtime_ns] of every source file planned, likewise
+        self.destinations = {}       # dest_root -> DestinationPlan
+
+    @property
+    def estimated_seconds(self):
+        # Destinations are synced one after another
+        return sum(d.estimated_seconds for d in self.destinations.values())
+
+    def summary(self):
+        lines = [f"Plan for {self.source_root} (about {_format_duration(self.estimated_seconds)} in total):"]
+        lines += [f"  {dest}: {plan.summary()}" for dest, plan in self.destinations.items()]
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {"task_id": self.task_id, "source_root": self.source_root, "created": self.created,
+                "source_dir_mtimes": self.source_dir_mtimes, "source_files": self.source_files,
+                "destinations": [d.to_dict() for d in self.destinations.values()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        plan = cls(data["task_id"], data["source_root"], data["created"])
+        plan.source_dir_mtimes = data["source_dir_mtimes"]
+        plan.source_files = data["source_files"]
+        for dest in data["destinations"]:
+            plan.destinations[dest["dest_root"]] = DestinationPlan.from_dict(dest)
+        return plan
+
+
+# --- Planning ---
+
+def compute_plan(task_id, source_root, dest_roots, excluded=None, mirror_deletes=False, throughput=None, baseline=None):
+    """Walks the source once and each destination once and returns a ``SyncPlan``.
+
+    Files are copied when missing or when size or mtime differ. With
+    ``mirror_deletes``, destination items that are not in the source are
+    deleted, and a deleted file with the same size and mtime as a file to be
+    copied becomes a rename instead. With a ``baseline`` index (a checkpoint of
+    what the destinations were last synced to), the destinations are compared
+    with it instead of being walked, and mtimes must match exactly.
+    """
+    throughput = throughput or ThroughputStats()
+    paths = baseline.paths if baseline is not None else PathStore()
+    source = TreeIndex(paths)
+    plan = SyncPlan(task_id, os.path.abspath(source_root))
+    plan.source_dir_mtimes = source.scan(source_root, excluded)
+    plan.source_files = {paths.path(path_id): [source.sizes[path_id], source.mtimes[path_id]]
+                         for path_id in range(1, len(source.kinds)) if source.kinds[path_id] == FILE}
+    for dest_root in dest_roots:
+        if baseline is not None:
+            dest, tolerance_ns = baseline, 0
+        else:
+            dest, tolerance_ns = TreeIndex(paths), MTIME_TOLERANCE_NS
+            if os.path.isdir(dest_root):
+                dest.scan(dest_root, skip_top=RESERVED_NAMES)
+        plan.destinations[dest_root] = _plan_destination(paths, source, dest, dest_root, mirror_deletes, tolerance_ns)
+        dest_plan = plan.destinations[dest_root]
+        dest_plan.estimated_seconds = throughput.estimate(
+            dest_root, dest_plan.copy_bytes, len(dest_plan.copies) + len(dest_plan.mkdirs) + len(dest_plan.renames))
+    return plan
+
+def _plan_destination(paths, source, dest, dest_root, mirror_deletes, tolerance_ns=MTIME_TOLERANCE_NS):
+    dest_plan = DestinationPlan(dest_root)
+    deleted_dirs = set()
+    linked = set(source.linked_dirs) # Symlinked source directories: what the destination has there is left alone
+    delete_candidates = {}  # (size, mtime_ns) -> [relative paths of extraneous files]
+    for path_id in range(1, len(paths)):
+        src_kind, dst_kind = source.kind(path_id), dest.kind(path_id)
+        if src_kind == ABSENT and dst_kind == ABSENT:
+            continue
+        if path_id in linked or paths.parent(path_id) in linked:
+            linked.add(path_id)
+            continue
+        rel_path = paths.path(path_id)
+        if src_kind == ABSENT:
+            if not mirror_deletes:
+                continue
+            if paths.parent(path_id) in deleted_dirs:
+                deleted_dirs.add(path_id) # Goes with its deleted parent
+                continue
+            if dst_kind == DIRECTORY:
+                deleted_dirs.add(path_id)
+            else:
+                delete_candidates.setdefault((dest.sizes[path_id], dest.mtimes[path_id]), []).append(rel_path)
+            dest_plan.deletes.append(rel_path)
+            continue
+        if dst_kind not in (ABSENT, src_kind):
+            dest_plan.replace.append(rel_path)
+            dst_kind = ABSENT
+        if src_kind == DIRECTORY:
+            if dst_kind == ABSENT:
+                dest_plan.mkdirs.append(rel_path)
+        elif (dst_kind == FILE and source.sizes[path_id] == dest.sizes[path_id]
+              and abs(source.mtimes[path_id] - dest.mtimes[path_id]) <= tolerance_ns):
+            dest_plan.unchanged += 1
+        else:
+            dest_plan.copies.append((rel_path, source.sizes[path_id]))
+    if delete_candidates:
+        _detect_renames(paths, source, dest, dest_plan, delete_candidates)
+    return dest_plan
+
+def _detect_renames(paths, source, dest, dest_plan, delete_candidates):
+    copies = []
+    deletes = set(dest_plan.deletes)
+    for rel_path, size in dest_plan.copies:
+        path_id = paths.lookup(rel_path)
+        candidates = delete_candidates.get((size, source.mtimes[path_id]))
+        if dest.kind(path_id) == ABSENT and candidates:
+            old_path = candidates.pop()
+            dest_plan.renames.append((old_path, rel_path))
+            deletes.discard(old_path)
+        else:
+            copies.append((rel_path, size))
+    dest_plan.copies = copies
+    dest_plan.deletes = [p for p in dest_plan.deletes if p in deletes]
+
+
+# --- Execution ---
+
+@traced("execute_plan")
+def execute_plan(plan, dest_root, copy_function=shutil.copy2, remove_function=None, stop_event=None,
+                 workers=PLAN_WORKERS, throughput=None):
+    """Carries out a plan's operations for one destination.
+
+    ``remove_function(dest_root, relative_path)`` deletes an item (the task's
+    trash-aware delete). Returns ``[(src, dst, error)]`` like the engine's
+    initial sync, or None if ``stop_event`` was set. The measured throughput
+    feeds later estimates.
+    """
+    dest_plan = plan.destinations[dest_root]
+    remove_function = remove_function or _remove
+    errors = []
+    started = time.monotonic()
+
+    def attempt(func, src, dst, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            errors.append((src, dst, str(e)))
+
+    os.makedirs(dest_root, exist_ok=True)
+    for rel_path in dest_plan.replace:
+        attempt(remove_function, None, os.path.join(dest_root, rel_path), dest_root, rel_path)
+    for rel_path in dest_plan.mkdirs:
+        attempt(os.makedirs, None, os.path.join(dest_root, rel_path), os.path.join(dest_root, rel_path), 0o777, True)
+    copies = list(dest_plan.copies)
+    for old_path, new_path in dest_plan.renames:
+        try:
+            os.replace(os.path.join(dest_root, old_path), os.path.join(dest_root, new_path))
+        except OSError:
+            copies.append((new_path, 0)) # Changed since planning; copy it instead
+    for rel_path in dest_plan.deletes:
+        attempt(remove_function, None, os.path.join(dest_root, rel_path), dest_root, rel_path)
+
+    def copy(item):
+        if stop_event is not None and stop_event.is_set():
+            return
+        src, dst = os.path.join(plan.source_root, item[0]), os.path.join(dest_root, item[0])
+        attempt(copy_function, src, dst, src, dst)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"SyncPlan-{plan.task_id}") as pool:
+        list(pool.map(copy, copies))
+    if stop_event is not None and stop_event.is_set():
+        return None
+    for rel_path in reversed(dest_plan.mkdirs):
+        try:
+            shutil.copystat(os.path.join(plan.source_root, rel_path), os.path.join(dest_root, rel_path))
+        except OSError:
+            pass
+    (throughput or ThroughputStats()).record(dest_root, dest_plan.copy_bytes, len(copies), time.monotonic() - started)
+    return errors
+
+def _remove(dest_root, relative_path):
+    path = os.path.join(dest_root, relative_path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+# --- Plan Cache ---
+
+def plan_cache_path(task_id, plan_dir=PLAN_DIR):
+    return os.path.join(plan_dir, f"{task_id}.json")
+
+def save_plan(plan, plan_dir=PLAN_DIR):
+    os.makedirs(plan_dir, exist_ok=True)
+    atomic_write_json(plan_cache_path(plan.task_id, plan_dir), plan.to_dict())
+
+def take_cached_plan(task_id, source_root, dest_roots, max_age=PLAN_MAX_AGE, plan_dir=PLAN_DIR):
+    """Returns the task's cached plan if it is still current, removing it from the cache either way.
+
+    A plan is current when it is younger than ``max_age``, covers the same
+    source and destinations, no source directory's mtime has changed (so
+    nothing was added, removed or renamed since it was made), and every source
+    file it planned still has the size and mtime it had then (so nothing was
+    edited in place).
+    """
+    path = plan_cache_path(task_id, plan_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            plan = SyncPlan.from_dict(json.load(f))
+        os.remove(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Planner: ignoring unreadable cached plan {path}: {e}")
+        return None
+    if (time.time() - plan.created > max_age or plan.source_root != os.path.abspath(source_root)
+            or set(plan.destinations) != set(dest_roots)):
+        return None
+    for rel_dir, mtime_ns in plan.source_dir_mtimes.items():
+        try:
+            if os.stat(os.path.join(plan.source_root, rel_dir)).st_mtime_ns != mtime_ns:
+                return None
+        except OSError:
+            return None
+    for rel_path, (size, mtime_ns) in plan.source_files.items():
+        try:
+            st = os.stat(os.path.join(plan.source_root, rel_path))
+        except OSError:
+            return None
+        if st.st_size != size or st.st_mtime_ns != mtime_ns:
+            return None
+    return plan
+
+
+# --- Checkpoints ---
+# The source index as last synced, written when a task stops. The next start compares
+# the source with it, so the destinations need not be walked again.
+
+def checkpoint_path(source_root, dest_roots, checkpoint_dir=CHECKPOINT_DIR):
+    key = "\0".join([os.path.abspath(source_root)] + sorted(dest_roots))
+    return os.path.join(checkpoint_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".json")
+
+def save_checkpoint(path, source_root, dest_roots, index, filters=None, unsynced=()):
+    """Writes ``index`` as the state ``dest_roots`` are synced to.
+
+    ``unsynced`` paths (still held or parked in a backlog) are left out with
+    everything under them, so the next start copies them again.
+    """
+    paths = index.paths
+    skipped = bytearray(len(paths))
+    for relative_path in unsynced:
+        path_id = paths.lookup(relative_path)
+        if path_id is not None:
+            skipped[path_id] = 1
+    entries = []
+    for path_id in range(1, len(paths)): # Parents have lower IDs than their children
+        if skipped[path_id] or skipped[paths.parent(path_id)]:
+            skipped[path_id] = 1
+        elif index.kind(path_id):
+            entries.append([paths.path(path_id), *index.entry(path_id)])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write_json(path, {"version": CHECKPOINT_VERSION, "source_root": os.path.abspath(source_root),
+                             "dest_roots": list(dest_roots), "filters": filters, "created": time.time(),
+                             "entries": entries})
+
+def load_checkpoint(path, source_root, dest_roots, filters=None):
+    """Returns ``(index, covered dest_roots)`` of a checkpoint, or None when there is no usable one.
+
+    A checkpoint made with other filters is not used: paths it left out would
+    be copied, but paths newly excluded would be deleted from the destinations.
+    Destinations whose root is gone are not covered and get a full initial sync.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Planner: ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if (data.get("version") != CHECKPOINT_VERSION or data.get("source_root") != os.path.abspath(source_root)
+            or data.get("filters") != filters):
+        return None
+    covered = [d for d in dest_roots if d in data.get("dest_roots", ()) and os.path.isdir(d)]
+    if not covered:
+        return None
+    index = TreeIndex(PathStore())
+    for relative_path, kind, size, mtime_ns in data.get("entries", ()):
+        index.set_entry(index.paths.add(relative_path), kind, size, mtime_ns)
+    return index, covered
+
+
+# --- Throughput Measurements ---
+
+class ThroughputStats:
+    """Measured copy throughput per destination, kept in a small JSON file."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, path=THROUGHPUT_FILE):
+        self.path = path
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, dest_root):
+        entry = self._load().get(os.path.abspath(dest_root), {})
+        return entry.get("bytes_per_sec", DEFAULT_BYTES_PER_SEC), entry.get("files_per_sec", DEFAULT_FILES_PER_SEC)
+
+    def estimate(self, dest_root, num_bytes, num_files):
+        bytes_per_sec, files_per_sec = self.get(dest_root)
+        return num_bytes / bytes_per_sec + num_files / files_per_sec
+
+    def record(self, dest_root, num_bytes, num_files, seconds):
+        if seconds <= 0 or num_bytes < MIN_MEASURED_BYTES:
+            return
+        # Per-file overhead is folded into the byte rate; the file rate is only learned from runs of small files
+        with self._lock:
+            data = self._load()
+            entry = data.setdefault(os.path.abspath(dest_root), {})
+            old = entry.get("bytes_per_sec")
+            rate = num_bytes / seconds
+            entry["bytes_per_sec"] = rate if old is None else THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * old
+            entry["files_per_sec"] = max(entry.get("files_per_sec", DEFAULT_FILES_PER_SEC), num_files / seconds)
+            entry["updated"] = time.time()
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                atomic_write_json(self.path, data, indent=2)
+            except OSError as e:
+                logging.warning(f"Planner: could not save throughput stats: {e}")
+
+
+def _format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+def _format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+# --- Command Line ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show what the initial sync of a task would do, without changing anything.")
+    parser.add_argument("source")
+    parser.add_argument("destinations", nargs="+")
+    parser.add_argument("--mirror-deletes", action="store_true", help="Plan deletes of items not in the source")
+    parser.add_argument("--list", action="store_true", help="List every planned operation")
+    args = parser.parse_args()
+    result = compute_plan("cli", args.source, args.destinations, mirror_deletes=args.mirror_deletes)
+    print(result.summary())
+    if args.list:
+        for dest_root, dest_plan in result.destinations.items():
+            print(f"\n{dest_root}:")
+            for line in dest_plan.operations():
+                print(f"  {line}")
@@ -0,0 +1,275 @@
+import os
+import time
+import queue
+import logging
+import logging.handlers
+import threading
+import multiprocessing
+
+# --- Configuration ---
+METRICS_INTERVAL = 2.0       # Seconds between metrics reports from each worker process
+TASK_LOAD_WEIGHT = 5.0       # CPU-percent equivalent charged per assigned task when placing new tasks
+CPU_SMOOTHING = 0.3          # Weight of the newest sample in the per-process CPU average
+
+
+class TaskProcessPool:
+    """Runs sync tasks in a pool of worker processes, one shard of tasks per process.
+
+    Each worker process owns the observers and copy engines of the tasks
+    assigned to it. The parent talks to the workers over pipes: commands go
+    down, status updates and metrics come back up through ``poll()``. Log
+    records from the workers are forwarded to the parent's handlers.
+    """
+
+    def __init__(self, num_processes):
+        self.num_processes = max(1, int(num_processes))
+        self._ctx = multiprocessing.get_context("spawn") # Never fork a process that owns a Tk interpreter
+        self._shards = []
+        self._task_shards = {}   # task_id -> shard index
+        self._log_queue = None
+        self._log_listener = None
+
+    def start(self):
+        self._log_queue = self._ctx.Queue()
+        self._log_listener = logging.handlers.QueueListener(
+            self._log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self._log_listener.start()
+        for index in range(self.num_processes):
+            self._shards.append(self._spawn_shard(index))
+        logging.info(f"Started {self.num_processes} sync worker process(es).")
+
+    def _spawn_shard(self, index):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_shard_main, args=(child_conn, index, self._log_queue),
+            name=f"SyncShard-{index}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return {"index": index, "process": process, "conn": parent_conn, "tasks": set(),
+                "cpu_percent": 0.0}
+
+    def _load(self, shard):
+        return shard["cpu_percent"] + TASK_LOAD_WEIGHT * len(shard["tasks"])
+
+    def start_task(self, task_id, task_config):
+        """Assigns a task to the least loaded worker process and starts it there."""
+        alive = [s for s in self._shards if s["process"].is_alive()]
+        if not alive:
+            raise RuntimeError("No sync worker processes are running.")
+        shard = min(alive, key=self._load)
+        shard["tasks"].add(task_id)
+        self._task_shards[task_id] = shard["index"]
+        shard["conn"].send(("start", task_id, task_config))
+        logging.info(f"[Task {task_id}] Assigned to worker process {shard['index']} (load {self._load(shard):.1f}).")
+        return shard["index"]
+
+    def stop_task(self, task_id):
+        index = self._task_shards.get(task_id)
+        if index is None:
+            return False
+        shard = self._shards[index]
+        if not shard["process"].is_alive():
+            return False
+        shard["conn"].send(("stop", task_id))
+        return True
+
+    def profile_task(self, task_id, seconds):
+        """Asks the worker process running a task to profile it; the result is reported in the log."""
+        index = self._task_shards.get(task_id)
+        if index is None or not self._shards[index]["process"].is_alive():
+            return False
+        self._shards[index]["conn"].send(("profile", task_id, seconds))
+        return True
+
+    def loads(self):
+        return [{"index": s["index"], "alive": s["process"].is_alive(), "tasks": len(s["tasks"]),
+                 "cpu_percent": s["cpu_percent"]} for s in self._shards]
+
+    def poll(self):
+        """Returns pending messages from the workers without blocking.
+
+        Messages are ``("status", task_id, status)``, ``("finished", task_id)``
+        and ``("metrics", shard_index, data)``. Tasks of a worker process that
+        died are reported with an error status and as finished.
+        """
+        messages = []
+        for shard in self._shards:
+            conn = shard["conn"]
+            try:
+                while conn.poll():
+                    message = conn.recv()
+                    self._note(shard, message)
+                    messages.append(message)
+            except (EOFError, OSError):
+                pass
+            if not shard["process"].is_alive() and shard["tasks"]:
+                logging.error(f"Worker process {shard['index']} exited (code {shard['process'].exitcode}).")
+                for task_id in list(shard["tasks"]):
+                    messages.append(("status", task_id, "Error: Worker process exited"))
+                    messages.append(("finished", task_id))
+                    self._note(shard, ("finished", task_id))
+        return messages
+
+    def _note(self, shard, message):
+        kind = message[0]
+        if kind == "finished":
+            shard["tasks"].discard(message[1])
+            if self._task_shards.get(message[1]) == shard["index"]:
+                del self._task_shards[message[1]]
+        elif kind == "metrics":
+            data = message[2]
+            shard["cpu_percent"] = (CPU_SMOOTHING * data.get("cpu_percent", 0.0)
+                                    + (1 - CPU_SMOOTHING) * shard["cpu_percent"])
+
+    def shutdown(self, timeout=5):
+        for shard in self._shards:
+            try:
+                if shard["process"].is_alive():
+                    shard["conn"].send(("shutdown",))
+            except (EOFError, OSError):
+                pass
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            shard["process"].join(timeout=max(0.1, deadline - time.monotonic()))
+            if shard["process"].is_alive():
+                logging.warning(f"Worker process {shard['index']} did not exit in time; terminating.")
+                shard["process"].terminate()
+            shard["conn"].close()
+        self._shards = []
+        self._task_shards.clear()
+        if self._log_listener:
+            self._log_listener.stop()
+            self._log_listener = None
+        logging.info("Sync worker processes stopped.")
+
+
+# --- Worker Process Side ---
+
+class _ShardHost:
+    """Stands in for SyncApp inside a worker process.
+
+    Callbacks passed to ``after`` run in order on a single thread, like the
+    Tk main loop, and status updates are sent to the parent over the pipe.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self._callbacks = queue.Queue()
+        self._thread = threading.Thread(target=self._run_callbacks, name="ShardMain", daemon=True)
+        self._thread.start()
+
+    def _run_callbacks(self):
+        while True:
+            func, args = self._callbacks.get()
+            if func is None:
+                return
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"Worker process callback {getattr(func, '__name__', func)} failed: {e}")
+
+    def after(self, ms, func, *args):
+        if ms:
+            timer = threading.Timer(ms / 1000.0, self._callbacks.put, args=((func, args),))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._callbacks.put((func, args))
+
+    def send(self, message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (EOFError, OSError):
+                pass # Parent went away; the command loop will notice
+
+    def update_task_status(self, task_id, status):
+        self.send(("status", task_id, status))
+
+    def close(self):
+        self._callbacks.put((None, None))
+        self._thread.join(timeout=5)
+
+
+def _shard_main(conn, index, log_queue):
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.DEBUG)
+    threading.current_thread().name = f"SyncShard-{index}"
+
+    # Imported here so the parent never pays for it unless the pool is used
+    from sync_core import run_sync_task, stop_task_runtime
+    from dest_queue import HEALTHY
+    import profiling
+
+    host = _ShardHost(conn)
+    tasks = {}
+    last_metrics = time.monotonic()
+    last_cpu = time.process_time()
+    logging.info(f"Worker process {index} (pid {os.getpid()}) ready.")
+
+    def run(task_id, task_info):
+        try:
+            run_sync_task(host, task_id, task_info)
+        finally:
+            # Behind the status updates the task already queued, so "finished" is the last word
+            host.after(0, host.send, ("finished", task_id))
+
+    running = True
+    while running:
+        try:
+            has_command = conn.poll(0.5)
+        except (EOFError, OSError):
+            break
+        if has_command:
+            try:
+                command = conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = command[0]
+            if kind == "start":
+                task_id, config = command[1], command[2]
+                task_info = dict(config, status="Starting...", observer=None, stop_event=threading.Event())
+                task_info["thread"] = threading.Thread(target=run, args=(task_id, task_info),
+                                                       name=f"SyncWorker-{task_id}", daemon=True)
+                tasks[task_id] = task_info
+                task_info["thread"].start()
+            elif kind == "stop":
+                task_info = tasks.get(command[1])
+                if task_info:
+                    stop_task_runtime(command[1], task_info)
+            elif kind == "profile":
+                profiling.profile_task(command[1], command[2])
+            elif kind == "shutdown":
+                running = False
+
+        for task_id in [t for t, info in tasks.items() if not info["thread"].is_alive()]:
+            del tasks[task_id]
+
+        now = time.monotonic()
+        if now - last_metrics >= METRICS_INTERVAL:
+            cpu = time.process_time()
+            task_metrics = {}
+            for task_id, info in tasks.items():
+                handler = info.get("handler")
+                dest_queues = info.get("dest_queues") or []
+                task_metrics[task_id] = {"events": handler.event_count if handler else 0,
+                                         "queued": sum(len(q) for q in dest_queues),
+                                         "spilled": sum(q.queue.spilled for q in dest_queues),
+                                         "unhealthy": sum(1 for q in dest_queues if q.state != HEALTHY)}
+            host.send(("metrics", index, {"pid": os.getpid(), "cpu_percent": 100.0 * (cpu - last_cpu) / (now - last_metrics),
+                                          "tasks": task_metrics}))
+            last_metrics, last_cpu = now, cpu
+
+    for task_id, task_info in tasks.items():
+        stop_task_runtime(task_id, task_info)
+    for task_info in tasks.values():
+        task_info["thread"].join(timeout=5)
+    if profiling.ENABLED:
+        logging.info(f"Worker process {index} timing spans:\n{profiling.span_report()}")
+    host.close()
+    logging.info(f"Worker process {index} exiting.")
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import marshal
+import logging
+import threading
+import functools
+import contextlib
+from collections import Counter
+
+# --- Configuration ---
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".syncapp", "profiles")
+SAMPLE_INTERVAL = 0.005      # Seconds between stack samples
+PROFILE_SECONDS = 30         # Default length of an on-demand profile
+MAX_STACK_DEPTH = 128        # Deeper stacks are cut at the root end
+
+# Timing spans are recorded only while this is set; SYNC_TRACE=1 turns them on at import (also in worker processes)
+ENABLED = os.environ.get("SYNC_TRACE", "") not in ("", "0")
+
+_stats = {}   # span name -> [count, total seconds, max seconds]
+_stats_lock = threading.Lock()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+# --- Timing Spans ---
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+def record(name, seconds):
+    with _stats_lock:
+        entry = _stats.get(name)
+        if entry is None:
+            _stats[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+def traced(name):
+    """Decorator timing every call of a function as span ``name`` while tracing is on.
+
+    When tracing is off a call costs one global lookup and a branch on top of
+    the wrapped call.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+@contextlib.contextmanager
+def _span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def span(name):
+    """Context manager timing a block as span ``name``; a shared no-op when tracing is off."""
+    return _span(name) if ENABLED else _NULL_SPAN
+
+def span_stats():
+    """Returns ``{name: {"count", "total", "mean", "max"}}`` for the spans recorded so far."""
+    with _stats_lock:
+        return {name: {"count": count, "total": total, "mean": total / count, "max": longest}
+                for name, (count, total, longest) in _stats.items()}
+
+def reset_span_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def span_report():
+    stats = span_stats()
+    if not stats:
+        return "No spans recorded."
+    lines = [f"{'span':<28}{'count':>9}{'total s':>11}{'mean ms':>10}{'max ms':>10}"]
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{name:<28}{s['count']:>9}{s['total']:>11.3f}{s['mean'] * 1000:>10.2f}{s['max'] * 1000:>10.2f}")
+    return "\n".join(lines)
+
+
+# --- Sampling Profiler ---
+
+class SamplingProfiler(threading.Thread):
+    """Samples the stacks of running threads with ``sys._current_frames()``.
+
+    Needs no cooperation from the profiled code, so it can be attached to a
+    task that is already running and costs nothing when not in use. Only
+    threads whose name contains ``thread_filter`` (e.g. a task ID: the
+    ``SyncWorker-``, ``SyncDest-`` and ``SyncStable-`` threads carry it) are
+    sampled, or all threads when it is None. Stops after ``duration`` seconds
+    or on ``stop()``.
+    """
+
+    def __init__(self, duration=PROFILE_SECONDS, thread_filter=None, interval=SAMPLE_INTERVAL):
+        super().__init__(name="SyncProfiler", daemon=True)
+        self.duration = duration
+        self.thread_filter = thread_filter
+        self.interval = interval
+        self.samples = 0      # Sampling rounds taken
+        self.elapsed = 0.0
+        self._stacks = Counter()  # (thread name, ((filename, firstlineno, funcname), ...) root first) -> hits
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration if self.duration else None
+        while not self._stopping.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == self.ident or (self.thread_filter and self.thread_filter not in name):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self._stacks[(name, tuple(reversed(stack)))] += 1
+            self.samples += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self.elapsed = time.monotonic() - started
+
+    @property
+    def seconds_per_sample(self):
+        return self.elapsed / self.samples if self.samples else self.interval
+
+    def write_collapsed(self, path):
+        """Writes ``thread;frame;frame... count`` lines, as read by flamegraph.pl and speedscope."""
+        with open(path, "w", encoding="utf-8") as f:
+            for (thread_name, stack), hits in self._stacks.most_common():
+                frames = [thread_name] + [f"{func} ({os.path.basename(filename)}:{line})" for filename, line, func in stack]
+                f.write(f"{';'.join(frame.replace(';', ':') for frame in frames)} {hits}\n")
+
+    def write_pstats(self, path):
+        """Writes the samples in the ``marshal`` format of ``cProfile``, loadable with ``pstats.Stats(path)``.
+
+        Times are estimated from sample counts; call counts are sample hits.
+        """
+        seconds = self.seconds_per_sample
+        stats = {}  # func -> [cc, nc, tt, ct, {caller: [cc, nc, tt, ct]}]
+        for (_, stack), hits in self._stacks.items():
+            elapsed = hits * seconds
+            for depth, func in enumerate(stack):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                if func not in stack[:depth]: # Recursion counts once per sample
+                    entry[0] += hits
+                    entry[1] += hits
+                    entry[3] += elapsed
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += hits
+                    caller[1] += hits
+                    caller[3] += elapsed
+            if stack:
+                stats[stack[-1]][2] += elapsed
+        with open(path, "wb") as f:
+            marshal.dump({func: (cc, nc, tt, ct, {caller: tuple(v) for caller, v in callers.items()})
+                          for func, (cc, nc, tt, ct, callers) in stats.items()}, f)
+
+
+def profile_task(task_id=None, seconds=PROFILE_SECONDS, profile_dir=PROFILE_DIR, on_done=None):
+    """Profiles a running task (or the whole process) for ``seconds`` in the background.
+
+    Samples the task's threads and turns timing spans on for the duration,
+    then writes ``<name>.pstats``, ``<name>.collapsed`` and ``<name>.spans.txt``
+    to ``profile_dir`` and calls ``on_done(base_path)``. Returns the profiler.
+    """
+    was_enabled = ENABLED
+    if not was_enabled:
+        reset_span_stats()
+        enable()
+    profiler = SamplingProfiler(seconds, thread_filter=task_id)
+    log_prefix = f"[Task {task_id}] " if task_id else ""
+
+    def finish():
+        profiler.join()
+        if not was_enabled:
+            enable(False)
+        base_path = os.path.join(profile_dir, f"{task_id or 'process'}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.write_pstats(base_path + ".pstats")
+            profiler.write_collapsed(base_path + ".collapsed")
+            with open(base_path + ".spans.txt", "w", encoding="utf-8") as f:
+                f.write(span_report() + "\n")
+        except OSError as e:
+            logging.error(f"{log_prefix}Profile could not be written: {e}")
+            return
+        logging.info(f"{log_prefix}Profile of {profiler.samples} samples written to {base_path}.*\n{span_report()}")
+        if on_done:
+            on_done(base_path)
+
+    profiler.start()
+    threading.Thread(target=finish, name="SyncProfilerDump", daemon=True).start()
+    return profiler
+
+
+# --- Command Line (print a saved profile) ---
+if __name__ == "__main__":
+    import pstats
+    if len(sys.argv) < 2:
+        print("Usage: python profiling.py <profile.pstats> [sort key, default cumulative] [limit, default 30]")
+        sys.exit(1)
+    sort_key = sys.argv[2] if len(sys.argv) > 2 else "cumulative"
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    pstats.Stats(sys.argv[1]).sort_stats(sort_key).print_stats(limit)
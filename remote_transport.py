@@ -0,0 +1,549 @@
+import os
+import sys
+import json
+import stat
+import zlib
+import uuid
+import hmac
+import errno
+import shutil
+import socket
+import struct
+import logging
+import threading
+import socketserver
+from concurrent import futures
+from urllib.parse import urlsplit, parse_qs
+
+# --- Configuration ---
+URL_SCHEME = "sync"              # Remote destinations are written sync://host:port[?compress=1]
+TOKEN_ENV = "SYNC_AGENT_TOKEN"   # Shared secret for the agent; kept out of URLs so it never reaches configs or logs
+DEFAULT_HOST = "127.0.0.1"       # The agent only listens on loopback unless told otherwise
+DEFAULT_PORT = 8765
+PROTOCOL_VERSION = 1
+MAX_FRAME = 64 * 1024 * 1024     # Larger frames are a protocol error
+PUT_BLOCK = 1024 * 1024          # File bytes per data frame
+COMPRESS_LEVEL = 1               # zlib level for compressed puts; favours speed
+LIST_BATCH = 5000                # Entries per frame of a streamed listing
+MAX_PIPELINED = 256              # Requests the client keeps in flight before waiting for replies
+CONNECT_TIMEOUT = 5.0
+REQUEST_TIMEOUT = 300.0
+PING_TIMEOUT = 5.0
+TEMP_SUFFIX = ".synctmp"
+
+# Entry kinds in listings (same values as planner.py)
+FILE, DIRECTORY = 1, 2
+
+_HEADER = struct.Struct(">I")
+
+
+class RemoteError(OSError):
+    """An operation failed on the agent (the error is the agent's)."""
+
+
+def is_remote(dest_root):
+    return isinstance(dest_root, str) and dest_root.startswith(URL_SCHEME + "://")
+
+def parse_url(url):
+    """Returns ``(host, port, token, compress)`` of a ``sync://`` destination."""
+    parts = urlsplit(url)
+    if parts.scheme != URL_SCHEME or not parts.hostname:
+        raise ValueError(f"not a {URL_SCHEME}:// destination: {url}")
+    query = parse_qs(parts.query)
+    token = os.environ.get(TOKEN_ENV)
+    compress = query.get("compress", ["0"])[0] not in ("0", "", "false")
+    return parts.hostname, parts.port or DEFAULT_PORT, token, compress
+
+
+# --- Framing ---
+# Every frame is a 4-byte big-endian length followed by that many bytes. Requests and
+# replies are JSON objects; a "put" request is followed by raw data frames and an empty
+# frame that ends the file.
+
+def _send_frame(sock, payload):
+    header = _HEADER.pack(len(payload))
+    if len(payload) < 65536:
+        sock.sendall(header + payload) # Small frames go out as one segment
+    else:
+        sock.sendall(header)
+        sock.sendall(payload)
+
+def _send_json(sock, message):
+    _send_frame(sock, json.dumps(message, separators=(",", ":")).encode("utf-8"))
+
+def _recv_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ConnectionError("connection closed")
+    return data
+
+def _recv_frame(stream):
+    (size,) = _HEADER.unpack(_recv_exact(stream, 4))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"frame of {size} bytes exceeds the limit")
+    return _recv_exact(stream, size) if size else b""
+
+def _recv_json(stream):
+    return json.loads(_recv_frame(stream))
+
+
+# --- Client ---
+
+class RemoteClient:
+    """Connection to a sync agent, shared by everything that writes to one ``sync://`` destination.
+
+    Requests are pipelined: ``submit`` sends a request and returns a future at
+    once, and a reader thread completes futures as replies arrive, matched by
+    request ID. A file is streamed in data frames behind its ``put`` request,
+    compressed with zlib when the URL says ``compress=1``. A broken connection
+    fails the pending requests with ``ConnectionError``; the next request
+    reconnects.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.host, self.port, self.token, self.compress = parse_url(url)
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = {}        # request ID -> (future, partial listing entries or None)
+        self._next_id = 0
+        self._window = threading.BoundedSemaphore(MAX_PIPELINED)
+
+    # --- Connection ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sock.makefile("rb", buffering=256 * 1024)
+        _send_json(sock, {"op": "hello", "version": PROTOCOL_VERSION, "token": self.token})
+        reply = _recv_json(reader)
+        if not reply.get("ok"):
+            sock.close()
+            raise PermissionError(f"agent at {self.host}:{self.port} refused the connection: {reply.get('error')}")
+        sock.settimeout(None)
+        self._sock = sock
+        threading.Thread(target=self._read_replies, args=(sock, reader), name=f"SyncRemote-{self.host}:{self.port}",
+                         daemon=True).start()
+        logging.info(f"Remote: connected to agent {self.host}:{self.port} (root {reply.get('root')})")
+
+    def _read_replies(self, sock, reader):
+        try:
+            while True:
+                reply = _recv_json(reader)
+                with self._lock:
+                    future, entries = self._pending.get(reply.get("id"), (None, None))
+                    if future is None:
+                        continue
+                    if reply.get("more"):
+                        entries.extend(reply.get("entries", []))
+                        continue
+                    del self._pending[reply["id"]]
+                self._window.release()
+                if reply.get("ok"):
+                    if entries is not None:
+                        reply["entries"] = entries + reply.get("entries", [])
+                    future.set_result(reply)
+                else:
+                    future.set_exception(RemoteError(reply.get("errno") or errno.EIO, reply.get("error", "remote error")))
+        except (OSError, ValueError) as e:
+            self._fail_pending(sock, e)
+
+    def _fail_pending(self, sock, error):
+        with self._lock:
+            if self._sock is not sock:
+                return # Already handled; the pending requests may belong to a newer connection
+            self._sock = None
+            pending, self._pending = self._pending, {}
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future, _ in pending.values():
+            self._window.release()
+            future.set_exception(ConnectionError(f"lost connection to agent {self.host}:{self.port}: {error}"))
+
+    def close(self):
+        with self._send_lock:
+            if self._sock is not None:
+                self._sock.close()
+
+    # --- Requests ---
+
+    def submit(self, message, data=None, throttle=None):
+        """Sends one request (followed by the bytes of file object ``data`` for puts) and returns a future."""
+        future = futures.Future()
+        self._window.acquire()
+        with self._send_lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                sock = self._sock
+                with self._lock:
+                    self._next_id += 1
+                    message["id"] = self._next_id
+                    self._pending[message["id"]] = (future, [] if message["op"] == "list" else None)
+            except OSError:
+                self._window.release()
+                raise
+            try:
+                _send_json(sock, message)
+                if data is not None:
+                    self._stream(sock, data, message.get("compress"), throttle)
+            except OSError as e:
+                self._fail_pending(sock, e)
+        return future
+
+    def _stream(self, sock, data, compress, throttle):
+        compressor = zlib.compressobj(COMPRESS_LEVEL) if compress else None
+        while True:
+            block = data.read(PUT_BLOCK)
+            if not block:
+                break
+            if throttle is not None:
+                throttle.consume(len(block))
+            if compressor is not None:
+                block = compressor.compress(block)
+            if block:
+                _send_frame(sock, block)
+        if compressor is not None:
+            tail = compressor.flush()
+            if tail:
+                _send_frame(sock, tail)
+        _send_frame(sock, b"")
+
+    def request(self, message, timeout=REQUEST_TIMEOUT):
+        return self.submit(message).result(timeout)
+
+    def submit_put(self, src_path, relative_path, throttle=None):
+        """Streams a local file to ``relative_path``; the agent writes a temp file and renames it into place."""
+        st = os.stat(src_path)
+        with open(src_path, "rb") as f:
+            return self.submit({"op": "put", "path": relative_path, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                "mode": stat.S_IMODE(st.st_mode), "compress": self.compress}, f, throttle)
+
+    def put(self, src_path, relative_path, throttle=None):
+        return self.submit_put(src_path, relative_path, throttle).result(REQUEST_TIMEOUT)
+
+    def mkdir(self, relative_path):
+        return self.request({"op": "mkdir", "path": relative_path})
+
+    def delete(self, relative_path, trash=False):
+        return self.request({"op": "delete", "path": relative_path, "trash": trash})
+
+    def rename(self, old_path, new_path):
+        return self.request({"op": "rename", "path": old_path, "to": new_path})
+
+    def stat(self, relative_path):
+        return self.request({"op": "stat", "path": relative_path})
+
+    def batch(self, ops):
+        """Runs many metadata operations in one round trip; returns one result dict per operation."""
+        return self.request({"op": "batch", "ops": ops})["results"]
+
+    def list_tree(self, relative_path=""):
+        """Returns ``[(relative path, kind, size, mtime_ns)]`` for everything under a remote directory."""
+        return self.request({"op": "list", "path": relative_path})["entries"]
+
+    def ping(self):
+        try:
+            self.submit({"op": "ping"}).result(PING_TIMEOUT)
+            return True
+        except (OSError, futures.TimeoutError):
+            return False
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(url):
+    """The shared client of a ``sync://`` destination."""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = RemoteClient(url)
+        return client
+
+
+# --- Sync Operations on Remote Destinations ---
+
+def remote_sync_item(src_path, url, relative_path, options=None):
+    """``sync_item`` for a remote destination: a directory is created, a file streamed."""
+    client = get_client(url)
+    if os.path.isdir(src_path):
+        client.mkdir(relative_path)
+    else:
+        client.put(src_path, relative_path, (options or {}).get("throttle"))
+
+def remote_delete_item(url, relative_path, options=None):
+    get_client(url).delete(relative_path, trash=bool((options or {}).get("trash_retention_hours")))
+
+def plan_remote(source_root, url, excluded=None):
+    """Returns ``(mkdirs, puts)``: relative paths of the directories and files a remote destination lacks.
+
+    One streamed listing tells what the agent has; a file is sent when it is
+    missing or its size or mtime differ.
+    """
+    remote = {entry[0].replace("/", os.sep): tuple(entry[1:]) for entry in get_client(url).list_tree()}
+    mkdirs, puts = [], []
+    for dirpath, dirnames, filenames in os.walk(source_root):
+        rel_dir = os.path.relpath(dirpath, source_root)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        kept = []
+        for name in dirnames:
+            rel_path = os.path.join(rel_dir, name)
+            if excluded and excluded(rel_path, True):
+                continue
+            kept.append(name)
+            if remote.get(rel_path, (None,))[0] != DIRECTORY:
+                mkdirs.append(rel_path)
+        dirnames[:] = kept
+        for name in filenames:
+            rel_path = os.path.join(rel_dir, name)
+            if excluded and excluded(rel_path, False):
+                continue
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            if remote.get(rel_path) != (FILE, st.st_size, st.st_mtime_ns):
+                puts.append(rel_path)
+    return mkdirs, puts
+
+def remote_initial_sync(source_root, url, excluded=None, options=None, stop_event=None):
+    """Copies what differs from the source to a remote destination.
+
+    Missing directories are made in one batch, and changed files are streamed
+    back to back without waiting for each reply. Returns
+    ``[(src, dst, error)]``, or None if ``stop_event`` was set.
+    """
+    client = get_client(url)
+    throttle = (options or {}).get("throttle")
+    mkdirs, puts = plan_remote(source_root, url, excluded)
+    errors = []
+    if mkdirs:
+        for rel_path, result in zip(mkdirs, client.batch([{"op": "mkdir", "path": p} for p in mkdirs])):
+            if not result.get("ok"):
+                errors.append((None, f"{url}/{rel_path}", result.get("error")))
+    pending = []
+    for rel_path in puts:
+        if stop_event is not None and stop_event.is_set():
+            break
+        src = os.path.join(source_root, rel_path)
+        try:
+            pending.append((src, rel_path, client.submit_put(src, rel_path, throttle)))
+        except OSError as e:
+            errors.append((src, f"{url}/{rel_path}", str(e)))
+    for src, rel_path, future in pending:
+        try:
+            future.result(REQUEST_TIMEOUT)
+        except (OSError, futures.TimeoutError) as e:
+            errors.append((src, f"{url}/{rel_path}", str(e)))
+    if stop_event is not None and stop_event.is_set():
+        return None
+    logging.info(f"Remote: initial sync to {url}: {len(mkdirs)} directories, {len(puts)} files sent.")
+    return errors
+
+
+# --- Agent ---
+
+class AgentServer(socketserver.ThreadingTCPServer):
+    """Receives sync operations for one root directory; run with ``python remote_transport.py serve <root>``.
+
+    Every path in a request is relative to the root, and anything that would
+    resolve outside it (absolute paths, ``..``, symlinks leading out) is
+    refused. With a token, a connection must present it before anything else.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, trash_hours=24.0):
+        self.root = os.path.realpath(root)
+        self.token = token
+        self.trash_hours = trash_hours
+        os.makedirs(self.root, exist_ok=True)
+        super().__init__((host, port), _AgentHandler)
+
+    def resolve(self, relative_path):
+        if not isinstance(relative_path, str) or os.path.isabs(relative_path) or "\0" in relative_path:
+            raise PermissionError(errno.EACCES, f"invalid path: {relative_path!r}")
+        parts = [p for p in relative_path.replace("\\", "/").split("/") if p not in ("", ".")]
+        if ".." in parts:
+            raise PermissionError(errno.EACCES, f"path leaves the root: {relative_path}")
+        if not parts:
+            return self.root
+        full_path = os.path.join(self.root, *parts)
+        parent = os.path.realpath(os.path.dirname(full_path))
+        if parent != self.root and not parent.startswith(self.root + os.sep):
+            raise PermissionError(errno.EACCES, f"path leaves the root: {relative_path}")
+        return full_path
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    rbufsize = 256 * 1024
+
+    def handle(self):
+        server = self.server
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            hello = _recv_json(self.rfile)
+            if hello.get("op") != "hello" or (server.token and not hmac.compare_digest(
+                    str(hello.get("token") or ""), server.token)):
+                _send_json(self.request, {"ok": False, "error": "authentication failed"})
+                return
+            _send_json(self.request, {"ok": True, "version": PROTOCOL_VERSION, "root": server.root})
+            while True:
+                message = _recv_json(self.rfile)
+                reply = {"id": message.get("id")}
+                try:
+                    if message.get("op") == "list":
+                        self._list(message, reply)
+                        continue
+                    reply.update(self._execute(message))
+                    reply["ok"] = True
+                except Exception as e:
+                    reply.update(ok=False, error=getattr(e, "strerror", None) or str(e), errno=getattr(e, "errno", None))
+                _send_json(self.request, reply)
+        except (ConnectionError, OSError, ValueError):
+            pass
+
+    def _execute(self, message):
+        op = message.get("op")
+        server = self.server
+        if op == "ping":
+            return {}
+        if op == "batch":
+            results = []
+            for sub in message.get("ops", []):
+                try:
+                    results.append(dict(self._execute(sub), ok=True))
+                except Exception as e:
+                    results.append({"ok": False, "error": getattr(e, "strerror", None) or str(e), "errno": getattr(e, "errno", None)})
+            return {"results": results}
+        if op == "put":
+            return self._put(message)
+        path = server.resolve(message.get("path"))
+        if op == "mkdir":
+            if os.path.lexists(path) and not os.path.isdir(path):
+                self._remove(path, True)
+            os.makedirs(path, exist_ok=True)
+        elif op == "delete":
+            if os.path.lexists(path):
+                self._remove(path, message.get("trash"))
+        elif op == "rename":
+            target = server.resolve(message.get("to"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        elif op == "stat":
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return {"kind": 0}
+            return {"kind": DIRECTORY if stat.S_ISDIR(st.st_mode) else FILE, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        else:
+            raise ValueError(f"unknown operation {op!r}")
+        return {}
+
+    def _put(self, message):
+        # The data frames must be consumed even when the file cannot be written
+        try:
+            path = self.server.resolve(message.get("path"))
+        except PermissionError:
+            self._drain()
+            raise
+        decompressor = zlib.decompressobj() if message.get("compress") else None
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}{TEMP_SUFFIX}")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            out = open(tmp_path, "wb")
+        except OSError:
+            self._drain()
+            raise
+        try:
+            with out:
+                while True:
+                    block = _recv_frame(self.rfile)
+                    if not block:
+                        break
+                    out.write(decompressor.decompress(block) if decompressor else block)
+                if decompressor:
+                    out.write(decompressor.flush())
+            if os.path.getsize(tmp_path) != message.get("size"):
+                raise RemoteError(errno.EIO, f"size mismatch for {message.get('path')}")
+            os.chmod(tmp_path, message.get("mode", 0o644))
+            os.utime(tmp_path, ns=(message["mtime_ns"], message["mtime_ns"]))
+            if os.path.isdir(path) and not os.path.islink(path):
+                self._remove(path, True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+        return {}
+
+    def _drain(self):
+        while _recv_frame(self.rfile):
+            pass
+
+    def _remove(self, path, trash):
+        if trash and self.server.trash_hours:
+            from trash import move_to_trash
+            move_to_trash(self.server.root, os.path.relpath(path, self.server.root))
+        elif os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def _list(self, message, reply):
+        root = self.server.resolve(message.get("path") or "")
+        skip_top = (".sync_trash", ".sync_versions") # snapshots.RESERVED_NAMES; the agent runs on its own
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+            if rel_dir == ".":
+                rel_dir = ""
+                dirnames[:] = [d for d in dirnames if d not in skip_top]
+            for name in dirnames:
+                entries.append([f"{rel_dir}/{name}" if rel_dir else name, DIRECTORY, 0, 0])
+            for name in filenames:
+                if name.endswith(TEMP_SUFFIX):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                entries.append([f"{rel_dir}/{name}" if rel_dir else name, FILE, st.st_size, st.st_mtime_ns])
+            if len(entries) >= LIST_BATCH:
+                _send_json(self.request, {"id": reply["id"], "ok": True, "more": True, "entries": entries})
+                entries = []
+        _send_json(self.request, dict(reply, ok=True, entries=entries))
+
+
+# --- Command Line (run an agent) ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Receive sync operations for a directory over TCP.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run an agent for a destination root")
+    serve.add_argument("root")
+    serve.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default {DEFAULT_HOST})")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--token", default=os.environ.get(TOKEN_ENV), help="Shared secret clients must send")
+    serve.add_argument("--trash-hours", type=float, default=24.0, help="Keep deleted items this long (0 = delete at once)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.token:
+        logging.warning("Agent listens beyond loopback without a token; anyone who can connect can write to the root.")
+    agent = AgentServer(args.root, args.host, args.port, args.token, args.trash_hours)
+    if args.trash_hours:
+        from trash import get_reaper
+        get_reaper().register(agent.root, args.trash_hours)
+    logging.info(f"Agent serving {agent.root} on {args.host}:{agent.server_address[1]}")
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.server_close()
+    sys.exit(0)
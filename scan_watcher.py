@@ -0,0 +1,233 @@
+import os
+import time
+import logging
+import threading
+from array import array
+from path_store import PathStore, ROOT_ID
+
+# --- Configuration ---
+MIN_SCAN_INTERVAL = 2.0     # Seconds between scans while the tree is changing
+MAX_SCAN_INTERVAL = 60.0    # Seconds between scans once the tree has been quiet for a while
+FULL_RESCAN_EVERY = 10      # Every Nth scan re-stats every file, even in unchanged directories
+HOT_WINDOW = 300.0          # Directories holding a file modified this recently are re-listed every scan
+COMPACT_RATIO = 2.0         # Rebuild the path store once it holds this many times the live names and directories
+
+
+class _ScanEvent:
+    """Minimal stand-in for a watchdog event, as far as SyncEventHandler needs one."""
+    __slots__ = ("event_type", "src_path", "dest_path", "is_directory")
+
+    def __init__(self, event_type, src_path, is_directory):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.dest_path = None
+        self.is_directory = is_directory
+
+
+class _DirState:
+    """Snapshot of one directory: its mtime plus parallel arrays for its entries."""
+    __slots__ = ("mtime_ns", "names", "is_dir", "sizes", "mtimes", "newest_mtime")
+
+    def __init__(self, mtime_ns):
+        self.mtime_ns = mtime_ns
+        self.names = array("I")    # Entry name IDs (PathStore), sorted by name
+        self.is_dir = bytearray()  # 1 for subdirectories
+        self.sizes = array("q")
+        self.mtimes = array("q")   # st_mtime_ns
+        self.newest_mtime = 0      # Newest file mtime in seconds, for the hot check
+
+
+class ScanningObserver(threading.Thread):
+    """Change detection for sources that inotify & co. cannot watch (NFS/SMB shares).
+
+    Drop-in replacement for a watchdog ``Observer`` with one recursive watch.
+    Instead of re-stating the whole tree on every pass like watchdog's
+    ``PollingObserver``, it keeps an array-backed snapshot per directory and
+    only re-lists a directory when its own mtime changed, when it recently
+    held changing files, or on a periodic full rescan (content changes do not
+    touch the directory mtime). The interval shrinks while changes keep coming
+    and grows back while the tree is quiet.
+    """
+
+    def __init__(self, min_interval=MIN_SCAN_INTERVAL, max_interval=MAX_SCAN_INTERVAL,
+                 full_rescan_every=FULL_RESCAN_EVERY):
+        super().__init__(name="ScanningObserver", daemon=True)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_rescan_every = full_rescan_every
+        self.interval = min_interval
+        self._handler = None
+        self._root = None
+        self._paths = PathStore()
+        self._snapshot = {}  # directory path ID (ROOT_ID for the root) -> _DirState
+        self._stopped = threading.Event()
+        self._scan_count = 0
+        self.last_scan_stats = {}
+
+    def schedule(self, event_handler, path, recursive=True):
+        if not recursive:
+            raise ValueError("ScanningObserver only supports recursive watches")
+        self._handler = event_handler
+        self._root = os.path.abspath(path)
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        self._scan(emit=False)
+        logging.info(f"Scanning observer: initial snapshot of {self._root} has {len(self._snapshot)} directories.")
+        while not self._stopped.wait(self.interval):
+            try:
+                changes = self._scan(emit=True)
+            except Exception as e:
+                logging.error(f"Scanning observer: scan of {self._root} failed: {e}")
+                changes = 0
+            if changes:
+                self.interval = max(self.min_interval, self.interval / 2)
+            else:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+
+    # --- Scanning ---
+
+    def _scan(self, emit):
+        self._scan_count += 1
+        full = not emit or self._scan_count % self.full_rescan_every == 0
+        now = time.time()
+        stats = {"listed": 0, "skipped": 0, "changes": 0, "full": full}
+        pending = [ROOT_ID]
+        while pending and not self._stopped.is_set():
+            dir_id = pending.pop()
+            rel_dir = self._paths.path(dir_id)
+            abs_dir = os.path.join(self._root, rel_dir) if rel_dir else self._root
+            try:
+                dir_mtime = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue # Vanished; the parent's listing reports it
+            old = self._snapshot.get(dir_id)
+            if (old is not None and not full and old.mtime_ns == dir_mtime
+                    and now - old.newest_mtime > HOT_WINDOW):
+                # Same listing as last time: only descend into the known subdirectories
+                stats["skipped"] += 1
+                pending.extend(self._subdirs(dir_id, old))
+                continue
+            stats["listed"] += 1
+            new = self._list_dir(abs_dir, dir_mtime)
+            if new is None:
+                continue
+            self._snapshot[dir_id] = new
+            if emit:
+                stats["changes"] += self._diff(rel_dir, old, new)
+            pending.extend(self._subdirs(dir_id, new))
+        if full and not self._stopped.is_set():
+            self._compact_if_needed()
+        self.last_scan_stats = stats
+        if emit and stats["changes"]:
+            logging.debug(f"Scanning observer: {stats}")
+        return stats["changes"]
+
+    def _subdirs(self, dir_id, state):
+        return [self._paths.child(dir_id, self._paths.name_of(name_id))
+                for name_id, is_dir in zip(state.names, state.is_dir) if is_dir]
+
+    def _list_dir(self, abs_dir, dir_mtime):
+        state = _DirState(dir_mtime)
+        try:
+            entries = sorted(os.scandir(abs_dir), key=lambda e: e.name)
+        except OSError as e:
+            logging.warning(f"Scanning observer: cannot list {abs_dir}: {e}")
+            return None
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            state.names.append(self._paths.intern_name(entry.name))
+            state.is_dir.append(1 if is_dir else 0)
+            state.sizes.append(0 if is_dir else st.st_size)
+            state.mtimes.append(0 if is_dir else st.st_mtime_ns)
+            if not is_dir and st.st_mtime > state.newest_mtime:
+                state.newest_mtime = st.st_mtime
+        return state
+
+    def _diff(self, rel_dir, old, new):
+        """Emits events for the differences between two listings of one directory."""
+        name_of = self._paths.name_of
+        if old is None:
+            # A directory we have not seen before: everything in it is new
+            for name_id, is_dir in zip(new.names, new.is_dir):
+                self._emit("created", _join(rel_dir, name_of(name_id)), bool(is_dir))
+            return len(new.names)
+        changes = 0
+        old_index = {name_id: i for i, name_id in enumerate(old.names)}
+        for j, name_id in enumerate(new.names):
+            i = old_index.pop(name_id, None)
+            rel_path = _join(rel_dir, name_of(name_id))
+            if i is None:
+                self._emit("created", rel_path, bool(new.is_dir[j]))
+                changes += 1
+            elif old.is_dir[i] != new.is_dir[j]:
+                self._forget(self._paths.lookup(rel_path))
+                self._emit("deleted", rel_path, bool(old.is_dir[i]))
+                self._emit("created", rel_path, bool(new.is_dir[j]))
+                changes += 1
+            elif not new.is_dir[j] and (old.sizes[i] != new.sizes[j] or old.mtimes[i] != new.mtimes[j]):
+                self._emit("modified", rel_path, False)
+                changes += 1
+        for name_id, i in old_index.items():
+            rel_path = _join(rel_dir, name_of(name_id))
+            if old.is_dir[i]:
+                self._forget(self._paths.lookup(rel_path))
+            self._emit("deleted", rel_path, bool(old.is_dir[i]))
+            changes += 1
+        return changes
+
+    def _forget(self, dir_id):
+        """Drops the snapshot of a directory and everything below it."""
+        state = self._snapshot.pop(dir_id, None)
+        if state is not None:
+            for name_id, is_dir in zip(state.names, state.is_dir):
+                if is_dir:
+                    self._forget(self._paths.child(dir_id, self._paths.name_of(name_id), create=False))
+
+    # --- Compaction ---
+
+    def _compact_if_needed(self):
+        # Names and directories that were deleted keep their IDs; drop them once they dominate
+        live_names = sum(len(state.names) for state in self._snapshot.values())
+        held = self._paths.name_count() + len(self._paths)
+        if held > COMPACT_RATIO * (live_names + len(self._snapshot)) + 1024:
+            self._compact()
+
+    def _compact(self):
+        """Replaces the path store with one holding only the current snapshot's names and directories."""
+        old_paths, paths = self._paths, PathStore()
+        snapshot = {}
+        pending = [(ROOT_ID, ROOT_ID)]
+        while pending:
+            old_id, new_id = pending.pop()
+            state = self._snapshot.get(old_id)
+            if state is None:
+                continue
+            names = [old_paths.name_of(name_id) for name_id in state.names]
+            state.names = array("I", [paths.intern_name(name) for name in names])
+            snapshot[new_id] = state
+            for name, is_dir in zip(names, state.is_dir):
+                if is_dir:
+                    child_id = old_paths.child(old_id, name, create=False)
+                    if child_id is not None:
+                        pending.append((child_id, paths.child(new_id, name)))
+        logging.debug(f"Scanning observer: path store compacted from {len(old_paths)} to {len(paths)} paths, "
+                      f"{old_paths.name_count()} to {paths.name_count()} names.")
+        self._paths, self._snapshot = paths, snapshot
+
+    def _emit(self, event_type, rel_path, is_directory):
+        event = _ScanEvent(event_type, os.path.join(self._root, rel_path), is_directory)
+        try:
+            getattr(self._handler, f"on_{event_type}")(event)
+        except Exception as e:
+            logging.error(f"Scanning observer: handler failed for {event_type} {rel_path}: {e}")
+
+
+def _join(rel_dir, name):
+    return os.path.join(rel_dir, name) if rel_dir else name
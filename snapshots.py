@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import logging
+import threading
+from trash import TRASH_DIR_NAME
+from dest_queue import OFFLINE
+
+# --- Configuration ---
+VERSIONS_DIR_NAME = ".sync_versions"  # Point-in-time snapshots, at the top of the destination
+PARTIAL_SUFFIX = ".partial"           # Snapshot still being built; never used as a link base
+RESERVED_NAMES = (VERSIONS_DIR_NAME, TRASH_DIR_NAME)
+SNAPSHOT_CHECK_INTERVAL = 30.0        # Seconds between checks whether a snapshot is due
+
+
+def versions_root(dest_root):
+    return os.path.join(dest_root, VERSIONS_DIR_NAME)
+
+def atomic_copy(copy_function):
+    """Wraps a copy function so it writes to a temp file and renames it over the target.
+
+    Snapshots hardlink destination files, so a file must never be rewritten in
+    place once it has been synced: the rename gives the new content a new inode
+    and leaves the snapshotted one untouched.
+    """
+    def copy(src, dst):
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        tmp_path = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{uuid.uuid4().hex[:8]}.synctmp")
+        try:
+            copy_function(src, tmp_path)
+            os.replace(tmp_path, dst)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+        return dst
+    return copy
+
+def list_snapshots(dest_root):
+    """Returns the names of a destination's complete snapshots, oldest first."""
+    try:
+        names = os.listdir(versions_root(dest_root))
+    except OSError:
+        return []
+    return sorted(n for n in names if not n.endswith(PARTIAL_SUFFIX))
+
+def take_snapshot(dest_root):
+    """Records the destination as it is now under ``.sync_versions/<timestamp>``.
+
+    Files unchanged since the previous snapshot (same size and mtime) are
+    hardlinked to it; all others are hardlinked to the live destination file.
+    Only a filesystem without hardlinks makes this copy data. Returns
+    ``(name, linked, copied)``.
+    """
+    root = versions_root(dest_root)
+    previous = list_snapshots(dest_root)
+    previous_dir = os.path.join(root, previous[-1]) if previous else None
+    name = time.strftime("%Y%m%d-%H%M%S")
+    if name in previous:
+        name += f"-{uuid.uuid4().hex[:4]}"
+    partial_dir = os.path.join(root, name + PARTIAL_SUFFIX)
+    os.makedirs(partial_dir)
+    linked = copied = 0
+    for dirpath, dirnames, filenames in os.walk(dest_root):
+        rel_dir = os.path.relpath(dirpath, dest_root)
+        if rel_dir == ".":
+            rel_dir = ""
+            dirnames[:] = [d for d in dirnames if d not in RESERVED_NAMES]
+        snap_dir = os.path.join(partial_dir, rel_dir)
+        os.makedirs(snap_dir, exist_ok=True)
+        for dirname in dirnames:
+            if os.path.islink(os.path.join(dirpath, dirname)):
+                filenames.append(dirname) # os.walk does not descend into directory symlinks
+        for filename in filenames:
+            live = os.path.join(dirpath, filename)
+            target = os.path.join(snap_dir, filename)
+            try:
+                if os.path.islink(live):
+                    os.symlink(os.readlink(live), target)
+                    continue
+                if filename.endswith(".synctmp"):
+                    continue # A copy in progress
+                base = live
+                if previous_dir:
+                    old = os.path.join(previous_dir, rel_dir, filename)
+                    if _same_file_state(old, live):
+                        base = old
+                try:
+                    os.link(base, target)
+                    linked += 1
+                except OSError:
+                    shutil.copy2(live, target)
+                    copied += 1
+            except FileNotFoundError:
+                continue # Deleted while we walked
+    os.rename(partial_dir, os.path.join(root, name))
+    return name, linked, copied
+
+def prune_snapshots(dest_root, keep):
+    """Deletes the oldest snapshots (and leftover partial ones) beyond ``keep``."""
+    root = versions_root(dest_root)
+    for stale in [n for n in (os.listdir(root) if os.path.isdir(root) else []) if n.endswith(PARTIAL_SUFFIX)]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+    snapshots = list_snapshots(dest_root)
+    for name in snapshots[:max(0, len(snapshots) - keep)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        logging.info(f"Versions: pruned snapshot {name} of {dest_root}")
+
+def restore_from_snapshot(dest_root, snapshot, relative_path, target=None):
+    """Copies a file or directory out of a snapshot (to its original place unless ``target`` is given)."""
+    source = os.path.join(versions_root(dest_root), snapshot, relative_path)
+    if not os.path.lexists(source):
+        raise FileNotFoundError(f"{relative_path} is not in snapshot {snapshot}")
+    target = target or os.path.join(dest_root, relative_path)
+    if os.path.isdir(source) and not os.path.islink(source):
+        shutil.copytree(source, target, symlinks=True, dirs_exist_ok=True, copy_function=atomic_copy(shutil.copy2))
+    else:
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        # Copy, never link: the restored file may be edited in place
+        atomic_copy(shutil.copy2)(source, target)
+    return target
+
+def _same_file_state(path_a, path_b):
+    try:
+        a, b = os.stat(path_a), os.stat(path_b)
+    except OSError:
+        return False
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+class SnapshotScheduler(threading.Thread):
+    """Takes a snapshot of each destination of a task every ``interval_minutes``.
+
+    A destination is only snapshotted when its queue applied changes since the
+    last snapshot (or it has none yet) and it is not offline. Runs off the copy
+    path entirely; the hot path only pays for the temp-file-and-rename writes.
+    """
+
+    def __init__(self, task_id, dest_queues, keep, interval_minutes, stop_event):
+        super().__init__(name=f"SyncVersions-{task_id}", daemon=True)
+        self.dest_queues = dest_queues
+        self.keep = keep
+        self.interval = max(1, interval_minutes) * 60.0
+        self.stop_event = stop_event
+        self.log_prefix = f"[Task {task_id}] "
+        self._last = {}  # dest_root -> (monotonic time, completed ops) at the last snapshot
+
+    def run(self):
+        while not self.stop_event.is_set():
+            for dest_queue in self.dest_queues:
+                if self.stop_event.is_set():
+                    break
+                if dest_queue.state != OFFLINE and self._due(dest_queue):
+                    self._snapshot(dest_queue)
+            self.stop_event.wait(min(SNAPSHOT_CHECK_INTERVAL, self.interval))
+
+    def _due(self, dest_queue):
+        last = self._last.get(dest_queue.dest_root)
+        if last is None:
+            if not list_snapshots(dest_queue.dest_root):
+                return True
+            last = self._last[dest_queue.dest_root] = (time.monotonic(), dest_queue.completed)
+        last_time, last_completed = last
+        return time.monotonic() - last_time >= self.interval and dest_queue.completed != last_completed
+
+    def _snapshot(self, dest_queue):
+        dest_root = dest_queue.dest_root
+        completed = dest_queue.completed
+        started = time.monotonic()
+        try:
+            name, linked, copied = take_snapshot(dest_root)
+            prune_snapshots(dest_root, self.keep)
+        except OSError as e:
+            logging.error(f"{self.log_prefix}Versions: snapshot of {dest_root} failed: {e}")
+            return
+        finally:
+            self._last[dest_root] = (time.monotonic(), completed)
+        logging.info(f"{self.log_prefix}Versions: snapshot {name} of {dest_root} ({linked} linked, {copied} copied) "
+                     f"in {time.monotonic() - started:.1f}s")
+
+
+# --- Command Line (list / snapshot / restore) ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect and restore versioned snapshots of a sync destination.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List snapshots").add_argument("destination")
+    sub.add_parser("snapshot", help="Take a snapshot now").add_argument("destination")
+    restore_parser = sub.add_parser("restore", help="Copy a file or directory out of a snapshot")
+    restore_parser.add_argument("destination")
+    restore_parser.add_argument("snapshot")
+    restore_parser.add_argument("relative_path")
+    restore_parser.add_argument("--to", help="Restore here instead of the original location")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "list":
+            for name in list_snapshots(args.destination):
+                print(name)
+        elif args.command == "snapshot":
+            print("Snapshot {} ({} linked, {} copied)".format(*take_snapshot(args.destination)))
+        else:
+            print(f"Restored {restore_from_snapshot(args.destination, args.snapshot, args.relative_path, args.to)}")
+    except OSError as e:
+        print(f"{args.command} failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,146 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+# --- Configuration ---
+STABILITY_POLL_INTERVAL = 0.5      # Seconds between size/mtime checks of held files
+APPEND_MIN_BYTES = 1024 * 1024     # Smaller destination files are simply recopied
+APPEND_BLOCK = 1024 * 1024
+
+
+class StabilityTracker(threading.Thread):
+    """Holds files that are still being written until they settle.
+
+    A held file is handed to ``on_ready(relative_path, src_path)`` once its
+    writer closes it (``IN_CLOSE_WRITE``, delivered by watchdog as
+    ``on_closed``) or its size and mtime have not changed for
+    ``stable_seconds``. Further events for a held file only restart the wait,
+    so a growing log or download is copied once instead of on every write.
+    """
+
+    def __init__(self, task_id, stable_seconds, on_ready, stop_event):
+        super().__init__(name=f"SyncStable-{task_id}", daemon=True)
+        self.stable_seconds = stable_seconds
+        self.on_ready = on_ready
+        self.stop_event = stop_event
+        self.log_prefix = f"[Task {task_id}] "
+        self._held = {}  # relative_path -> [src_path, size, mtime_ns, last_change]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._held)
+
+    def hold(self, relative_path, src_path):
+        size, mtime_ns = _stat(src_path)
+        with self._lock:
+            self._held[relative_path] = [src_path, size, mtime_ns, time.monotonic()]
+
+    def closed(self, relative_path, src_path):
+        """The writer closed the file: release it now if held. Returns whether it was."""
+        with self._lock:
+            if self._held.pop(relative_path, None) is None:
+                return False # Already released, or synced without being held
+        self._release(relative_path, src_path)
+        return True
+
+    def held_paths(self):
+        with self._lock:
+            return list(self._held)
+
+    def forget(self, relative_path):
+        with self._lock:
+            self._held.pop(relative_path, None)
+
+    def run(self):
+        while not self.stop_event.wait(STABILITY_POLL_INTERVAL):
+            now = time.monotonic()
+            ready = []
+            with self._lock:
+                items = list(self._held.items())
+            for relative_path, entry in items:
+                size, mtime_ns = _stat(entry[0])
+                if size is None:
+                    self.forget(relative_path) # Gone; its delete event takes care of the destinations
+                elif (size, mtime_ns) != (entry[1], entry[2]):
+                    entry[1], entry[2], entry[3] = size, mtime_ns, now
+                elif now - entry[3] >= self.stable_seconds:
+                    ready.append((relative_path, entry))
+            for relative_path, entry in ready:
+                with self._lock:
+                    if self._held.get(relative_path) is not entry:
+                        continue # Re-held or released meanwhile
+                    del self._held[relative_path]
+                self._release(relative_path, entry[0])
+
+    def _release(self, relative_path, src_path):
+        logging.debug(f"{self.log_prefix}Stable: {relative_path}")
+        try:
+            self.on_ready(relative_path, src_path)
+        except Exception as e:
+            logging.error(f"{self.log_prefix}Could not queue stable file {relative_path}: {e}")
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_size, st.st_mtime_ns
+
+
+# --- Append-Only Tail Copy ---
+
+def append_tail(src, dst, throttle=None):
+    """Copies only the new end of a file that has grown by appending.
+
+    The existing destination must be shorter than the source, must not be
+    newer than it, and must match the source byte for byte over its whole
+    length; a file rewritten in the middle and grown is therefore recopied in
+    full. Reading the prefix back still saves writing it again, which is what
+    is slow on network destinations. Only the bytes present when it started
+    are appended, and the destination gets the mtime of that state, so a file
+    still growing (or rewritten meanwhile) is checked again on its next event.
+    Returns False (having written nothing) when the checks fail.
+    """
+    try:
+        dst_st = os.stat(dst)
+        src_st = os.stat(src)
+    except OSError:
+        return False
+    dst_size = dst_st.st_size
+    if dst_size < APPEND_MIN_BYTES or dst_size >= src_st.st_size or dst_st.st_mtime_ns > src_st.st_mtime_ns:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "r+b") as fdst:
+        remaining = dst_size
+        while remaining:
+            length = min(APPEND_BLOCK, remaining)
+            if fsrc.read(length) != fdst.read(length):
+                return False
+            remaining -= length
+        fdst.seek(dst_size)
+        remaining = src_st.st_size - dst_size
+        while remaining:
+            block = fsrc.read(min(APPEND_BLOCK, remaining))
+            if not block:
+                break # Truncated meanwhile; its next event recopies it
+            if throttle is not None:
+                throttle.consume(len(block))
+            fdst.write(block)
+            remaining -= len(block)
+    shutil.copymode(src, dst)
+    os.utime(dst, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    return True
+
+def tail_append_copy_function(copy_function, throttle=None):
+    """Wraps a copy function so grown append-only files only get their new tail copied."""
+    def copy(src, dst):
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        if append_tail(src, dst, throttle):
+            logging.debug(f"Appended new tail of {src} to {dst}")
+            return dst
+        return copy_function(src, dst)
+    return copy
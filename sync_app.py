@@ -1,24 +1,34 @@
+import time
+_STARTUP_T0 = time.perf_counter() # Reference point for the startup timings
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import filedialog, messagebox, Listbox, font as tkfont # Added tkfont
+from tkinter import filedialog, messagebox, simpledialog, Listbox, font as tkfont # Added tkfont
 import os
-import json
+import sys
 import threading # For running sync tasks in background
-import time
 import uuid
 import logging # Import logging
 import logging.handlers # For file handler
-import shutil # For initial sync and file operations
-from watchdog.observers import Observer # Watchdog imports
-from watchdog.events import FileSystemEventHandler
+import argparse
+from collections import deque
+from config_store import ConfigStore, PERSISTED_FIELDS, TASK_DEFAULTS, normalize_task
+# sync_core (watchdog), async_engine, process_pool, profiling and remote_transport are imported on first use
+# so the window can appear before any task machinery is loaded.
 
 # --- Configuration ---
-ctk.set_appearance_mode("System")
-ctk.set_default_color_theme("blue")
-
 CONFIG_FILE = "sync_config.json"
+# Resolve the config next to the application instead of the current working directory
+APP_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, "frozen", False) else __file__))
+CONFIG_PATH = os.path.join(APP_DIR, CONFIG_FILE)
 LOG_DIR_NAME = "SyncAppLogs" # Folder within Documents
 LOG_FILE_NAME = "sync_app.log"
+ENGINE_MODES = ["thread", "async"] # "async" runs file ops on the shared asyncio engine
+WATCHER_MODES = ["native", "scan"] # "scan" detects changes by snapshot scanning (network shares)
+VERIFY_MODES = ["sample", "hash", "none"] # Check of large-file (chunked) copies
+SYNC_MODES = ["one_way", "two_way"] # "two_way" syncs changes in both directions (one destination)
+CONFLICT_POLICIES = ["newer_wins", "source_wins", "keep_both"] # Two-way: files edited on both sides
+MAX_CONCURRENT_STARTS = 2 # Initial syncs allowed to run at once when starting many tasks
+START_STAGGER_MS = 500 # Delay between queued task starts
 
 # --- Setup Logging ---
 def setup_logging():
@@ -51,162 +61,6 @@ def setup_logging():
     except Exception as e:
         logging.error(f"Failed to set up file logging: {e}")
 
-# --- Helper Functions (Unchanged) ---
-
-def sync_item(src_path, dest_path_root, relative_path, app_instance=None, task_id=None):
-    full_src_path = src_path
-    full_dest_path = os.path.join(dest_path_root, relative_path)
-    dest_parent_dir = os.path.dirname(full_dest_path)
-    log_prefix = f"[Task {task_id}] " if task_id else ""
-
-    try:
-        if not os.path.exists(full_src_path):
-            logging.warning(f"{log_prefix}Source {full_src_path} disappeared before sync.")
-            return
-
-        if not os.path.exists(dest_parent_dir):
-            if dest_parent_dir != dest_path_root and dest_parent_dir:
-                 try:
-                     os.makedirs(dest_parent_dir, exist_ok=True)
-                     logging.info(f"{log_prefix}Created parent directory: {dest_parent_dir}")
-                 except OSError as e:
-                     logging.error(f"{log_prefix}Failed to create parent directory {dest_parent_dir}: {e}")
-                     return
-
-        if os.path.isdir(full_src_path):
-            if not os.path.exists(full_dest_path):
-                try:
-                    os.makedirs(full_dest_path, exist_ok=True)
-                    logging.info(f"{log_prefix}Created directory: {full_dest_path}")
-                except OSError as e:
-                     logging.error(f"{log_prefix}Failed to create directory {full_dest_path}: {e}")
-        elif os.path.isfile(full_src_path):
-            try:
-                if os.path.isdir(full_dest_path):
-                     logging.warning(f"{log_prefix}Destination {full_dest_path} is a directory, removing before copying file.")
-                     shutil.rmtree(full_dest_path)
-                shutil.copy2(full_src_path, full_dest_path)
-                logging.info(f"{log_prefix}Copied: {os.path.basename(full_src_path)} to {dest_path_root}")
-            except Exception as e:
-                 logging.error(f"{log_prefix}Failed to copy file {full_src_path} to {full_dest_path}: {e}")
-
-    except Exception as e:
-        logging.error(f"{log_prefix}Error syncing {full_src_path} to {full_dest_path}: {e}")
-        if app_instance:
-             app_instance.after(0, app_instance.update_task_status, task_id, f"Error: Sync failed")
-
-def delete_item(dest_path_root, relative_path, app_instance=None, task_id=None):
-    full_dest_path = os.path.join(dest_path_root, relative_path)
-    log_prefix = f"[Task {task_id}] " if task_id else ""
-    try:
-        if os.path.lexists(full_dest_path):
-            if os.path.isdir(full_dest_path) and not os.path.islink(full_dest_path):
-                shutil.rmtree(full_dest_path)
-                logging.info(f"{log_prefix}Deleted directory: {full_dest_path}")
-            else:
-                os.remove(full_dest_path)
-                logging.info(f"{log_prefix}Deleted file/link: {full_dest_path}")
-    except Exception as e:
-        logging.error(f"{log_prefix}Error deleting {full_dest_path}: {e}")
-        if app_instance:
-             app_instance.after(0, app_instance.update_task_status, task_id, f"Error: Delete failed")
-
-# --- Watchdog Event Handler (Unchanged) ---
-class SyncEventHandler(FileSystemEventHandler):
-    def __init__(self, task_id, source_root, destination_roots, app_instance):
-        super().__init__()
-        self.task_id = task_id
-        self.source_root = os.path.abspath(source_root)
-        self.destination_roots = [os.path.abspath(d) for d in destination_roots]
-        self.app = app_instance
-        self.log_prefix = f"[Task {self.task_id}] "
-        logging.info(f"{self.log_prefix}EventHandler initialized for source: {self.source_root}")
-
-    def _get_relative_path(self, src_path):
-        src_path_norm = os.path.normpath(src_path)
-        source_root_norm = os.path.normpath(self.source_root)
-        if src_path_norm == source_root_norm:
-            return "."
-        try:
-            if not src_path_norm.startswith(source_root_norm + os.sep) and src_path_norm != source_root_norm :
-                 logging.warning(f"{self.log_prefix}Event path {src_path_norm} seems outside source root {source_root_norm}. Ignoring.")
-                 return None
-            return os.path.relpath(src_path_norm, source_root_norm)
-        except ValueError as e:
-            logging.error(f"{self.log_prefix}Could not get relative path for {src_path_norm} based on {source_root_norm}: {e}")
-            return None
-
-    def process(self, event_type, event):
-        src_path = getattr(event, 'src_path', None)
-        dest_path = getattr(event, 'dest_path', None)
-
-        if event.is_directory and event_type == "modified":
-            logging.debug(f"{self.log_prefix}Ignoring directory modification: {src_path}")
-            return
-        if src_path and os.path.abspath(src_path) == self.source_root and event_type not in ["deleted", "moved_from"]:
-            logging.debug(f"{self.log_prefix}Ignoring event on source root directory itself: {event_type} {src_path}")
-            return
-
-        logging.debug(f"{self.log_prefix}Raw Event: type={event_type}, src={src_path}, dest={dest_path}, is_dir={event.is_directory}")
-
-        path_to_process = src_path
-        relative_path = None
-        relative_path_del = None
-
-        if event_type.startswith("moved"):
-             relative_path_del = self._get_relative_path(src_path)
-             path_to_process = dest_path
-             relative_path = self._get_relative_path(path_to_process)
-        else:
-             path_to_process = src_path
-             relative_path = self._get_relative_path(path_to_process)
-             relative_path_del = relative_path
-
-        if relative_path is None and not event_type == "deleted":
-             if not (event_type == "moved_from" and relative_path_del is not None):
-                logging.warning(f"{self.log_prefix}Could not determine relative path for {path_to_process}. Skipping event.")
-                return
-
-        logging.info(f"{self.log_prefix}{event_type.capitalize()}: {relative_path if relative_path is not None else 'N/A'}"
-                     f"{' -> ' + self._get_relative_path(dest_path) if event_type.startswith('moved') and dest_path else ''}"
-                     f" (Is Dir: {event.is_directory})")
-
-        if event_type == "deleted" or event_type == "moved_from":
-            if relative_path_del is None:
-                 logging.warning(f"{self.log_prefix}Cannot process delete/move_from for invalid relative path from {src_path}.")
-                 return
-            for dest_root in self.destination_roots:
-                self.app.after(0, delete_item, dest_root, relative_path_del, self.app, self.task_id)
-        elif event_type == "created" or event_type == "modified" or event_type == "moved_to":
-            if relative_path is None:
-                 logging.warning(f"{self.log_prefix}Cannot process create/modify/move_to for invalid relative path from {path_to_process}.")
-                 return
-            if os.path.exists(path_to_process): # Check existence before syncing
-                 for dest_root in self.destination_roots:
-                     self.app.after(0, sync_item, path_to_process, dest_root, relative_path, self.app, self.task_id)
-            else:
-                 logging.warning(f"{self.log_prefix}Source {path_to_process} not found shortly after {event_type} event.")
-
-    def on_created(self, event):
-        logging.debug(f"{self.log_prefix}on_created triggered for: {event.src_path}")
-        self.process("created", event)
-
-    def on_deleted(self, event):
-        logging.debug(f"{self.log_prefix}on_deleted triggered for: {event.src_path}")
-        self.process("deleted", event)
-
-    def on_modified(self, event):
-        if not event.is_directory:
-            logging.debug(f"{self.log_prefix}on_modified triggered for file: {event.src_path}")
-            self.process("modified", event)
-        else:
-            logging.debug(f"{self.log_prefix}Ignoring on_modified for directory: {event.src_path}")
-
-    def on_moved(self, event):
-        logging.debug(f"{self.log_prefix}on_moved triggered: {event.src_path} -> {event.dest_path}")
-        self.process("moved_from", event)
-        self.process("moved_to", event)
-
 # --- Add Task Dialog Class ---
 class AddTaskDialog(ctk.CTkToplevel):
     def __init__(self, parent):
@@ -214,12 +68,25 @@ class AddTaskDialog(ctk.CTkToplevel):
         self.parent_app = parent
 
         self.title("Add New Sync Task")
-        self.geometry("600x450")
+        self.geometry("600x820")
         self.resizable(False, False)
         self.transient(parent)
         self.grab_set()
 
         self.source_path = tk.StringVar()
+        self.engine_mode = tk.StringVar(value=ENGINE_MODES[0])
+        self.watcher_mode = tk.StringVar(value=WATCHER_MODES[0])
+        self.workers = tk.StringVar(value="0")
+        self.throttle = tk.StringVar(value="0")
+        self.trash_hours = tk.StringVar(value=str(TASK_DEFAULTS["trash_retention_hours"]))
+        self.versions_keep = tk.StringVar(value=str(TASK_DEFAULTS["versions_keep"]))
+        self.large_file_mb = tk.StringVar(value=str(TASK_DEFAULTS["large_file_threshold_mb"]))
+        self.verify_mode = tk.StringVar(value=TASK_DEFAULTS["large_file_verify"])
+        self.stable_seconds = tk.StringVar(value=str(TASK_DEFAULTS["stable_seconds"]))
+        self.append_tail = tk.BooleanVar(value=TASK_DEFAULTS["append_tail"])
+        self.mirror_deletes = tk.BooleanVar(value=TASK_DEFAULTS["mirror_deletes"])
+        self.sync_mode = tk.StringVar(value=TASK_DEFAULTS["mode"])
+        self.conflict_policy = tk.StringVar(value=TASK_DEFAULTS["conflict_policy"])
         self.current_destinations = []
 
         # **MODIFIED:** Use a CTkFont for the Listbox to match other widgets better
@@ -257,11 +124,49 @@ class AddTaskDialog(ctk.CTkToplevel):
 
         self.add_dest_button = ctk.CTkButton(dest_button_frame, text="Add Destination", command=self.add_destination_folder)
         self.add_dest_button.pack(side=tk.LEFT, padx=5)
+        self.add_remote_button = ctk.CTkButton(dest_button_frame, text="Add Remote...", command=self.add_remote_destination)
+        self.add_remote_button.pack(side=tk.LEFT, padx=5)
         self.remove_dest_button = ctk.CTkButton(dest_button_frame, text="Remove Selected", command=self.remove_destination)
         self.remove_dest_button.pack(side=tk.LEFT, padx=5)
 
+        options_frame = ctk.CTkFrame(self)
+        options_frame.grid(row=3, column=0, columnspan=2, padx=10, pady=(0,5), sticky="ew")
+        ctk.CTkLabel(options_frame, text="Engine:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.engine_menu = ctk.CTkOptionMenu(options_frame, values=ENGINE_MODES, variable=self.engine_mode)
+        self.engine_menu.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Watcher:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.watcher_menu = ctk.CTkOptionMenu(options_frame, values=WATCHER_MODES, variable=self.watcher_mode)
+        self.watcher_menu.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Workers (0 = default):").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.workers, width=60).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Throttle MB/s (0 = off):").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.throttle, width=60).grid(row=1, column=3, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Include:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.include_entry = ctk.CTkEntry(options_frame, placeholder_text="*.txt, docs/*")
+        self.include_entry.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="ew")
+        ctk.CTkLabel(options_frame, text="Exclude:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.exclude_entry = ctk.CTkEntry(options_frame, placeholder_text="*.tmp, .git")
+        self.exclude_entry.grid(row=3, column=1, columnspan=3, padx=5, pady=5, sticky="ew")
+        ctk.CTkLabel(options_frame, text="Keep deleted (hours, 0 = off):").grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.trash_hours, width=60).grid(row=4, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Versions kept (0 = off):").grid(row=4, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.versions_keep, width=60).grid(row=4, column=3, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Large files from (MB, 0 = off):").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.large_file_mb, width=60).grid(row=5, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Verify large files:").grid(row=5, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkOptionMenu(options_frame, values=VERIFY_MODES, variable=self.verify_mode, width=90).grid(row=5, column=3, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Wait until stable (s, 0 = off):").grid(row=6, column=0, padx=5, pady=5, sticky="w")
+        ctk.CTkEntry(options_frame, textvariable=self.stable_seconds, width=60).grid(row=6, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkCheckBox(options_frame, text="Copy appended tails only", variable=self.append_tail).grid(row=6, column=2, columnspan=2, padx=5, pady=5, sticky="w")
+        ctk.CTkCheckBox(options_frame, text="Initial sync deletes items not in the source", variable=self.mirror_deletes).grid(row=7, column=0, columnspan=4, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Direction:").grid(row=8, column=0, padx=5, pady=5, sticky="w")
+        ctk.CTkOptionMenu(options_frame, values=SYNC_MODES, variable=self.sync_mode, width=90).grid(row=8, column=1, padx=5, pady=5, sticky="w")
+        ctk.CTkLabel(options_frame, text="Two-way conflicts:").grid(row=8, column=2, padx=5, pady=5, sticky="w")
+        ctk.CTkOptionMenu(options_frame, values=CONFLICT_POLICIES, variable=self.conflict_policy, width=110).grid(row=8, column=3, padx=5, pady=5, sticky="w")
+        options_frame.grid_columnconfigure(1, weight=1)
+
         button_frame = ctk.CTkFrame(self)
-        button_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10)
         self.save_button = ctk.CTkButton(button_frame, text="Save Task", command=self.save_task)
         self.save_button.pack(side=tk.LEFT, padx=10)
         self.cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=self.destroy)
@@ -295,6 +200,23 @@ class AddTaskDialog(ctk.CTkToplevel):
             self.current_destinations.append(folder_path)
             self.dest_listbox.insert(tk.END, folder_path)
 
+    def add_remote_destination(self):
+        url = simpledialog.askstring("Add Remote Destination", "Agent URL (sync://host:port, add ?compress=1 for slow links):", parent=self)
+        if not url:
+            return
+        url = url.strip()
+        from remote_transport import parse_url
+        try:
+            parse_url(url)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid remote destination:\n{e}", parent=self)
+            return
+        if url in self.current_destinations:
+            messagebox.showwarning("Warning", "This destination has already been added.", parent=self)
+            return
+        self.current_destinations.append(url)
+        self.dest_listbox.insert(tk.END, url)
+
     def remove_destination(self):
         selected_indices = self.dest_listbox.curselection()
         if not selected_indices:
@@ -314,10 +236,19 @@ class AddTaskDialog(ctk.CTkToplevel):
         if not destinations:
             messagebox.showerror("Error", "Please add at least one destination folder.", parent=self)
             return
+        if self.sync_mode.get() == "two_way" and len(destinations) != 1:
+            messagebox.showerror("Error", "Two-way sync needs exactly one destination folder.", parent=self)
+            return
         if not os.path.isdir(source):
              messagebox.showerror("Error", f"Source folder does not exist or is not a directory:\n{source}", parent=self)
              return
+        from remote_transport import is_remote
+        if self.sync_mode.get() == "two_way" and is_remote(destinations[0]):
+            messagebox.showerror("Error", "Two-way sync needs a local destination folder.", parent=self)
+            return
         for dest in destinations:
+             if is_remote(dest):
+                  continue # Checked by the agent when the task starts
              dest_parent = os.path.dirname(dest)
              if not os.path.isdir(dest_parent) and dest_parent != '':
                   messagebox.showerror("Error", f"Parent directory for destination does not exist:\n{dest_parent}", parent=self)
@@ -325,12 +256,41 @@ class AddTaskDialog(ctk.CTkToplevel):
              if os.path.exists(dest) and not os.path.isdir(dest):
                   messagebox.showerror("Error", f"Destination path exists but is not a directory:\n{dest}", parent=self)
                   return
-        self.parent_app.add_task_data(source, destinations)
+        try:
+            workers = int(self.workers.get() or 0)
+            throttle = float(self.throttle.get() or 0)
+            trash_hours = float(self.trash_hours.get() or 0)
+            versions_keep = int(self.versions_keep.get() or 0)
+            large_file_mb = int(self.large_file_mb.get() or 0)
+            stable_seconds = float(self.stable_seconds.get() or 0)
+            if min(workers, throttle, trash_hours, versions_keep, large_file_mb, stable_seconds) < 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Numeric task options must be non-negative numbers.", parent=self)
+            return
+        split_patterns = lambda text: [p.strip() for p in text.split(",") if p.strip()]
+        options = {
+            "engine": self.engine_mode.get(),
+            "watcher": self.watcher_mode.get(),
+            "workers": workers,
+            "throttle_mbps": throttle,
+            "trash_retention_hours": trash_hours,
+            "versions_keep": versions_keep,
+            "large_file_threshold_mb": large_file_mb,
+            "large_file_verify": self.verify_mode.get(),
+            "stable_seconds": stable_seconds,
+            "append_tail": self.append_tail.get(),
+            "mirror_deletes": self.mirror_deletes.get(),
+            "mode": self.sync_mode.get(),
+            "conflict_policy": self.conflict_policy.get(),
+            "filters": {"include": split_patterns(self.include_entry.get()),
+                        "exclude": split_patterns(self.exclude_entry.get())},
+        }
+        self.parent_app.add_task_data(source, destinations, options)
         self.destroy()
 
 # --- Main Application Class ---
 class SyncApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, process_count=0):
         super().__init__()
 
         self.title("Real-Time Sync Tool")
@@ -341,11 +301,19 @@ class SyncApp(ctk.CTk):
         self.sync_tasks = {}
         self.task_frames = {}
         self.selected_task_id = None
+        self.process_count = process_count
+        self.process_pool = None
+        self._start_queue = deque() # Task IDs waiting for an initial sync slot
+        self._starting_task_ids = set() # Task IDs whose initial sync is in progress
+        self._startup_pending_ids = set() # Auto-started task IDs not yet running
+        self.startup_times = {}
+        self._profiling = False # An on-demand profile of the selected task is running
+        self.config_store = ConfigStore(CONFIG_PATH, legacy_paths=[CONFIG_FILE])
 
         # --- Sidebar Frame ---
         self.sidebar_frame = ctk.CTkFrame(self, width=160, corner_radius=0)
         self.sidebar_frame.grid(row=0, column=0, rowspan=4, sticky="nsew")
-        self.sidebar_frame.grid_rowconfigure(8, weight=1)
+        self.sidebar_frame.grid_rowconfigure(10, weight=1)
 
         self.logo_label = ctk.CTkLabel(self.sidebar_frame, text="Sync Tasks", font=ctk.CTkFont(size=20, weight="bold"))
         self.logo_label.grid(row=0, column=0, padx=20, pady=(20, 10))
@@ -371,17 +339,52 @@ class SyncApp(ctk.CTk):
         self.remove_all_tasks_button = ctk.CTkButton(self.sidebar_frame, text="Remove All Tasks", command=self.remove_all_tasks_gui, fg_color="red", hover_color="darkred")
         self.remove_all_tasks_button.grid(row=7, column=0, padx=20, pady=10)
 
+        self.preview_plan_button = ctk.CTkButton(self.sidebar_frame, text="Preview Plan", command=self.preview_selected_plan, state="disabled")
+        self.preview_plan_button.grid(row=8, column=0, padx=20, pady=10)
+
+        self.profile_button = ctk.CTkButton(self.sidebar_frame, text="Profile Task", command=self.profile_selected_task, state="disabled")
+        self.profile_button.grid(row=9, column=0, padx=20, pady=10)
+
+        self.process_status_label = ctk.CTkLabel(self.sidebar_frame, text="", text_color="gray", justify=tk.LEFT)
+        self.process_status_label.grid(row=11, column=0, padx=20, pady=(0, 10), sticky="sw")
+
+        self.startup_label = ctk.CTkLabel(self.sidebar_frame, text="", text_color="gray", justify=tk.LEFT)
+        self.startup_label.grid(row=12, column=0, padx=20, pady=(0, 10), sticky="sw")
 
         # --- Main Content Frame (Scrollable) ---
         self.main_frame = ctk.CTkScrollableFrame(self, corner_radius=0, label_text="Configured Tasks")
         self.main_frame.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
         self.main_frame.grid_columnconfigure(0, weight=1)
 
+        self.add_task_dialog_window = None
+        ctk.CTkLabel(self.main_frame, text="Loading tasks...", text_color="gray").pack(pady=20)
+        self.update_button_states()
+        # Tasks are loaded once the window has been drawn
+        self.after_idle(self._finish_startup)
+
+    def _finish_startup(self):
+        self.update_idletasks()
+        self._record_startup_time("window")
+        if self.process_count > 0:
+            # Tasks run in worker processes; this process only hosts the GUI
+            from process_pool import TaskProcessPool
+            self.process_pool = TaskProcessPool(self.process_count)
+            self.process_pool.start()
+            self.after(200, self._poll_process_pool)
         self.sync_tasks = self.load_tasks()
         self.update_task_display()
+        self.update_button_states()
+        self._record_startup_time("tasks_loaded")
         self.auto_start_all_tasks() # Auto-start tasks after loading and displaying
-        self.add_task_dialog_window = None
+        if not self._startup_pending_ids:
+            self._record_startup_time("tasks_started")
 
+    def _record_startup_time(self, phase):
+        self.startup_times[phase] = time.perf_counter() - _STARTUP_T0
+        logging.info(f"Startup: {phase.replace('_', ' ')} after {self.startup_times[phase] * 1000:.0f} ms")
+        labels = {"window": "Window", "tasks_loaded": "Tasks loaded", "tasks_started": "Tasks running"}
+        self.startup_label.configure(text="Startup:\n" + "\n".join(
+            f"  {labels[p]}: {self.startup_times[p]:.2f} s" for p in labels if p in self.startup_times))
 
     def auto_start_all_tasks(self):
         logging.info("Attempting to auto-start all configured tasks...")
@@ -394,13 +397,37 @@ class SyncApp(ctk.CTk):
             logging.info("No tasks are currently stopped to auto-start.")
             return
 
-        for task_id in tasks_to_start_ids:
-            if task_id in self.sync_tasks:
-                logging.info(f"Auto-starting task {task_id}...")
-                self.selected_task_id = task_id
-                self.start_selected_task() # This will handle GUI updates and threading
-        
-        self.after(100, self._deselect_after_auto_start)
+        logging.info(f"Queueing {len(tasks_to_start_ids)} task(s) for staggered auto-start "
+                     f"(max {MAX_CONCURRENT_STARTS} initial syncs at once).")
+        self._startup_pending_ids.update(tasks_to_start_ids)
+        self.queue_task_starts(tasks_to_start_ids)
+
+    def queue_task_starts(self, task_ids):
+        # Starting many tasks at once would run all their initial syncs in parallel
+        for task_id in task_ids:
+            if task_id in self.sync_tasks and task_id not in self._start_queue:
+                self._start_queue.append(task_id)
+                self.update_task_status(task_id, "Queued")
+        self._pump_start_queue()
+
+    def _pump_start_queue(self):
+        if not self._start_queue or len(self._starting_task_ids) >= MAX_CONCURRENT_STARTS:
+            return
+        task_id = self._start_queue.popleft()
+        self.start_task(task_id)
+        if self._start_queue:
+            self.after(START_STAGGER_MS, self._pump_start_queue)
+
+    def _note_task_start_progress(self, task_id, status):
+        if status in ("Starting...", "Syncing (Initial)...", "Queued"):
+            return
+        if task_id in self._starting_task_ids:
+            self._starting_task_ids.discard(task_id)
+            self.after(START_STAGGER_MS, self._pump_start_queue)
+        if task_id in self._startup_pending_ids:
+            self._startup_pending_ids.discard(task_id)
+            if not self._startup_pending_ids:
+                self._record_startup_time("tasks_started")
 
     def _deselect_after_auto_start(self):
         self.selected_task_id = None
@@ -409,25 +436,17 @@ class SyncApp(ctk.CTk):
 
     def start_all_tasks(self):
         logging.info("Attempting to start all stopped tasks...")
-        started_count = 0
         tasks_to_start_ids = [task_id for task_id, info in self.sync_tasks.items() if info.get("status") == "Stopped"]
 
         if not tasks_to_start_ids:
             messagebox.showinfo("Start All", "No tasks were in a 'Stopped' state to start.")
             return
 
-        for task_id in tasks_to_start_ids:
-            if task_id in self.sync_tasks:
-                self.selected_task_id = task_id
-                self.start_selected_task()
-                started_count +=1
-        
-        self.after(100, self._deselect_after_auto_start)
+        self.queue_task_starts(tasks_to_start_ids)
 
 
     def stop_all_tasks_gui(self):
         logging.info("Attempting to stop all active tasks...")
-        stopped_count = 0
         tasks_to_stop_ids = [
             task_id for task_id, info in self.sync_tasks.items()
             if info.get("status", "Stopped") != "Stopped" and not info.get("status", "").startswith("Error")
@@ -441,7 +460,6 @@ class SyncApp(ctk.CTk):
             if task_id in self.sync_tasks:
                 self.selected_task_id = task_id
                 self.stop_selected_task()
-                stopped_count +=1
         
         self.after(100, self._deselect_after_auto_start)
 
@@ -470,7 +488,7 @@ class SyncApp(ctk.CTk):
         self.selected_task_id = None
         logging.info("All tasks have been removed.")
         self.update_task_display()
-        self.save_tasks()
+        self.config_store.clear()
         self.update_button_states()
         messagebox.showinfo("Remove All Tasks", "All tasks have been removed.")
 
@@ -482,28 +500,28 @@ class SyncApp(ctk.CTk):
         else:
             self.add_task_dialog_window.focus()
 
-    def add_task_data(self, source_path, destination_paths):
+    def add_task_data(self, source_path, destination_paths, options=None):
         task_id = str(uuid.uuid4())[:8]
+        from remote_transport import is_remote
         abs_source = os.path.abspath(source_path)
-        abs_dests = [os.path.abspath(d) for d in destination_paths]
+        abs_dests = [d if is_remote(d) else os.path.abspath(d) for d in destination_paths]
 
         for existing_id, existing_info in self.sync_tasks.items():
             if existing_info['source'] == abs_source:
                  messagebox.showerror("Error", f"Source folder '{abs_source}' is already configured in task {existing_id}.", parent=self.add_task_dialog_window if self.add_task_dialog_window and self.add_task_dialog_window.winfo_exists() else self)
                  return
 
-        new_task = {
-            "source": abs_source,
-            "dests": abs_dests,
+        new_task = normalize_task(dict(options or {}, source=abs_source, dests=abs_dests))
+        new_task.update({
             "status": "Stopped",
             "thread": None,
             "observer": None,
             "stop_event": threading.Event()
-        }
+        })
         self.sync_tasks[task_id] = new_task
         logging.info(f"Added new task {task_id}: Source='{abs_source}'")
         self.update_task_display()
-        self.save_tasks()
+        self.config_store.put(task_id, new_task)
 
         # **MODIFIED:** Auto-start the newly added task
         logging.info(f"Attempting to auto-start newly added task {task_id}...")
@@ -535,10 +553,82 @@ class SyncApp(ctk.CTk):
             self.remove_task_button.configure(state="normal" if not is_effectively_running else "disabled")
             self.start_button.configure(state="normal" if not is_effectively_running else "disabled")
             self.stop_button.configure(state="normal" if is_effectively_running else "disabled")
+            one_way = self.sync_tasks[self.selected_task_id].get("mode") != "two_way" # Plans only cover one-way syncs
+            self.preview_plan_button.configure(state="normal" if task_status == "Stopped" and one_way else "disabled")
+            self.profile_button.configure(state="normal" if is_effectively_running and not self._profiling else "disabled")
         else:
             self.remove_task_button.configure(state="disabled")
             self.start_button.configure(state="disabled")
             self.stop_button.configure(state="disabled")
+            self.preview_plan_button.configure(state="disabled")
+            self.profile_button.configure(state="disabled")
+
+    def profile_selected_task(self):
+        task_id = self.selected_task_id
+        if not task_id or task_id not in self.sync_tasks:
+            return
+        from profiling import PROFILE_DIR, PROFILE_SECONDS, profile_task
+        if self.process_pool and self.sync_tasks[task_id].get("shard") is not None:
+            if not self.process_pool.profile_task(task_id, PROFILE_SECONDS):
+                return
+        else:
+            profile_task(task_id, PROFILE_SECONDS)
+        logging.info(f"[Task {task_id}] Profiling for {PROFILE_SECONDS}s; results go to {PROFILE_DIR}")
+        self._profiling = True
+        self.profile_button.configure(text="Profiling...")
+        self.update_button_states()
+        self.after(PROFILE_SECONDS * 1000 + 1000, self._profile_finished)
+
+    def _profile_finished(self):
+        self._profiling = False
+        self.profile_button.configure(text="Profile Task")
+        self.update_button_states()
+
+    def preview_selected_plan(self):
+        task_id = self.selected_task_id
+        if not task_id or task_id not in self.sync_tasks:
+            return
+        task_info = self.sync_tasks[task_id]
+        self.preview_plan_button.configure(state="disabled", text="Planning...")
+        threading.Thread(target=self._compute_plan_worker, args=(task_id, dict(task_info)), name=f"SyncPlanPreview-{task_id}", daemon=True).start()
+
+    def _compute_plan_worker(self, task_id, task_info):
+        from planner import compute_plan, save_plan
+        from config_store import path_is_excluded
+        from remote_transport import is_remote
+        filters = task_info.get("filters")
+        try:
+            # Remote destinations are compared by their agent when the task starts
+            local_dests = [d for d in task_info["dests"] if not is_remote(d)]
+            plan = compute_plan(task_id, task_info["source"], local_dests,
+                                lambda rel, is_dir: path_is_excluded(rel, filters, is_dir),
+                                mirror_deletes=task_info.get("mirror_deletes", False))
+            save_plan(plan)
+        except Exception as e:
+            logging.error(f"[Task {task_id}] Could not compute plan: {e}")
+            plan = None
+        self.after(0, self._show_plan, task_id, plan)
+
+    def _show_plan(self, task_id, plan):
+        self.preview_plan_button.configure(text="Preview Plan")
+        self.update_button_states()
+        if plan is None:
+            messagebox.showerror("Preview Plan", f"Could not compute a plan for task {task_id}; see the log.")
+            return
+        window = ctk.CTkToplevel(self)
+        window.title(f"Plan for task {task_id}")
+        window.geometry("700x500")
+        window.transient(self)
+        textbox = ctk.CTkTextbox(window, wrap="none")
+        textbox.pack(fill="both", expand=True, padx=10, pady=10)
+        from planner import PLAN_MAX_AGE
+        lines = [plan.summary(), "", f"Starting the task within {PLAN_MAX_AGE / 60:.0f} minutes executes this plan "
+                 "unless the source changes first."]
+        for dest_root, dest_plan in plan.destinations.items():
+            lines.append(f"\n{dest_root}:")
+            lines += [f"  {line}" for line in dest_plan.operations()]
+        textbox.insert("1.0", "\n".join(lines))
+        textbox.configure(state="disabled")
 
     def remove_selected_task(self):
         task_id_to_remove = self.selected_task_id
@@ -563,7 +653,7 @@ class SyncApp(ctk.CTk):
             self.selected_task_id = None
             logging.info(f"Removed task {task_id_to_remove}")
             self.update_task_display()
-            self.save_tasks()
+            self.config_store.delete(task_id_to_remove)
             self.update_button_states()
 
     def start_selected_task(self):
@@ -571,14 +661,18 @@ class SyncApp(ctk.CTk):
         if not current_selected_id or current_selected_id not in self.sync_tasks:
             logging.debug("Start selected: No valid task ID selected or task not found.")
             return
+        self.start_task(current_selected_id)
 
-        task_id = current_selected_id
+    def start_task(self, task_id):
         task_info = self.sync_tasks[task_id]
-        if task_info.get("status", "Stopped") != "Stopped":
+        if task_info.get("status", "Stopped") not in ("Stopped", "Queued"):
             logging.info(f"Task {task_id} is not stopped (current status: {task_info.get('status', 'Unknown')}). Not starting.")
             return
+        if task_id in self._start_queue:
+            self._start_queue.remove(task_id)
 
         task_info["stop_event"].clear()
+        self._starting_task_ids.add(task_id)
         self.update_task_status(task_id, "Starting...")
         self.after(50, self._start_worker_thread, task_id)
 
@@ -586,6 +680,17 @@ class SyncApp(ctk.CTk):
     def _start_worker_thread(self, task_id):
         if task_id not in self.sync_tasks: return
         task_info = self.sync_tasks[task_id]
+        if self.process_pool:
+            if task_info.get("shard") is not None:
+                logging.warning(f"Task {task_id} is already running in worker process {task_info['shard']}.")
+                return
+            try:
+                task_info["shard"] = self.process_pool.start_task(task_id, self._task_config(task_id))
+            except Exception as e:
+                logging.error(f"[Task {task_id}] Failed to start in a worker process: {e}")
+                self.update_task_status(task_id, "Error: No worker process")
+            self.update_task_display()
+            return
         if task_info.get("thread") and task_info["thread"].is_alive():
             logging.warning(f"Worker thread for task {task_id} is already running.")
             return
@@ -613,17 +718,42 @@ class SyncApp(ctk.CTk):
 
         logging.info(f"Stopping task {task_id}...")
         self.update_task_status(task_id, "Stopping...")
-
-        if "stop_event" in task_info:
-            task_info["stop_event"].set()
-        observer = task_info.get("observer")
-        if observer and observer.is_alive():
-            try:
-                observer.stop()
-            except Exception as e:
-                 logging.error(f"Error requesting observer stop for task {task_id}: {e}")
+        self._signal_task_stop(task_id)
         self.update_button_states()
 
+    def _signal_task_stop(self, task_id):
+        task_info = self.sync_tasks[task_id]
+        if task_id in self._start_queue:
+            # Never started, so there is no worker to wait for
+            self._start_queue.remove(task_id)
+            self.update_task_status(task_id, "Stopped")
+        elif self.process_pool and task_info.get("shard") is not None:
+            self.process_pool.stop_task(task_id)
+        else:
+            from sync_core import stop_task_runtime
+            stop_task_runtime(task_id, task_info)
+
+    def _task_config(self, task_id):
+        # Plain, picklable subset of a task handed to a worker process
+        task_info = self.sync_tasks[task_id]
+        return {field: task_info[field] for field in PERSISTED_FIELDS}
+
+    def _poll_process_pool(self):
+        if not self.process_pool:
+            return
+        for message in self.process_pool.poll():
+            kind = message[0]
+            if kind == "status":
+                self.update_task_status(message[1], message[2])
+            elif kind == "finished":
+                self._on_worker_finished(message[1])
+            elif kind == "metrics":
+                loads = self.process_pool.loads()
+                self.process_status_label.configure(text="Worker processes:\n" + "\n".join(
+                    f"  #{l['index']}: {l['tasks']} task(s), {l['cpu_percent']:.0f}% CPU" + ("" if l["alive"] else " (exited)")
+                    for l in loads))
+        self.after(200, self._poll_process_pool)
+
 
     def worker_sync_task(self, task_id):
         task_info = self.sync_tasks.get(task_id)
@@ -631,85 +761,28 @@ class SyncApp(ctk.CTk):
             logging.error(f"[Task {task_id}] Worker: Task data not found.")
             return
 
-        source_path = task_info["source"]
-        dest_paths = task_info["dests"]
-        stop_event = task_info["stop_event"]
-        log_prefix = f"[Task {task_id}] "
-        observer_ref = None
-
+        from sync_core import run_sync_task
         try:
-            logging.info(f"{log_prefix}Worker: Starting initial sync from '{source_path}'...")
-            self.after(0, self.update_task_status, task_id, "Syncing (Initial)...")
-            all_initial_sync_ok = True
-
-            for dest_path in dest_paths:
-                if stop_event.is_set():
-                    logging.info(f"{log_prefix}Worker: Stop requested during initial sync for {dest_path}.")
-                    self.after(0, self.update_task_status, task_id, "Stopped")
-                    return
-                try:
-                    logging.info(f"{log_prefix}Worker: Performing initial sync: '{source_path}' TO '{dest_path}'")
-                    shutil.copytree(source_path, dest_path, dirs_exist_ok=True, copy_function=shutil.copy2)
-                    logging.info(f"{log_prefix}Worker: Initial sync to '{dest_path}' finished.")
-                except Exception as e:
-                    error_msg = f"Error during initial sync to '{dest_path}': {type(e).__name__} - {e}"
-                    logging.error(f"{log_prefix}Worker: {error_msg}")
-                    self.after(0, self.update_task_status, task_id, f"Error: Initial sync ({os.path.basename(dest_path)})")
-                    all_initial_sync_ok = False
-                    return
-
-            if not all_initial_sync_ok: return
-
-            logging.info(f"{log_prefix}Worker: Initial sync complete.")
-            self.after(0, self.update_task_status, task_id, "Running")
-
-            event_handler = SyncEventHandler(task_id, source_path, dest_paths, self)
-            observer_ref = Observer()
-            observer_ref.schedule(event_handler, source_path, recursive=True)
-            task_info["observer"] = observer_ref
-            observer_ref.start()
-            logging.info(f"{log_prefix}Worker: Watchdog observer started.")
-
-            while not stop_event.is_set():
-                if not observer_ref.is_alive():
-                     logging.warning(f"{log_prefix}Worker: Observer thread unexpectedly stopped.")
-                     self.after(0, self.update_task_status, task_id, "Error: Monitor stopped")
-                     break
-                time.sleep(0.5)
-
-            logging.info(f"{log_prefix}Worker: Loop finished (stop event set or observer died).")
-
-        except Exception as e:
-            logging.error(f"{log_prefix}Worker: Unhandled error: {e}")
-            self.after(0, self.update_task_status, task_id, f"Error: Worker failed")
+            run_sync_task(self, task_id, task_info)
         finally:
-            if observer_ref and observer_ref.is_alive():
-                try:
-                    logging.info(f"{log_prefix}Worker: Stopping observer in finally block...")
-                    observer_ref.stop()
-                    observer_ref.join(timeout=5)
-                    if observer_ref.is_alive():
-                         logging.warning(f"{log_prefix}Worker: Observer thread did not join within timeout.")
-                    else:
-                         logging.info(f"{log_prefix}Worker: Observer joined successfully.")
-                except Exception as e:
-                     logging.error(f"{log_prefix}Worker: Exception joining observer in finally: {e}")
-
-            def final_cleanup_on_main_thread():
-                if task_id in self.sync_tasks:
-                    current_status = self.sync_tasks[task_id].get("status", "Unknown")
-                    if not current_status.startswith("Error"):
-                        self.update_task_status(task_id, "Stopped")
-                    self._clear_task_runtime_state(task_id)
-                logging.info(f"{log_prefix}Worker: Thread finished execution.")
-
-            self.after(0, final_cleanup_on_main_thread)
+            self.after(0, self._on_worker_finished, task_id)
+
+    def _on_worker_finished(self, task_id):
+        if task_id in self.sync_tasks:
+            current_status = self.sync_tasks[task_id].get("status", "Unknown")
+            if not current_status.startswith("Error"):
+                self.update_task_status(task_id, "Stopped")
+            self._clear_task_runtime_state(task_id)
+        logging.info(f"[Task {task_id}] Worker: Thread finished execution.")
 
 
     def _clear_task_runtime_state(self, task_id):
          if task_id in self.sync_tasks:
               self.sync_tasks[task_id]["thread"] = None
               self.sync_tasks[task_id]["observer"] = None
+              self.sync_tasks[task_id]["shard"] = None
+              for key in ("handler", "dest_queues", "two_way", "throttle"):
+                   self.sync_tasks[task_id].pop(key, None)
               self.sync_tasks[task_id]["stop_event"] = threading.Event()
               logging.debug(f"Cleared runtime state for task {task_id}")
          self.update_button_states()
@@ -719,6 +792,7 @@ class SyncApp(ctk.CTk):
         if task_id in self.sync_tasks:
             self.sync_tasks[task_id]["status"] = status
             logging.debug(f"Updating status for task {task_id} to {status}")
+            self._note_task_start_progress(task_id, status)
             if task_id in self.task_frames and self.task_frames[task_id].winfo_exists():
                 label_widget = self.sync_tasks[task_id].get("_status_label_widget")
                 if label_widget and label_widget.winfo_exists():
@@ -733,40 +807,17 @@ class SyncApp(ctk.CTk):
 
 
     def load_tasks(self):
-        tasks = {}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    tasks_data = json.load(f)
-                    if isinstance(tasks_data, dict):
-                        tasks = tasks_data
-                        for task_id in tasks:
-                            tasks[task_id]['status'] = 'Stopped'
-                            tasks[task_id]['thread'] = None
-                            tasks[task_id]['observer'] = None
-                            tasks[task_id]['stop_event'] = threading.Event()
-                        logging.info(f"Loaded {len(tasks)} tasks from {CONFIG_FILE}")
-                    else:
-                        logging.warning(f"Invalid format in {CONFIG_FILE}. Starting fresh.")
-            except (json.JSONDecodeError, IOError) as e:
-                logging.error(f"Error loading {CONFIG_FILE}: {e}. Starting fresh.")
-        else:
-             logging.info(f"Config file {CONFIG_FILE} not found. Starting fresh.")
+        tasks = self.config_store.load()
+        for task_id in tasks:
+            tasks[task_id]['status'] = 'Stopped'
+            tasks[task_id]['thread'] = None
+            tasks[task_id]['observer'] = None
+            tasks[task_id]['stop_event'] = threading.Event()
         return tasks
 
     def save_tasks(self):
-        tasks_to_save = {}
-        for task_id, task_info in self.sync_tasks.items():
-            tasks_to_save[task_id] = {
-                "source": task_info["source"],
-                "dests": task_info["dests"]
-            }
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(tasks_to_save, f, indent=4)
-            logging.info(f"Saved {len(tasks_to_save)} tasks to {CONFIG_FILE}")
-        except IOError as e:
-            logging.error(f"Error saving {CONFIG_FILE}: {e}")
+        # Adds and removals are journaled as they happen; this folds them into the snapshot
+        self.config_store.compact()
 
     def update_task_display(self):
         scroll_pos = self.main_frame._parent_canvas.yview() if hasattr(self.main_frame, '_parent_canvas') else (0.0, 0.0)
@@ -790,7 +841,12 @@ class SyncApp(ctk.CTk):
                 task_frame.grid_columnconfigure(1, weight=1)
                 self.task_frames[task_id] = task_frame
 
-                id_label = ctk.CTkLabel(task_frame, text=f"ID: {task_id}", font=ctk.CTkFont(weight="bold"))
+                engine_text = f"  (Engine: {task_info['engine']})" if task_info.get("engine", "thread") != "thread" else ""
+                if task_info.get("watcher", "native") != "native":
+                    engine_text += f"  (Watcher: {task_info['watcher']})"
+                if task_info.get("shard") is not None:
+                    engine_text += f"  (Process #{task_info['shard']})"
+                id_label = ctk.CTkLabel(task_frame, text=f"ID: {task_id}{engine_text}", font=ctk.CTkFont(weight="bold"))
                 id_label.grid(row=0, column=0, padx=5, pady=(5,0), sticky="w")
 
                 status_label = ctk.CTkLabel(task_frame, text=f"Status: {status}", anchor="w")
@@ -825,16 +881,8 @@ class SyncApp(ctk.CTk):
               return False
          for task_id in tasks_to_signal_stop:
               logging.info(f"Signalling stop for task {task_id}")
-              task_info = self.sync_tasks[task_id]
               self.update_task_status(task_id, "Stopping...")
-              if "stop_event" in task_info:
-                  task_info["stop_event"].set()
-              observer = task_info.get("observer")
-              if observer and observer.is_alive():
-                  try:
-                      observer.stop()
-                  except Exception as e:
-                      logging.error(f"Error requesting observer stop for task {task_id} during shutdown: {e}")
+              self._signal_task_stop(task_id)
          return True
 
     def on_closing(self):
@@ -848,14 +896,37 @@ class SyncApp(ctk.CTk):
     def _finalize_close(self):
         logging.info("Finalizing close: saving tasks and destroying window.")
         self.save_tasks()
+        if "async_engine" in sys.modules: # Only loaded if an async task ever ran
+            sys.modules["async_engine"].shutdown_engine()
+        if self.process_pool:
+            self.process_pool.shutdown()
+        profiling = sys.modules.get("profiling") # Only loaded if tracing or a task ever ran
+        if profiling and profiling.ENABLED:
+            logging.info(f"Timing spans:\n{profiling.span_report()}")
         self.destroy()
 
 
 # --- Run the Application ---
 if __name__ == "__main__":
-    import sys # Ensure sys is imported for console_handler
+    import multiprocessing
+    multiprocessing.freeze_support() # Needed for worker processes in frozen (PyInstaller) builds
+
+    parser = argparse.ArgumentParser(description="Real-Time Sync Tool")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Run tasks in this many worker processes (0 = run tasks in this process)")
+    parser.add_argument("--trace", action="store_true",
+                        help="Time event handling, copies, deletes and initial syncs; the totals are logged on exit")
+    args = parser.parse_args()
+    if args.trace:
+        os.environ["SYNC_TRACE"] = "1" # Inherited by worker processes
+        import profiling
+        profiling.enable()
+
+    # Set here rather than at import: spawned worker processes re-import this module as __mp_main__
+    ctk.set_appearance_mode("System")
+    ctk.set_default_color_theme("blue")
     setup_logging()
 
-    app = SyncApp()
+    app = SyncApp(process_count=args.processes)
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
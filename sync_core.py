@@ -0,0 +1,642 @@
+import os
+import time
+import logging
+import shutil
+import threading
+import functools
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from async_engine import get_engine, running_engine
+from dest_queue import DestinationQueue, HEALTHY
+from scan_watcher import ScanningObserver
+from trash import move_to_trash, get_reaper
+from snapshots import SnapshotScheduler, atomic_copy
+from chunked_copy import large_file_copy_function
+from stability import StabilityTracker, tail_append_copy_function
+from path_store import PathStore, relative_to_root
+from config_store import path_is_excluded, is_remote
+from profiling import traced, span # Only timing decorators; stdlib-only, and needed as the functions below are defined
+# planner, bidirectional and remote_transport are imported where used, so a task only loads the parts it needs
+
+# --- Filters and Throttling ---
+
+def make_copytree_ignore(source_root, filters):
+    """Builds a ``shutil.copytree`` ignore callable from a task's filters, or None."""
+    if not filters or not (filters.get("include") or filters.get("exclude")):
+        return None
+    def ignore(directory, names):
+        rel_dir = os.path.relpath(directory, source_root)
+        ignored = set()
+        for name in names:
+            rel_path = name if rel_dir == "." else os.path.join(rel_dir, name)
+            if path_is_excluded(rel_path, filters, os.path.isdir(os.path.join(directory, name))):
+                ignored.add(name)
+        return ignored
+    return ignore
+
+class ByteThrottle:
+    """Token bucket limiting copy bandwidth; shared by every copy of one task."""
+
+    def __init__(self, mbps):
+        self.rate = mbps * 1024 * 1024
+        self._allowance = self.rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, num_bytes):
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= num_bytes
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def throttled_copy2(src, dst, throttle=None, chunk_size=1024 * 1024):
+    """``shutil.copy2`` that paces the data through ``throttle`` when one is given."""
+    if throttle is None:
+        return shutil.copy2(src, dst)
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        while True:
+            chunk = fsrc.read(chunk_size)
+            if not chunk:
+                break
+            throttle.consume(len(chunk))
+            fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return dst
+
+def task_copy_function(options):
+    """Returns the file copy function to use for a task's options."""
+    throttle = options.get("throttle") if options else None
+    copy_function = shutil.copy2 if throttle is None else functools.partial(throttled_copy2, throttle=throttle)
+    if options and options.get("large_file_threshold_mb"):
+        copy_function = large_file_copy_function(copy_function, options["large_file_threshold_mb"] * 1024 * 1024,
+                                                 options.get("large_file_verify", "sample"), throttle)
+    if options and options.get("append_tail") and not options.get("versions_keep"):
+        # Appending writes in place, which snapshots cannot allow
+        copy_function = tail_append_copy_function(copy_function, throttle)
+    if options and options.get("versions_keep"):
+        # Snapshots hardlink destination files; never rewrite one in place
+        copy_function = atomic_copy(copy_function)
+    return copy_function
+
+# --- Helper Functions ---
+
+def remove_dest_path(dest_path_root, relative_path, options=None, log_prefix=""):
+    """Removes a destination item, by moving it to the trash when the task keeps deleted items.
+
+    Moving is a single rename however big the tree is; the trash is emptied
+    later by the background reaper. Falls back to deleting in place when the
+    rename is not possible.
+    """
+    full_dest_path = os.path.join(dest_path_root, relative_path)
+    if options and options.get("trash_retention_hours"):
+        try:
+            entry_id = move_to_trash(dest_path_root, relative_path)
+            logging.info(f"{log_prefix}Moved to trash ({entry_id}): {full_dest_path}")
+            return
+        except OSError as e:
+            logging.warning(f"{log_prefix}Could not move {full_dest_path} to trash, deleting it instead: {e}")
+    if os.path.isdir(full_dest_path) and not os.path.islink(full_dest_path):
+        shutil.rmtree(full_dest_path)
+        logging.info(f"{log_prefix}Deleted directory: {full_dest_path}")
+    else:
+        os.remove(full_dest_path)
+        logging.info(f"{log_prefix}Deleted file/link: {full_dest_path}")
+
+@traced("sync_item")
+def sync_item(src_path, dest_path_root, relative_path, app_instance=None, task_id=None, options=None, copy_function=None):
+    """Copies one file or creates one directory on a destination. Returns False if it failed.
+
+    ``copy_function`` is the task's copy function, built once per task; without
+    one it is built from ``options`` for this call.
+    """
+    full_src_path = src_path
+    full_dest_path = os.path.join(dest_path_root, relative_path)
+    dest_parent_dir = os.path.dirname(full_dest_path)
+    log_prefix = f"[Task {task_id}] " if task_id else ""
+
+    try:
+        if not os.path.exists(full_src_path):
+            logging.warning(f"{log_prefix}Source {full_src_path} disappeared before sync.")
+            return True
+        if is_remote(dest_path_root):
+            from remote_transport import remote_sync_item
+            try:
+                remote_sync_item(full_src_path, dest_path_root, relative_path, options)
+                logging.info(f"{log_prefix}Sent: {relative_path} to {dest_path_root}")
+                return True
+            except OSError as e:
+                logging.error(f"{log_prefix}Failed to send {full_src_path} to {dest_path_root}: {e}")
+                return False
+
+        if not os.path.exists(dest_parent_dir):
+            if dest_parent_dir != dest_path_root and dest_parent_dir:
+                 try:
+                     os.makedirs(dest_parent_dir, exist_ok=True)
+                     logging.info(f"{log_prefix}Created parent directory: {dest_parent_dir}")
+                 except OSError as e:
+                     logging.error(f"{log_prefix}Failed to create parent directory {dest_parent_dir}: {e}")
+                     return False
+
+        if os.path.isdir(full_src_path):
+            if not os.path.exists(full_dest_path):
+                try:
+                    os.makedirs(full_dest_path, exist_ok=True)
+                    logging.info(f"{log_prefix}Created directory: {full_dest_path}")
+                except OSError as e:
+                     logging.error(f"{log_prefix}Failed to create directory {full_dest_path}: {e}")
+                     return False
+        elif os.path.isfile(full_src_path):
+            try:
+                if os.path.isdir(full_dest_path):
+                     logging.warning(f"{log_prefix}Destination {full_dest_path} is a directory, removing before copying file.")
+                     remove_dest_path(dest_path_root, relative_path, options, log_prefix)
+                (copy_function or task_copy_function(options))(full_src_path, full_dest_path)
+                logging.info(f"{log_prefix}Copied: {os.path.basename(full_src_path)} to {dest_path_root}")
+            except Exception as e:
+                 logging.error(f"{log_prefix}Failed to copy file {full_src_path} to {full_dest_path}: {e}")
+                 return False
+        return True
+
+    except Exception as e:
+        logging.error(f"{log_prefix}Error syncing {full_src_path} to {full_dest_path}: {e}")
+        if app_instance:
+             app_instance.after(0, app_instance.update_task_status, task_id, f"Error: Sync failed")
+        return False
+
+@traced("delete_item")
+def delete_item(dest_path_root, relative_path, app_instance=None, task_id=None, options=None):
+    """Removes one item from a destination. Returns False if it failed."""
+    full_dest_path = os.path.join(dest_path_root, relative_path)
+    log_prefix = f"[Task {task_id}] " if task_id else ""
+    try:
+        if is_remote(dest_path_root):
+            from remote_transport import remote_delete_item
+            remote_delete_item(dest_path_root, relative_path, options)
+            logging.info(f"{log_prefix}Deleted on {dest_path_root}: {relative_path}")
+        elif os.path.lexists(full_dest_path):
+            remove_dest_path(dest_path_root, relative_path, options, log_prefix)
+        return True
+    except Exception as e:
+        logging.error(f"{log_prefix}Error deleting {full_dest_path}: {e}")
+        if app_instance:
+             app_instance.after(0, app_instance.update_task_status, task_id, f"Error: Delete failed")
+        return False
+
+# --- Watchdog Event Handler ---
+_UNNORMALIZED = frozenset((".", "..", "")) # Path components that need normpath (a dotfile name is fine)
+
+class SyncEventHandler(FileSystemEventHandler):
+    def __init__(self, task_id, source_root, destination_roots, app_instance, engine=None, options=None, copy_function=None):
+        super().__init__()
+        self.task_id = task_id
+        self.source_root = os.path.abspath(source_root)
+        self._root_prefix = self.source_root if self.source_root.endswith(os.sep) else self.source_root + os.sep
+        self.destination_roots = [d if is_remote(d) else os.path.abspath(d) for d in destination_roots]
+        self.app = app_instance
+        self.engine = engine
+        self.options = options or {}
+        self.filters = self.options.get("filters")
+        self.copy_function = copy_function or task_copy_function(self.options)
+        self.dest_queues = [] # Set by run_sync_task; one DestinationQueue per destination
+        self.stability = None # StabilityTracker holding files that are still being written
+        self.event_count = 0 # Reported in worker process metrics
+        self.log_prefix = f"[Task {self.task_id}] "
+        logging.info(f"{self.log_prefix}EventHandler initialized for source: {self.source_root}")
+
+    def operation(self, op, relative_path, src_path, dest_root):
+        """Returns ``(func, args)`` carrying out a queued operation against one destination."""
+        # Destination queues retry failures and report health themselves, so no app is passed
+        if op == "delete":
+            return delete_item, (dest_root, relative_path, None, self.task_id, self.options)
+        return sync_item, (src_path, dest_root, relative_path, None, self.task_id, self.options, self.copy_function)
+
+    def _submit(self, op, relative_path, src_path=None):
+        # Coalesced per path and destination; each queue applies it at its own pace (through the engine, if any)
+        for dest_queue in self.dest_queues:
+            dest_queue.put(relative_path, op, src_path)
+
+    def _get_relative_path(self, src_path):
+        # Fast path: event paths are built from the watched root, so a prefix slice is enough
+        relative_path = relative_to_root(src_path, self._root_prefix)
+        if relative_path is not None and (relative_path == "." or _UNNORMALIZED.isdisjoint(relative_path.split(os.sep))):
+            return relative_path
+        src_path_norm = os.path.normpath(src_path)
+        source_root_norm = os.path.normpath(self.source_root)
+        if src_path_norm == source_root_norm:
+            return "."
+        try:
+            if not src_path_norm.startswith(source_root_norm + os.sep) and src_path_norm != source_root_norm :
+                 logging.warning(f"{self.log_prefix}Event path {src_path_norm} seems outside source root {source_root_norm}. Ignoring.")
+                 return None
+            return os.path.relpath(src_path_norm, source_root_norm)
+        except ValueError as e:
+            logging.error(f"{self.log_prefix}Could not get relative path for {src_path_norm} based on {source_root_norm}: {e}")
+            return None
+
+    @traced("handler.process")
+    def process(self, event_type, event):
+        src_path = getattr(event, 'src_path', None)
+        dest_path = getattr(event, 'dest_path', None)
+
+        if event.is_directory and event_type == "modified":
+            logging.debug(f"{self.log_prefix}Ignoring directory modification: {src_path}")
+            return
+        if src_path and os.path.abspath(src_path) == self.source_root and event_type not in ["deleted", "moved_from"]:
+            logging.debug(f"{self.log_prefix}Ignoring event on source root directory itself: {event_type} {src_path}")
+            return
+
+        self.event_count += 1
+        logging.debug(f"{self.log_prefix}Raw Event: type={event_type}, src={src_path}, dest={dest_path}, is_dir={event.is_directory}")
+
+        path_to_process = src_path
+        relative_path = None
+        relative_path_del = None
+
+        if event_type.startswith("moved"):
+             relative_path_del = self._get_relative_path(src_path)
+             path_to_process = dest_path
+             relative_path = self._get_relative_path(path_to_process)
+        else:
+             path_to_process = src_path
+             relative_path = self._get_relative_path(path_to_process)
+             relative_path_del = relative_path
+
+        if relative_path is None and not event_type == "deleted":
+             if not (event_type == "moved_from" and relative_path_del is not None):
+                logging.warning(f"{self.log_prefix}Could not determine relative path for {path_to_process}. Skipping event.")
+                return
+
+        logging.info(f"{self.log_prefix}{event_type.capitalize()}: {relative_path if relative_path is not None else 'N/A'}"
+                     f"{' -> ' + self._get_relative_path(dest_path) if event_type.startswith('moved') and dest_path else ''}"
+                     f" (Is Dir: {event.is_directory})")
+
+        if event_type == "deleted" or event_type == "moved_from":
+            if relative_path_del is None:
+                 logging.warning(f"{self.log_prefix}Cannot process delete/move_from for invalid relative path from {src_path}.")
+                 return
+            if path_is_excluded(relative_path_del, self.filters, event.is_directory):
+                 logging.debug(f"{self.log_prefix}Filtered out: {relative_path_del}")
+                 return
+            if self.stability is not None:
+                 self.stability.forget(relative_path_del)
+            self._submit("delete", relative_path_del)
+        elif event_type == "created" or event_type == "modified" or event_type == "moved_to":
+            if relative_path is None:
+                 logging.warning(f"{self.log_prefix}Cannot process create/modify/move_to for invalid relative path from {path_to_process}.")
+                 return
+            if path_is_excluded(relative_path, self.filters, event.is_directory):
+                 logging.debug(f"{self.log_prefix}Filtered out: {relative_path}")
+                 return
+            if not os.path.exists(path_to_process): # Check existence before syncing
+                 logging.warning(f"{self.log_prefix}Source {path_to_process} not found shortly after {event_type} event.")
+            elif self.stability is not None and not event.is_directory and event_type != "moved_to":
+                 # Still being written; a rename into place means the writer is done
+                 self.stability.hold(relative_path, path_to_process)
+            else:
+                 self._submit("sync", relative_path, path_to_process)
+
+    def on_created(self, event):
+        logging.debug(f"{self.log_prefix}on_created triggered for: {event.src_path}")
+        self.process("created", event)
+
+    def on_deleted(self, event):
+        logging.debug(f"{self.log_prefix}on_deleted triggered for: {event.src_path}")
+        self.process("deleted", event)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            logging.debug(f"{self.log_prefix}on_modified triggered for file: {event.src_path}")
+            self.process("modified", event)
+        else:
+            logging.debug(f"{self.log_prefix}Ignoring on_modified for directory: {event.src_path}")
+
+    def on_closed(self, event):
+        # Writer closed the file (IN_CLOSE_WRITE); only releases files held as unstable, so it is not counted
+        # as an event (held paths already passed the filters)
+        if self.stability is None or event.is_directory:
+            return
+        relative_path = self._get_relative_path(event.src_path)
+        if relative_path is not None and self.stability.closed(relative_path, event.src_path):
+            logging.debug(f"{self.log_prefix}Closed: {relative_path}")
+
+    def on_moved(self, event):
+        logging.debug(f"{self.log_prefix}on_moved triggered: {event.src_path} -> {event.dest_path}")
+        self.process("moved_from", event)
+        self.process("moved_to", event)
+
+# --- Task Runtime ---
+# Shared by the GUI worker threads and the worker processes in process_pool.py.
+# The host must provide after(ms, func, *args) and update_task_status(task_id, status).
+
+def run_sync_task(host, task_id, task_info):
+    """Runs a task's initial sync, then watches its source until the stop event is set.
+
+    A destination whose initial sync fails does not stop the task: its queue
+    starts out degraded (or offline) and re-runs the initial sync once the
+    destination is usable, while the other destinations carry on.
+
+    With ``task_info["checkpoint"]`` set to a file, the initial sync compares
+    the source with the checkpoint of the last run instead of the
+    destinations, and a new checkpoint is written when the task stops.
+    """
+    if task_info.get("mode") == "two_way":
+        return run_two_way_task(host, task_id, task_info)
+    from planner import PLAN_WORKERS, TreeIndex, compute_plan, execute_plan, take_cached_plan, load_checkpoint, save_checkpoint
+    source_path = task_info["source"]
+    dest_paths = task_info["dests"]
+    # sync:// destinations are written through their agent; plans and the async engine work on local trees only
+    local_dests = [d for d in dest_paths if not is_remote(d)]
+    checkpoint_file = task_info.get("checkpoint")
+    stop_event = task_info["stop_event"]
+    engine = get_engine() if task_info.get("engine") == "async" else None
+    log_prefix = f"[Task {task_id}] "
+    observer_ref = None
+    dest_queues = []
+    versions = None
+    stability = None
+    task_info["throttle"] = ByteThrottle(task_info["throttle_mbps"]) if task_info.get("throttle_mbps") else None
+    copy_function = task_copy_function(task_info)
+    ignore = make_copytree_ignore(source_path, task_info.get("filters"))
+    if task_info.get("trash_retention_hours"):
+        for dest_path in local_dests: # An agent reaps its own trash
+            get_reaper().register(dest_path, task_info["trash_retention_hours"])
+
+    @traced("initial_sync_to")
+    def initial_sync_to(dest_path):
+        if is_remote(dest_path):
+            from remote_transport import remote_initial_sync
+            filters = task_info.get("filters")
+            errors = remote_initial_sync(source_path, dest_path, lambda rel, is_dir: path_is_excluded(rel, filters, is_dir),
+                                         task_info, stop_event)
+            if errors:
+                raise OSError(f"{len(errors)} item(s) failed, first: {errors[0][1]}: {errors[0][2]}")
+        elif engine:
+            errors = engine.run_initial_sync(task_id, source_path, [dest_path], copy_function, ignore,
+                                             workers=task_info.get("workers") or None).result()[dest_path]
+            if errors:
+                raise OSError(f"{len(errors)} item(s) failed, first: {errors[0][0]}: {errors[0][2]}")
+        else:
+            shutil.copytree(source_path, dest_path, dirs_exist_ok=True, copy_function=copy_function, ignore=ignore)
+
+    def report_health(_dest_queue=None):
+        unhealthy = [f"{os.path.basename(q.dest_root) or q.dest_root} {q.state}" for q in dest_queues if q.state != HEALTHY]
+        host.after(0, host.update_task_status, task_id, f"Running ({', '.join(unhealthy)})" if unhealthy else "Running")
+
+    try:
+        logging.info(f"{log_prefix}Worker: Starting initial sync from '{source_path}'...")
+        host.after(0, host.update_task_status, task_id, "Syncing (Initial)...")
+        failed_dests = set()
+        with span("initial_sync"):
+            filters = task_info.get("filters")
+            excluded = lambda rel, is_dir: path_is_excluded(rel, filters, is_dir)
+            # A plan previewed shortly before is executed as is, without walking the trees again
+            with span("initial_sync.plan"):
+                plan = take_cached_plan(task_id, source_path, local_dests) if local_dests else None
+                checkpoint = load_checkpoint(checkpoint_file, source_path, local_dests, filters) if checkpoint_file and local_dests else None
+                if plan is not None:
+                    logging.info(f"{log_prefix}Worker: Executing cached plan from {time.ctime(plan.created)}.")
+                elif checkpoint is not None:
+                    # Only what changed in the source since the last run is synced; those destinations are not walked
+                    baseline, resumed = checkpoint
+                    logging.info(f"{log_prefix}Worker: Resuming {len(resumed)} destination(s) from checkpoint {checkpoint_file}.")
+                    plan = compute_plan(task_id, source_path, resumed, excluded, mirror_deletes=True, baseline=baseline)
+                    others = [d for d in local_dests if d not in resumed]
+                    if others:
+                        plan.destinations.update(compute_plan(task_id, source_path, others, excluded,
+                                                              mirror_deletes=task_info.get("mirror_deletes", False)).destinations)
+                elif task_info.get("mirror_deletes") or (task_info.get("workers") and not engine):
+                    # copytree copies one file at a time; a plan honours the task's worker count
+                    plan = compute_plan(task_id, source_path, local_dests, excluded,
+                                        mirror_deletes=task_info.get("mirror_deletes", False))
+
+            if plan is not None:
+                remove = functools.partial(remove_dest_path, options=task_info, log_prefix=log_prefix)
+                for dest_path in local_dests:
+                    logging.info(f"{log_prefix}Worker: {plan.destinations[dest_path].summary()} for '{dest_path}'")
+                    errors = execute_plan(plan, dest_path, copy_function, remove, stop_event,
+                                          workers=task_info.get("workers") or PLAN_WORKERS)
+                    if errors is None:
+                        logging.info(f"{log_prefix}Worker: Stop requested during initial sync for {dest_path}.")
+                        host.after(0, host.update_task_status, task_id, "Stopped")
+                        return
+                    if errors:
+                        for src, dst, error in errors[:10]:
+                            logging.error(f"{log_prefix}Worker: Error during initial sync '{src}' -> '{dst}': {error}")
+                        failed_dests.add(dest_path)
+            elif engine and local_dests:
+                results = engine.wait(engine.run_initial_sync(task_id, source_path, local_dests, copy_function, ignore,
+                                                                workers=task_info.get("workers") or None), stop_event, task_id)
+                if results is None:
+                    logging.info(f"{log_prefix}Worker: Stop requested during async initial sync.")
+                    host.after(0, host.update_task_status, task_id, "Stopped")
+                    return
+                for dest_path, errors in results.items():
+                    if errors:
+                        for src, dst, error in errors[:10]:
+                            logging.error(f"{log_prefix}Worker: Error during initial sync '{src}' -> '{dst}': {error}")
+                        failed_dests.add(dest_path)
+            serial_dests = dest_paths if plan is None and not engine else [d for d in dest_paths if is_remote(d)]
+            for dest_path in serial_dests:
+                if stop_event.is_set():
+                    logging.info(f"{log_prefix}Worker: Stop requested during initial sync for {dest_path}.")
+                    host.after(0, host.update_task_status, task_id, "Stopped")
+                    return
+                try:
+                    logging.info(f"{log_prefix}Worker: Performing initial sync: '{source_path}' TO '{dest_path}'")
+                    initial_sync_to(dest_path)
+                    logging.info(f"{log_prefix}Worker: Initial sync to '{dest_path}' finished.")
+                except Exception as e:
+                    logging.error(f"{log_prefix}Worker: Error during initial sync to '{dest_path}': {type(e).__name__} - {e}")
+                    failed_dests.add(dest_path)
+
+        if failed_dests:
+            logging.warning(f"{log_prefix}Worker: Initial sync incomplete for {len(failed_dests)} destination(s); "
+                            f"they will be retried in the background.")
+        else:
+            logging.info(f"{log_prefix}Worker: Initial sync complete.")
+        host.after(0, host.update_task_status, task_id, "Running")
+
+        event_handler = SyncEventHandler(task_id, source_path, dest_paths, host, engine=engine, options=task_info,
+                                         copy_function=copy_function)
+        for index, dest_path in enumerate(event_handler.destination_roots):
+            resync = functools.partial(initial_sync_to, dest_paths[index]) if dest_paths[index] in failed_dests else None
+            dest_queues.append(DestinationQueue(task_id, index, dest_path, event_handler,
+                                                on_state_change=report_health, resync=resync))
+        event_handler.dest_queues = dest_queues
+        if task_info.get("stable_seconds"):
+            stability = StabilityTracker(task_id, task_info["stable_seconds"],
+                                         lambda rel, src: event_handler._submit("sync", rel, src), stop_event)
+            event_handler.stability = stability
+            stability.start()
+        task_info["dest_queues"] = dest_queues
+        for dest_queue in dest_queues:
+            dest_queue.start()
+        if task_info.get("versions_keep"):
+            local_queues = [q for q in dest_queues if not is_remote(q.dest_root)] # Agents keep no snapshots
+            versions = SnapshotScheduler(task_id, local_queues, task_info["versions_keep"],
+                                         task_info.get("version_interval_minutes", 60), stop_event)
+            versions.start()
+        # Network shares (NFS/SMB) do not deliver native change notifications
+        observer_ref = ScanningObserver() if task_info.get("watcher") == "scan" else Observer()
+        observer_ref.schedule(event_handler, source_path, recursive=True)
+        observer_ref.name = f"SyncObserver-{task_id}" # Events are handled on this thread; the profiler finds it by task ID
+        task_info["observer"] = observer_ref
+        task_info["handler"] = event_handler
+        observer_ref.start()
+        logging.info(f"{log_prefix}Worker: {type(observer_ref).__name__} started.")
+
+        while not stop_event.is_set():
+            if not observer_ref.is_alive():
+                 logging.warning(f"{log_prefix}Worker: Observer thread unexpectedly stopped.")
+                 host.after(0, host.update_task_status, task_id, "Error: Monitor stopped")
+                 break
+            time.sleep(0.5)
+
+        logging.info(f"{log_prefix}Worker: Loop finished (stop event set or observer died).")
+
+    except Exception as e:
+        logging.error(f"{log_prefix}Worker: Unhandled error: {e}")
+        host.after(0, host.update_task_status, task_id, f"Error: Worker failed")
+    finally:
+        final_index = None
+        if checkpoint_file and observer_ref and observer_ref.is_alive():
+            # Scanned while still watching: a change after this is either synced below or parked
+            try:
+                final_index = TreeIndex(PathStore())
+                with span("checkpoint_scan"):
+                    final_index.scan(source_path, lambda rel, is_dir: path_is_excluded(rel, task_info.get("filters"), is_dir))
+            except OSError as e:
+                logging.error(f"{log_prefix}Worker: Cannot scan source for checkpoint: {e}")
+                final_index = None
+        if observer_ref and observer_ref.is_alive():
+            try:
+                logging.info(f"{log_prefix}Worker: Stopping observer in finally block...")
+                observer_ref.stop()
+                observer_ref.join(timeout=5)
+                if observer_ref.is_alive():
+                     logging.warning(f"{log_prefix}Worker: Observer thread did not join within timeout.")
+                else:
+                     logging.info(f"{log_prefix}Worker: Observer joined successfully.")
+            except Exception as e:
+                 logging.error(f"{log_prefix}Worker: Exception joining observer in finally: {e}")
+        stop_event.set() # Also set when the observer died on its own
+        for dest_queue in dest_queues:
+            dest_queue.stop()
+        if engine:
+            engine.cancel_task(task_id) # Also unblocks a resync waiting on the engine
+        for dest_queue in dest_queues:
+            dest_queue.join(timeout=10)
+        if versions:
+            versions.join(timeout=10)
+        if stability is not None:
+            stability.join(timeout=5)
+        if final_index is not None:
+            unsynced = set(stability.held_paths()) if stability is not None else set()
+            synced_dests = []
+            for dest_queue in dest_queues:
+                unsynced.update(dest_queue.parked_paths())
+                if dest_queue.resync is None and not is_remote(dest_queue.dest_root):
+                    synced_dests.append(dest_queue.dest_root)
+            try:
+                save_checkpoint(checkpoint_file, source_path, synced_dests, final_index, task_info.get("filters"), unsynced)
+                logging.info(f"{log_prefix}Worker: Checkpoint for {len(synced_dests)} destination(s) written to "
+                             f"{checkpoint_file} ({len(unsynced)} path(s) left to sync).")
+            except OSError as e:
+                logging.error(f"{log_prefix}Worker: Could not write checkpoint {checkpoint_file}: {e}")
+
+def run_two_way_task(host, task_id, task_info):
+    """Runs a two-way task: reconciles source and destination, then watches both until stopped."""
+    stop_event = task_info["stop_event"]
+    log_prefix = f"[Task {task_id}] "
+    if len(task_info["dests"]) != 1:
+        logging.error(f"{log_prefix}Worker: Two-way sync needs exactly one destination.")
+        host.after(0, host.update_task_status, task_id, "Error: Two-way needs one destination")
+        return
+    if is_remote(task_info["dests"][0]):
+        logging.error(f"{log_prefix}Worker: Two-way sync needs a local destination to watch.")
+        host.after(0, host.update_task_status, task_id, "Error: Two-way needs a local destination")
+        return
+    from bidirectional import TwoWaySync, TwoWayEventHandler
+    source_path, dest_path = task_info["source"], task_info["dests"][0]
+    task_info["throttle"] = ByteThrottle(task_info["throttle_mbps"]) if task_info.get("throttle_mbps") else None
+    # Written through a temp file so the other side's watcher never sees a half-copied file
+    copy_function = atomic_copy(task_copy_function(dict(task_info, append_tail=False, versions_keep=0)))
+    filters = task_info.get("filters")
+    sync = TwoWaySync(task_id, source_path, dest_path, copy_function,
+                      functools.partial(remove_dest_path, options=task_info, log_prefix=log_prefix),
+                      task_info.get("conflict_policy"), lambda rel, is_dir: path_is_excluded(rel, filters, is_dir))
+    observers = []
+    stability = None
+    try:
+        logging.info(f"{log_prefix}Worker: Reconciling '{source_path}' <-> '{dest_path}'...")
+        host.after(0, host.update_task_status, task_id, "Syncing (Initial)...")
+        os.makedirs(dest_path, exist_ok=True)
+        if not sync.load_state():
+            logging.info(f"{log_prefix}Worker: No saved two-way state; files that differ are treated as conflicts.")
+        with span("initial_sync"):
+            reconciled = sync.reconcile(stop_event=stop_event)
+        if not reconciled:
+            logging.info(f"{log_prefix}Worker: Stop requested during reconciliation.")
+            host.after(0, host.update_task_status, task_id, "Stopped")
+            return
+        sync.save_state()
+        logging.info(f"{log_prefix}Worker: Reconciled ({sync.copied} copied, {sync.deleted} deleted, "
+                     f"{sync.conflicts} conflicts).")
+        host.after(0, host.update_task_status, task_id, "Running")
+
+        if task_info.get("stable_seconds"):
+            stability = StabilityTracker(task_id, task_info["stable_seconds"], lambda key, src: sync.notify(key[1]), stop_event)
+            sync.stability = stability
+            stability.start()
+        sync.start()
+        for side, root in enumerate(sync.roots):
+            observer = ScanningObserver() if task_info.get("watcher") == "scan" else Observer()
+            observer.schedule(TwoWayEventHandler(sync, side), root, recursive=True)
+            observer.name = f"SyncObserver-{task_id}-{side}"
+            observers.append(observer)
+        task_info["observer"] = observers[0]
+        task_info["two_way"] = sync
+        for observer in observers:
+            observer.start()
+        logging.info(f"{log_prefix}Worker: Watching both sides.")
+
+        while not stop_event.is_set():
+            if not all(observer.is_alive() for observer in observers):
+                 logging.warning(f"{log_prefix}Worker: Observer thread unexpectedly stopped.")
+                 host.after(0, host.update_task_status, task_id, "Error: Monitor stopped")
+                 break
+            time.sleep(0.5)
+    except Exception as e:
+        logging.error(f"{log_prefix}Worker: Unhandled error: {e}")
+        host.after(0, host.update_task_status, task_id, f"Error: Worker failed")
+    finally:
+        stop_event.set()
+        for observer in observers:
+            if observer.is_alive():
+                observer.stop()
+                observer.join(timeout=5)
+        if sync.is_alive():
+            sync.stop()
+            sync.join(timeout=10)
+        if stability is not None:
+            stability.join(timeout=5)
+
+def stop_task_runtime(task_id, task_info):
+    """Signals a running task to stop: sets its stop event, stops its observer and cancels queued async ops."""
+    if "stop_event" in task_info:
+        task_info["stop_event"].set()
+    observer = task_info.get("observer")
+    if observer and observer.is_alive():
+        try:
+            observer.stop()
+        except Exception as e:
+            logging.error(f"Error requesting observer stop for task {task_id}: {e}")
+    engine = running_engine() if task_info.get("engine") == "async" else None
+    if engine:
+        engine.cancel_task(task_id)
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+import pytest
+
+from async_engine import AsyncSyncEngine
+
+
+@pytest.fixture
+def engine():
+    engine = AsyncSyncEngine(max_workers=8, per_dest_limit=4)
+    engine.start()
+    yield engine
+    engine.shutdown()
+
+
+def test_operations_on_one_path_and_its_parents_run_in_order(engine):
+    order = []
+
+    def op(name, delay):
+        time.sleep(delay)
+        order.append(name)
+
+    futures = [engine.submit("T", "/dst", op, "dir", 0.1, key="d"),
+               engine.submit("T", "/dst", op, "file", 0.0, key="d/f"),
+               engine.submit("T", "/dst", op, "file again", 0.0, key="d/f")]
+    for future in futures:
+        future.result(10)
+    assert order == ["dir", "file", "file again"]
+
+
+def test_operations_on_a_directory_wait_for_operations_below_it(engine):
+    order = []
+
+    def op(name, delay):
+        time.sleep(delay)
+        order.append(name)
+
+    futures = [engine.submit("T", "/dst", op, "copy d/sub/f", 0.2, key=os.path.join("d", "sub", "f")),
+               engine.submit("T", "/dst", op, "copy d/g", 0.1, key=os.path.join("d", "g")),
+               engine.submit("T", "/dst", op, "delete d", 0.0, key="d"),
+               engine.submit("T", "/dst", op, "copy dx", 0.0, key="dx")]
+    for future in futures:
+        future.result(10)
+    assert order.index("delete d") == 3 and order[0] == "copy dx"
+    assert not engine._path_tails and not engine._path_subtree
+
+def test_concurrency_per_destination_is_bounded(engine):
+    lock = threading.Lock()
+    running = [0, 0]  # now, peak
+
+    def op():
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    futures = [engine.submit("T", "/dst", op, key=f"f{i}", limit=2) for i in range(8)]
+    for future in futures:
+        future.result(10)
+    assert running[1] == 2
+
+
+def test_stopping_a_task_cancels_its_queued_operations(engine):
+    release = threading.Event()
+    ran = []
+    first = engine.submit("T", "/dst", release.wait, key="a")
+    queued = [engine.submit("T", "/dst", ran.append, i, key="a") for i in range(3)]
+    stop_event = threading.Event()
+    stop_event.set()
+    assert engine.wait(queued[0], stop_event, "T", poll_interval=0.05) is None
+    release.set()
+    time.sleep(0.2)
+    assert first.cancelled() and all(future.cancelled() for future in queued)
+    assert ran == []
+
+
+def test_initial_sync_copies_the_tree_to_every_destination(engine, tmp_path):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    (src / "d" / "a.txt").write_text("a")
+    (src / "b.txt").write_text("b")
+    dests = [str(tmp_path / "one"), str(tmp_path / "two")]
+    result = engine.wait(engine.run_initial_sync("T", str(src), dests), threading.Event(), "T")
+    assert result == {dests[0]: [], dests[1]: []}
+    for dest in dests:
+        assert (tmp_path / dest / "d" / "a.txt").read_text() == "a"
+        assert (tmp_path / dest / "b.txt").read_text() == "b"
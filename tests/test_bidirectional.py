@@ -0,0 +1,96 @@
+import os
+import shutil
+
+import pytest
+
+from bidirectional import TwoWaySync
+
+
+def _remove(root, relative_path):
+    path = os.path.join(root, relative_path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+@pytest.fixture
+def make_sync(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+
+    def make(policy="newer_wins"):
+        return TwoWaySync("TW", str(src), str(dst), shutil.copy2, _remove, policy=policy, state_dir=str(tmp_path / "state"))
+
+    return src, dst, make
+
+
+def _write(path, text, mtime):
+    path.write_text(text)
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_changes_flow_both_ways_and_echoes_are_dropped(make_sync):
+    src, dst, make = make_sync
+    _write(src / "a.txt", "a", 1000)
+    sync = make()
+    assert sync.reconcile()
+    assert (dst / "a.txt").read_text() == "a"
+
+    _write(dst / "b.txt", "b", 1000)
+    sync.check("b.txt")
+    assert (src / "b.txt").read_text() == "b" and sync.copied == 2
+    sync.check("b.txt") # The event of our own copy on the source
+    assert sync.echoes == 1 and sync.copied == 2
+
+    (dst / "a.txt").unlink()
+    sync.check("a.txt")
+    assert not (src / "a.txt").exists()
+
+    sync.save_state()
+    restarted = make()
+    assert restarted.load_state() and restarted.reconcile()
+    assert restarted.copied == restarted.deleted == restarted.conflicts == 0
+
+
+@pytest.mark.parametrize("policy, kept", [("newer_wins", "dest"), ("source_wins", "source")])
+def test_conflicting_edits_follow_the_policy(make_sync, policy, kept):
+    src, dst, make = make_sync
+    _write(src / "a.txt", "base", 1000)
+    sync = make(policy)
+    sync.reconcile()
+    _write(src / "a.txt", "source", 2000)
+    _write(dst / "a.txt", "dest", 3000)
+    sync.check("a.txt")
+    assert sync.conflicts == 1
+    assert (src / "a.txt").read_text() == (dst / "a.txt").read_text() == kept
+
+
+def test_keep_both_renames_the_older_version(make_sync):
+    src, dst, make = make_sync
+    _write(src / "a.txt", "base", 1000)
+    sync = make("keep_both")
+    sync.reconcile()
+    _write(src / "a.txt", "source", 2000)
+    _write(dst / "a.txt", "dest", 3000)
+    sync.check("a.txt")
+    for root in (src, dst):
+        assert (root / "a.txt").read_text() == "dest"
+        kept = [name for name in os.listdir(str(root)) if name.startswith("a.conflict-source-")]
+        assert len(kept) == 1 and (root / kept[0]).read_text() == "source"
+
+
+@pytest.mark.parametrize("policy", ["newer_wins", "source_wins", "keep_both"])
+def test_file_against_directory_keeps_both(make_sync, policy):
+    src, dst, make = make_sync
+    _write(src / "x", "a file", 5000) # Newer than anything, and on the source
+    (dst / "x").mkdir()
+    _write(dst / "x" / "inner.txt", "inside", 1000)
+    sync = make(policy)
+    sync.reconcile()
+    assert sync.conflicts == 1
+    for root in (src, dst):
+        assert (root / "x" / "inner.txt").read_text() == "inside"
+        kept = [name for name in os.listdir(str(root)) if name.startswith("x.conflict-source-")]
+        assert len(kept) == 1 and (root / kept[0]).read_text() == "a file"
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import chunked_copy
+from chunked_copy import VerificationError, chunked_copy as copy_in_chunks, large_file_copy_function
+
+pytestmark = pytest.mark.skipif(not chunked_copy.HAVE_PREAD, reason="chunked copies need os.pread")
+
+
+@pytest.fixture
+def big_file(tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 123))
+    os.utime(str(path), ns=(1_000_000_000, 2_000_000_000))
+    return path
+
+
+@pytest.mark.parametrize("verify", ["hash", "sample", "none"])
+def test_ranges_are_copied_in_parallel_and_verified(tmp_path, big_file, verify):
+    dst = tmp_path / "copy.bin"
+    assert copy_in_chunks(str(big_file), str(dst), verify=verify, threads=4, chunk_size=1024 * 1024 + 7) == str(dst)
+    assert dst.read_bytes() == big_file.read_bytes()
+    assert os.stat(str(dst)).st_mtime_ns == 2_000_000_000
+
+
+@pytest.mark.parametrize("verify", ["hash", "sample"])
+def test_a_corrupted_write_is_detected(tmp_path, big_file, monkeypatch, verify):
+    pwrite = os.pwrite
+
+    def corrupting_pwrite(fd, data, offset):
+        if offset == 0: # Offset 0 is always among the sampled blocks
+            data = bytes([data[0] ^ 0xFF]) + bytes(data[1:])
+        return pwrite(fd, data, offset)
+
+    monkeypatch.setattr(chunked_copy.os, "pwrite", corrupting_pwrite)
+    with pytest.raises(VerificationError):
+        copy_in_chunks(str(big_file), str(tmp_path / "copy.bin"), verify=verify, threads=2, chunk_size=1024 * 1024)
+
+
+def test_only_files_over_the_threshold_are_chunked(tmp_path, big_file):
+    small = tmp_path / "small.txt"
+    small.write_text("small")
+    plain = []
+    copy = large_file_copy_function(lambda src, dst: plain.append(src), threshold_bytes=1024 * 1024)
+    copy(str(small), str(tmp_path / "small-copy.txt"))
+    copy(str(big_file), str(tmp_path / "big-copy.bin"))
+    assert plain == [str(small)]
+    assert (tmp_path / "big-copy.bin").read_bytes() == big_file.read_bytes()
@@ -0,0 +1,46 @@
+import json
+
+from config_store import ConfigStore, TASK_DEFAULTS, SCHEMA_VERSION, normalize_task
+
+
+def test_v1_config_is_migrated_with_opt_in_defaults(tmp_path):
+    path = tmp_path / "sync_config.json"
+    path.write_text(json.dumps({"abc": {"source": "/src", "dests": ["/dst"]}}))
+    tasks = ConfigStore(str(path)).load()
+    assert tasks["abc"]["dests"] == ["/dst"]
+    for field in ("trash_retention_hours", "stable_seconds", "large_file_threshold_mb", "append_tail"):
+        assert not tasks["abc"][field]
+    assert json.loads(path.read_text())["schema_version"] == SCHEMA_VERSION
+
+
+def test_explicit_values_are_kept(tmp_path):
+    path = tmp_path / "sync_config.json"
+    task = {"source": "/src", "dests": ["/dst"], "trash_retention_hours": 24.0, "stable_seconds": 2.0,
+            "large_file_threshold_mb": 256, "append_tail": True, "versions_keep": 3}
+    path.write_text(json.dumps({"schema_version": SCHEMA_VERSION, "tasks": {"chosen": task}}))
+    tasks = ConfigStore(str(path)).load()
+    for field, value in task.items():
+        assert tasks["chosen"][field] == value
+
+
+def test_journal_survives_reload_and_torn_last_line(tmp_path):
+    path = tmp_path / "sync_config.json"
+    store = ConfigStore(str(path))
+    store.load()
+    store.put("a", {"source": "/a", "dests": ["/x"], "trash_retention_hours": 24.0})
+    store.put("b", {"source": "/b", "dests": ["/y"]})
+    store.delete("b")
+    with open(str(path) + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "id": "c"')  # Crash mid-write
+    tasks = ConfigStore(str(path)).load()
+    assert list(tasks) == ["a"]
+    assert tasks["a"]["trash_retention_hours"] == 24.0
+
+
+def test_normalize_task_rejects_bad_values():
+    task = normalize_task({"source": "/s", "dests": ["/d"], "workers": "x", "mode": "sideways",
+                           "large_file_verify": "maybe", "stable_seconds": -3})
+    assert task["workers"] == TASK_DEFAULTS["workers"]
+    assert task["mode"] == "one_way"
+    assert task["large_file_verify"] == TASK_DEFAULTS["large_file_verify"]
+    assert task["stable_seconds"] == 0.0
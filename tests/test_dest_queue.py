@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+import dest_queue
+from dest_queue import DestinationQueue, HEALTHY, OFFLINE
+from sync_core import SyncEventHandler
+
+
+class _Host:
+    def after(self, ms, func, *args):
+        func(*args)
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def queue_for(tmp_path, monkeypatch):
+    monkeypatch.setattr(dest_queue, "RETRY_BASE_DELAY", 0.05)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    queues = []
+
+    def make():
+        handler = SyncEventHandler("T", str(src), [str(dst)], _Host())
+        queue = DestinationQueue("T", 0, str(dst), handler, backlog_dir=str(tmp_path / "backlog"))
+        handler.dest_queues = [queue]
+        queues.append(queue)
+        return queue
+
+    yield src, dst, make
+    for queue in queues:
+        queue.stop()
+        if queue.ident is not None:
+            queue.join(10)
+
+
+def test_backlog_is_replayed_when_an_offline_destination_returns(tmp_path, queue_for):
+    src, dst, make = queue_for
+    states = []
+    queue = make()
+    queue.on_state_change = lambda q: states.append(q.state)
+    queue.start()
+    (src / "a.txt").write_text("a")
+    queue.put("a.txt", "sync", str(src / "a.txt"))
+    _wait_for(lambda: (dst / "a.txt").exists())
+
+    os.rename(str(dst), str(tmp_path / "unmounted"))
+    (src / "b.txt").write_text("b")
+    queue.put("b.txt", "sync", str(src / "b.txt"))
+    (src / "a.txt").unlink()
+    queue.put("a.txt", "delete")
+    _wait_for(lambda: queue.state == OFFLINE)
+    assert queue.parked_paths() == ["b.txt"] # The delete waits in the queue
+
+    os.rename(str(tmp_path / "unmounted"), str(dst))
+    _wait_for(lambda: queue.state == HEALTHY and (dst / "b.txt").exists() and not (dst / "a.txt").exists())
+    assert states == [OFFLINE, HEALTHY]
+    assert queue.parked_paths() == []
+
+
+def test_stopping_keeps_pending_operations_for_the_next_run(queue_for):
+    src, dst, make = queue_for
+    queue = make()
+    (dst / "gone.txt").write_text("old")
+    (src / "new.txt").write_text("new")
+    queue.put("new.txt", "sync", str(src / "new.txt"))
+    queue.put("gone.txt", "delete")
+    queue.stop()
+    queue.run() # Stopped before it started: everything is parked
+    assert sorted(queue.parked_paths()) == ["gone.txt", "new.txt"]
+    queue.put("late.txt", "delete") # Arrives after the queue stopped
+    assert sorted(queue.parked_paths()) == ["gone.txt", "late.txt", "new.txt"]
+
+    # The next run replays the deletes at once; copies are left to its initial sync
+    restarted = make()
+    restarted.start()
+    _wait_for(lambda: not (dst / "gone.txt").exists())
+    assert not (dst / "new.txt").exists()
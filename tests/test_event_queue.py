@@ -0,0 +1,69 @@
+import os
+import threading
+
+from event_queue import SpillingEventQueue
+
+
+def test_overflow_spills_to_disk_and_keeps_order(tmp_path):
+    spill_path = str(tmp_path / "queue.spill")
+    queue = SpillingEventQueue(spill_path, max_items=10)
+    for i in range(100):
+        queue.put(f"f{i}", "sync", f"/src/f{i}")
+    assert len(queue) == 100 and queue.spilled > 0 and os.path.getsize(spill_path) > 0
+    queue.put("late", "delete")
+    taken = [queue.get(timeout=0) for _ in range(101)]
+    assert taken == [(f"f{i}", "sync", f"/src/f{i}") for i in range(100)] + [("late", "delete", None)]
+    assert len(queue) == 0 and queue.get(timeout=0) is None
+    queue.close()
+    assert not os.path.exists(spill_path)
+
+
+def test_newer_operation_replaces_a_pending_one(tmp_path):
+    queue = SpillingEventQueue(str(tmp_path / "queue.spill"))
+    queue.put("a", "sync", "/src/a")
+    queue.put("b", "sync", "/src/b")
+    queue.put("a", "delete")
+    assert len(queue) == 2
+    assert queue.get(timeout=0) == ("b", "sync", "/src/b")
+    assert queue.get(timeout=0) == ("a", "delete", None)
+
+
+def test_byte_budget_and_blocking_get(tmp_path):
+    queue = SpillingEventQueue(str(tmp_path / "queue.spill"), max_bytes=4096)
+    for i in range(50):
+        queue.put(f"f{i}", "sync", "x" * 200)
+    assert queue.spilled > 0
+    for i in range(50):
+        assert queue.get(timeout=0)[0] == f"f{i}"
+
+    got = []
+    reader = threading.Thread(target=lambda: got.append(queue.get(timeout=10)))
+    reader.start()
+    queue.put("wake", "sync")
+    reader.join(10)
+    assert got == [("wake", "sync", None)]
+    queue.close()
+    assert queue.get(timeout=0) is None
+
+
+def test_close_hands_back_what_is_left_and_refuses_later_puts(tmp_path):
+    spill_path = str(tmp_path / "queue.spill")
+    queue = SpillingEventQueue(spill_path, max_items=4)
+    for i in range(6):
+        assert queue.put(f"f{i}", "sync", f"/src/f{i}")
+    assert queue.get(timeout=0) == ("f0", "sync", "/src/f0")
+    assert queue.close() == [(f"f{i}", "sync", f"/src/f{i}") for i in range(1, 6)]
+    assert not queue.put("late", "delete") and len(queue) == 0 and queue.close() == []
+    assert not os.path.exists(spill_path)
+
+
+def test_spilled_entries_are_not_coalesced_but_keep_their_order(tmp_path):
+    queue = SpillingEventQueue(str(tmp_path / "queue.spill"), max_items=4)
+    for i in range(5):
+        queue.put(f"f{i}", "sync", f"/src/f{i}")
+    assert queue.spilled == 3 # f0 to f2
+    queue.put("f0", "delete")
+    assert len(queue) == 6
+    taken = [queue.get(timeout=0) for _ in range(6)]
+    assert taken.index(("f0", "sync", "/src/f0")) < taken.index(("f0", "delete", None)) == 5
+    queue.close()
@@ -0,0 +1,29 @@
+import os
+
+from path_store import ROOT_ID, PathStore, relative_to_root
+
+
+def test_paths_round_trip_and_share_names():
+    store = PathStore()
+    ids = {}
+    for i in range(3000): # Enough to grow the hash table a few times
+        rel_path = os.path.join(f"d{i % 7}", f"sub{i % 3}", f"f{i}.txt")
+        ids[rel_path] = store.add(rel_path)
+    for rel_path, path_id in ids.items():
+        assert store.lookup(rel_path) == path_id
+        assert store.path(path_id) == rel_path
+    assert len(set(ids.values())) == len(ids)
+    assert store.lookup(os.path.join("d0", "missing")) is None
+    assert store.lookup("") == store.add(".") == ROOT_ID
+    sub = store.lookup(os.path.join("d1", "sub2"))
+    assert store.name(sub) == "sub2" and store.path(store.parent(sub)) == "d1"
+    assert store.child(sub, "new.txt", create=False) is None
+    assert store.name_count() == 1 + 7 + 3 + 3000 # "", d*, sub*, f*
+
+
+def test_relative_to_root():
+    root = os.sep + os.path.join("data", "src")
+    prefix = root + os.sep
+    assert relative_to_root(os.path.join(root, "a", "b.txt"), prefix) == os.path.join("a", "b.txt")
+    assert relative_to_root(root, prefix) == "."
+    assert relative_to_root(root + "2" + os.sep + "x", prefix) is None
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from planner import (ThroughputStats, compute_plan, execute_plan, save_plan, take_cached_plan,
+                     save_checkpoint, load_checkpoint, TreeIndex)
+from path_store import PathStore
+
+
+def _write(path, text, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def trees(tmp_path):
+    src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+    _write(os.path.join(src, "a.txt"), "v1", 2000)
+    _write(os.path.join(src, "sub", "b.txt"), "bb", 1000)
+    _write(os.path.join(dst, "moved.txt"), "bb", 1000)
+    os.makedirs(os.path.join(dst, "old"))
+    _write(os.path.join(dst, "extra.txt"), "x", 1000)
+    return src, dst
+
+
+def _throughput(tmp_path):
+    return ThroughputStats(str(tmp_path / "throughput.json"))
+
+
+def test_plan_copies_renames_and_deletes(trees, tmp_path):
+    src, dst = trees
+    plan = compute_plan("t", src, [dst], mirror_deletes=True, throughput=_throughput(tmp_path))
+    dest_plan = plan.destinations[dst]
+    assert dest_plan.copies == [("a.txt", 2)]
+    assert dest_plan.renames == [("moved.txt", os.path.join("sub", "b.txt"))]
+    assert set(dest_plan.deletes) == {"old", "extra.txt"}
+    assert execute_plan(plan, dst, throughput=_throughput(tmp_path)) == []
+    assert sorted(os.listdir(dst)) == ["a.txt", "sub"]
+    assert open(os.path.join(dst, "sub", "b.txt")).read() == "bb"
+
+
+def test_cached_plan_is_rejected_after_in_place_edit(trees, tmp_path):
+    src, dst = trees
+    plan_dir = str(tmp_path / "plans")
+    save_plan(compute_plan("t", src, [dst], throughput=_throughput(tmp_path)), plan_dir)
+    with open(os.path.join(src, "a.txt"), "w") as f:  # Same directory mtime, new content
+        f.write("v2")
+    assert take_cached_plan("t", src, [dst], plan_dir=plan_dir) is None
+
+
+def test_cached_plan_is_reused_when_nothing_changed(trees, tmp_path):
+    src, dst = trees
+    plan_dir = str(tmp_path / "plans")
+    save_plan(compute_plan("t", src, [dst], throughput=_throughput(tmp_path)), plan_dir)
+    plan = take_cached_plan("t", src, [dst], plan_dir=plan_dir)
+    assert plan is not None and sorted(plan.destinations[dst].copies) == [("a.txt", 2), (os.path.join("sub", "b.txt"), 2)]
+    assert take_cached_plan("t", src, [dst], plan_dir=plan_dir) is None  # Taken once
+
+
+def test_scan_does_not_descend_into_symlinked_directories(tmp_path):
+    root = tmp_path / "tree"
+    _write(str(root / "d" / "f.txt"), "f")
+    os.symlink(str(root), str(root / "d" / "loop"))
+    os.symlink(str(tmp_path), str(root / "outside"))
+    index = TreeIndex(PathStore())
+    index.scan(str(root))
+    indexed = {index.paths.path(i) for i in range(1, len(index.kinds)) if index.kinds[i]}
+    assert indexed == {"d", os.path.join("d", "f.txt")}
+    assert {index.paths.path(i) for i in index.linked_dirs} == {os.path.join("d", "loop"), "outside"}
+
+
+def test_symlinked_files_are_synced_and_never_mirror_deleted(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    _write(str(src / "real.txt"), "real", 1000)
+    _write(str(tmp_path / "elsewhere" / "inner.txt"), "inner", 1000)
+    os.symlink("real.txt", str(src / "link.txt"))
+    os.symlink(str(tmp_path / "elsewhere"), str(src / "linked_dir"))
+    _write(str(dst / "linked_dir" / "inner.txt"), "inner", 1000)
+    plan = compute_plan("t", str(src), [str(dst)], mirror_deletes=True, throughput=_throughput(tmp_path))
+    dest_plan = plan.destinations[str(dst)]
+    assert sorted(dest_plan.copies) == [("link.txt", 4), ("real.txt", 4)]
+    assert dest_plan.deletes == [] and dest_plan.replace == []
+    assert execute_plan(plan, str(dst), throughput=_throughput(tmp_path)) == []
+
+    # Copied like copy2 does: the target's content and mtime, so the next plan finds nothing to do
+    assert not os.path.islink(str(dst / "link.txt")) and (dst / "link.txt").read_text() == "real"
+    again = compute_plan("t", str(src), [str(dst)], mirror_deletes=True, throughput=_throughput(tmp_path))
+    assert again.destinations[str(dst)].operations() == []
+    assert (dst / "linked_dir" / "inner.txt").exists()
+
+
+def test_checkpoint_baseline_plans_only_changes(trees, tmp_path):
+    src, dst = trees
+    index = TreeIndex(PathStore())
+    index.scan(src)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    save_checkpoint(checkpoint, src, [dst], index, unsynced=[os.path.join("sub", "b.txt")])
+    _write(os.path.join(src, "new.txt"), "n")
+    baseline, covered = load_checkpoint(checkpoint, src, [dst])
+    plan = compute_plan("t", src, covered, mirror_deletes=True, baseline=baseline, throughput=_throughput(tmp_path))
+    dest_plan = plan.destinations[dst]
+    # The destination is not walked: extra.txt is left alone, the unsynced file is copied again
+    assert sorted(dest_plan.copies) == [("new.txt", 1), (os.path.join("sub", "b.txt"), 2)]
+    assert dest_plan.deletes == [] and dest_plan.unchanged == 1
+    assert load_checkpoint(checkpoint, src, [dst], filters={"include": [], "exclude": ["*.log"]}) is None
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from config_store import normalize_task
+from process_pool import TaskProcessPool
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_for(pool, predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    seen = []
+    while time.monotonic() < deadline:
+        seen.extend(pool.poll())
+        if predicate(seen):
+            return seen
+        time.sleep(0.05)
+    pytest.fail(f"timed out; messages: {seen}")
+
+
+def test_task_runs_in_a_worker_process(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    (src / "a.txt").write_text("a")
+    config = normalize_task({"source": str(src), "dests": [str(dst)]})
+    pool = TaskProcessPool(1)
+    pool.start()
+    try:
+        assert pool.start_task("T", config) == 0
+        _wait_for(pool, lambda seen: ("status", "T", "Running") in seen)
+        assert (dst / "a.txt").read_text() == "a"
+        (src / "b.txt").write_text("b")
+        deadline = time.monotonic() + 10
+        while not (dst / "b.txt").exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert (dst / "b.txt").read_text() == "b"
+        metrics = _wait_for(pool, lambda seen: any(m[0] == "metrics" and "T" in m[2]["tasks"] for m in seen))
+        task_metrics = [m[2]["tasks"]["T"] for m in metrics if m[0] == "metrics" and "T" in m[2]["tasks"]][-1]
+        assert task_metrics["unhealthy"] == 0
+        assert pool.stop_task("T")
+        seen = _wait_for(pool, lambda seen: ("finished", "T") in seen)
+        time.sleep(0.5)
+        seen.extend(pool.poll())
+        # Status updates the task queued go out first, so "finished" is the last word
+        assert not [m for m in seen[seen.index(("finished", "T")):] if m[0] == "status" and m[1] == "T"]
+        assert pool.loads()[0]["tasks"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_reimporting_the_app_as_a_worker_main_skips_gui_setup():
+    # Spawned workers import sync_app as __mp_main__; that must not configure customtkinter
+    pytest.importorskip("customtkinter")
+    script = ("import runpy, sys\n"
+              "import customtkinter as ctk\n"
+              "calls = []\n"
+              "ctk.set_appearance_mode = lambda *a: calls.append(a)\n"
+              "ctk.set_default_color_theme = lambda *a: calls.append(a)\n"
+              "runpy.run_path('sync_app.py', run_name='__mp_main__')\n"
+              "print('gui setup' if calls else 'no gui setup')\n")
+    out = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True, timeout=60)
+    assert "no gui setup" in out.stdout, out.stderr
@@ -0,0 +1,56 @@
+import pstats
+import threading
+
+import profiling
+
+
+def test_spans_are_recorded_only_while_enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+    profiling.reset_span_stats()
+
+    @profiling.traced("work")
+    def work():
+        return 42
+
+    assert work() == 42
+    with profiling.span("block"):
+        pass
+    assert profiling.span_stats() == {}
+
+    profiling.enable()
+    assert work() == 42
+    with profiling.span("block"):
+        pass
+    with profiling.span("block"):
+        pass
+    stats = profiling.span_stats()
+    assert stats["work"]["count"] == 1
+    assert stats["block"]["count"] == 2
+    assert "block" in profiling.span_report()
+    profiling.reset_span_stats()
+
+
+def test_sampling_profiler_writes_loadable_profiles(tmp_path):
+    stop = threading.Event()
+
+    def busy():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy, name="SyncWorker-T1")
+    worker.start()
+    try:
+        profiler = profiling.SamplingProfiler(duration=0.2, thread_filter="T1", interval=0.002)
+        profiler.start()
+        profiler.join()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profiler.samples > 0
+    profiler.write_pstats(tmp_path / "p.pstats")
+    profiler.write_collapsed(tmp_path / "p.collapsed")
+    stats = pstats.Stats(str(tmp_path / "p.pstats"))
+    assert any(func == "busy" for _, _, func in stats.stats)
+    lines = (tmp_path / "p.collapsed").read_text().splitlines()
+    assert lines and all(line.startswith("SyncWorker-T1;") for line in lines)
@@ -0,0 +1,105 @@
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+import planner
+import remote_transport
+from config_store import normalize_task
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Host:
+    def after(self, ms, func, *args):
+        func(*args)
+
+    def update_task_status(self, task_id, status):
+        pass
+
+
+@pytest.fixture
+def agent(tmp_path):
+    server = remote_transport.AgentServer(str(tmp_path / "agent"), "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_dry_run_plans_local_and_remote_without_watchdog(tmp_path, agent):
+    src = tmp_path / "src"
+    (src / "d").mkdir(parents=True)
+    (src / "d" / "a.txt").write_text("a")
+    url = f"sync://127.0.0.1:{agent.server_address[1]}"
+    script = ("import runpy, sys\n"
+              f"sys.argv = ['real_time_sync.py', '--dry-run', {str(src)!r}, {str(tmp_path / 'dst')!r}, {url!r}]\n"
+              "try:\n    runpy.run_path('real_time_sync.py', run_name='__main__')\n"
+              "except SystemExit:\n    pass\n"
+              "print('watchdog loaded' if any(m.startswith('watchdog') for m in sys.modules) else 'no watchdog')\n")
+    out = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True, timeout=60).stdout
+    assert "no watchdog" in out
+    assert f"{url}:\n  1 copies, 1 new directories" in out
+    assert not (tmp_path / "dst").exists() and not os.listdir(str(tmp_path / "agent"))
+
+
+def _run_until_watching(task_info, changes=None):
+    import sync_core
+    done = threading.Event()
+    host = _Host()
+    host.update_task_status = lambda task_id, status: status == "Running" and done.set()
+    worker = threading.Thread(target=sync_core.run_sync_task, args=(host, "cli-test", task_info))
+    worker.start()
+    assert done.wait(30)
+    if changes:
+        changes()
+    task_info["stop_event"].set()
+    worker.join(30)
+
+
+def test_restart_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(planner, "THROUGHPUT_FILE", str(tmp_path / "throughput.json"))
+    src, dst, checkpoint = tmp_path / "src", tmp_path / "dst", str(tmp_path / "checkpoint.json")
+    src.mkdir()
+    dst.mkdir()
+    for i in range(20):
+        (src / f"f{i}.txt").write_text(str(i))
+
+    def task():
+        info = normalize_task({"source": str(src), "dests": [str(dst)], "mirror_deletes": True})
+        info.update(stop_event=threading.Event(), checkpoint=checkpoint)
+        return info
+
+    _run_until_watching(task())
+    assert len(os.listdir(str(dst))) == 20 and os.path.exists(checkpoint)
+    # Changed on the destination only: a resumed start must not look at (or recopy) it
+    marker = dst / "f5.txt"
+    st = os.stat(str(marker))
+    marker.write_text("XX")  # A different size, so walking the destination would recopy it
+    os.utime(str(marker), ns=(st.st_atime_ns, st.st_mtime_ns))
+    (src / "new.txt").write_text("new")
+    (src / "f1.txt").unlink()
+    _run_until_watching(task())
+    assert marker.read_text() == "XX"
+    assert (dst / "new.txt").read_text() == "new" and not (dst / "f1.txt").exists()
+
+
+def test_options_reach_the_task(tmp_path, monkeypatch):
+    from real_time_sync import parse_args
+    args = parse_args(["src", "dst", "--workers", "3", "--large-file-mb", "64", "--verify", "hash"])
+    assert (args.workers, args.large_file_mb, args.verify) == (3, 64, "hash")
+    # --workers also applies to the first full run, which then executes a plan instead of a copytree
+    monkeypatch.setattr(planner, "THROUGHPUT_FILE", str(tmp_path / "throughput.json"))
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    (src / "a.txt").write_text("a")
+    seen = []
+    real_execute_plan = planner.execute_plan
+    monkeypatch.setattr(planner, "execute_plan", lambda *a, **kw: seen.append(kw["workers"]) or real_execute_plan(*a, **kw))
+    info = normalize_task({"source": str(src), "dests": [str(dst)], "workers": args.workers})
+    info["stop_event"] = threading.Event()
+    _run_until_watching(info)
+    assert seen == [3] and (dst / "a.txt").read_text() == "a"
@@ -0,0 +1,99 @@
+import os
+import threading
+
+import pytest
+
+import remote_transport
+from remote_transport import AgentServer, RemoteClient, RemoteError, remote_initial_sync
+
+
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+
+    def start(token=None):
+        server = AgentServer(str(tmp_path / "agent"), "127.0.0.1", 0, token=token)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"sync://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_put_list_rename_and_delete(tmp_path, serve):
+    server, url = serve()
+    client = RemoteClient(url)
+    src = tmp_path / "a.txt"
+    src.write_text("hello")
+    os.utime(str(src), ns=(1_000_000_000, 1_000_000_000))
+    client.mkdir("d")
+    client.put(str(src), "d/a.txt")
+    assert (tmp_path / "agent" / "d" / "a.txt").read_text() == "hello"
+    assert sorted(map(tuple, client.list_tree())) == [("d", remote_transport.DIRECTORY, 0, 0),
+                                                    ("d/a.txt", remote_transport.FILE, 5, 1_000_000_000)]
+    client.rename("d/a.txt", "b.txt")
+    assert client.stat("b.txt")["kind"] == remote_transport.FILE
+    client.delete("b.txt")
+    assert client.stat("b.txt")["kind"] == 0
+    client.close()
+
+
+def test_paths_outside_the_root_are_refused(tmp_path, serve):
+    server, url = serve()
+    (tmp_path / "outside").mkdir()
+    os.symlink(str(tmp_path / "outside"), str(tmp_path / "agent" / "link"))
+    src = tmp_path / "a.txt"
+    src.write_text("x")
+    client = RemoteClient(url)
+    for path in ["../escape.txt", "/etc/escape.txt", "d/../../escape.txt", "link/escape.txt"]:
+        with pytest.raises(RemoteError):
+            client.put(str(src), path)
+        with pytest.raises(RemoteError):
+            client.mkdir(path)
+    assert os.listdir(str(tmp_path / "outside")) == []
+    assert not (tmp_path / "escape.txt").exists()
+    client.put(str(src), "ok.txt") # The connection survives refused requests
+    client.close()
+
+
+def test_wrong_token_is_refused(tmp_path, serve, monkeypatch):
+    server, url = serve(token="secret")
+    monkeypatch.setenv(remote_transport.TOKEN_ENV, "wrong")
+    with pytest.raises(PermissionError):
+        RemoteClient(url).mkdir("d")
+    assert not (tmp_path / "agent" / "d").exists()
+    monkeypatch.setenv(remote_transport.TOKEN_ENV, "secret")
+    client = RemoteClient(url)
+    client.mkdir("d")
+    assert (tmp_path / "agent" / "d").is_dir()
+    client.close()
+
+
+def test_initial_sync_pipelines_puts_and_sends_only_changes(tmp_path, serve, monkeypatch):
+    server, url = serve()
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    for i in range(50):
+        (src / "sub" / f"f{i}.txt").write_text(str(i))
+    monkeypatch.setattr(remote_transport, "_clients", {})
+    submits = []
+    submit = RemoteClient.submit
+
+    def counting_submit(self, message, data=None, throttle=None):
+        submits.append((message["op"], len(self._pending)))
+        return submit(self, message, data, throttle)
+
+    monkeypatch.setattr(RemoteClient, "submit", counting_submit)
+    assert remote_initial_sync(str(src), url + "?compress=1") == []
+    assert len(os.listdir(str(tmp_path / "agent" / "sub"))) == 50
+    assert (tmp_path / "agent" / "sub" / "f7.txt").read_text() == "7"
+    assert max(pending for op, pending in submits if op == "put") > 0 # Sent without waiting for replies
+
+    submits.clear()
+    (src / "sub" / "f3.txt").write_text("changed")
+    assert remote_initial_sync(str(src), url + "?compress=1") == []
+    assert [op for op, _ in submits] == ["list", "put"]
+    assert (tmp_path / "agent" / "sub" / "f3.txt").read_text() == "changed"
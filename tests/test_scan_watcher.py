@@ -0,0 +1,73 @@
+import os
+
+from scan_watcher import ScanningObserver
+
+
+class _Recorder:
+    def __init__(self, root):
+        self.root = root
+        self.events = []
+
+    def _record(self, event):
+        self.events.append((event.event_type, os.path.relpath(event.src_path, self.root), event.is_directory))
+
+    on_created = on_deleted = on_modified = _record
+
+
+def _observer(root, full_rescan_every=10):
+    handler = _Recorder(str(root))
+    observer = ScanningObserver(full_rescan_every=full_rescan_every)
+    observer.schedule(handler, str(root))
+    observer._scan(emit=False)
+    return observer, handler
+
+
+def _events(observer, handler):
+    handler.events.clear()
+    observer._scan(emit=True)
+    return sorted(handler.events)
+
+
+def test_changes_are_reported(tmp_path):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "a.txt").write_text("a")
+    (tmp_path / "x").mkdir()
+    observer, handler = _observer(tmp_path, full_rescan_every=1)
+
+    (tmp_path / "d" / "a.txt").write_text("longer")
+    (tmp_path / "d" / "e").mkdir()
+    (tmp_path / "d" / "e" / "b.txt").write_text("b")
+    os.rmdir(str(tmp_path / "x"))
+    (tmp_path / "x").write_text("now a file")
+    events = _events(observer, handler)
+    assert ("modified", os.path.join("d", "a.txt"), False) in events
+    assert ("created", os.path.join("d", "e"), True) in events
+    assert ("created", os.path.join("d", "e", "b.txt"), False) in events
+    assert ("deleted", "x", True) in events and ("created", "x", False) in events
+
+    os.remove(str(tmp_path / "d" / "e" / "b.txt"))
+    os.rmdir(str(tmp_path / "d" / "e"))
+    assert _events(observer, handler) == [("deleted", os.path.join("d", "e"), True)]
+    assert _events(observer, handler) == []
+
+
+def test_path_store_does_not_grow_with_churn(tmp_path):
+    (tmp_path / "keep").mkdir()
+    (tmp_path / "keep" / "k.txt").write_text("k")
+    observer, handler = _observer(tmp_path, full_rescan_every=1)
+    for round_number in range(20):
+        # Unique temp names and directories, gone again by the next scan
+        for i in range(200):
+            (tmp_path / f"tmp{round_number}-{i}").write_text("t")
+        (tmp_path / f"dir{round_number}").mkdir()
+        observer._scan(emit=True)
+        for i in range(200):
+            os.remove(str(tmp_path / f"tmp{round_number}-{i}"))
+        os.rmdir(str(tmp_path / f"dir{round_number}"))
+        observer._scan(emit=True)
+    assert observer._paths.name_count() < 2000 # 4000 names were seen
+    # Still correct after compaction
+    (tmp_path / "keep" / "k.txt").write_text("changed")
+    (tmp_path / "keep" / "sub").mkdir()
+    assert _events(observer, handler) == [("created", os.path.join("keep", "sub"), True),
+                                          ("modified", os.path.join("keep", "k.txt"), False)]
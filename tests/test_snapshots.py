@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import snapshots
+from snapshots import atomic_copy, list_snapshots, prune_snapshots, restore_from_snapshot, take_snapshot
+
+
+def test_snapshots_share_unchanged_files_and_keep_old_versions(tmp_path):
+    dest = tmp_path / "dest"
+    (dest / "d").mkdir(parents=True)
+    (dest / "d" / "same.txt").write_text("same")
+    (dest / "edit.txt").write_text("v1")
+    first, linked, copied = take_snapshot(str(dest))
+    assert (linked, copied) == (2, 0)
+
+    # Synced changes go through atomic_copy, so the snapshotted inode is never written to
+    (tmp_path / "new.txt").write_text("version two")
+    atomic_copy(shutil.copy2)(str(tmp_path / "new.txt"), str(dest / "edit.txt"))
+    second, _, _ = take_snapshot(str(dest))
+    assert list_snapshots(str(dest)) == [first, second]
+
+    root = snapshots.versions_root(str(dest))
+    with open(os.path.join(root, first, "edit.txt")) as f:
+        assert f.read() == "v1"
+    assert os.path.samefile(os.path.join(root, first, "d", "same.txt"), os.path.join(root, second, "d", "same.txt"))
+    assert not os.path.samefile(os.path.join(root, first, "edit.txt"), os.path.join(root, second, "edit.txt"))
+
+    restore_from_snapshot(str(dest), first, "edit.txt")
+    assert (dest / "edit.txt").read_text() == "v1"
+    assert not os.path.samefile(str(dest / "edit.txt"), os.path.join(root, first, "edit.txt"))
+
+    prune_snapshots(str(dest), keep=1)
+    assert list_snapshots(str(dest)) == [second]
+
+
+def test_partial_snapshots_are_ignored_and_pruned(tmp_path):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    (dest / "a.txt").write_text("a")
+    partial = os.path.join(snapshots.versions_root(str(dest)), "20000101-000000" + snapshots.PARTIAL_SUFFIX)
+    os.makedirs(partial)
+    assert list_snapshots(str(dest)) == []
+    name, _, _ = take_snapshot(str(dest))
+    assert list_snapshots(str(dest)) == [name]
+    prune_snapshots(str(dest), keep=5)
+    assert not os.path.exists(partial)
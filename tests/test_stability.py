@@ -0,0 +1,70 @@
+import os
+import time
+import threading
+
+import stability
+from stability import StabilityTracker, append_tail, tail_append_copy_function, APPEND_MIN_BYTES
+
+
+def _write(path, data, mtime=None):
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_grown_file_gets_only_its_tail(tmp_path):
+    src, dst = tmp_path / "src.log", tmp_path / "dst.log"
+    prefix = os.urandom(APPEND_MIN_BYTES + 1000)
+    _write(dst, prefix, mtime=1000)
+    _write(src, prefix + b"new lines\n", mtime=2000)
+    assert append_tail(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+    assert os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+
+
+def test_torn_append_is_refused_and_copied_in_full(tmp_path):
+    src, dst = tmp_path / "src.db", tmp_path / "dst.db"
+    old = bytearray(os.urandom(4 * APPEND_MIN_BYTES))
+    _write(dst, bytes(old), mtime=1000)
+    new = bytearray(old)
+    new[len(new) // 2] ^= 0xFF  # Rewritten in the middle, away from the first and last MB
+    _write(src, bytes(new) + b"tail", mtime=2000)
+    assert not append_tail(str(src), str(dst))
+    assert dst.read_bytes() == bytes(old)  # Nothing written
+    copied = []
+    copy = tail_append_copy_function(lambda s, d: copied.append(s) or _write(d, open(s, "rb").read()))
+    copy(str(src), str(dst))
+    assert copied == [str(src)] and dst.read_bytes() == src.read_bytes()
+
+
+def test_destination_newer_than_source_is_not_appended(tmp_path):
+    src, dst = tmp_path / "src.log", tmp_path / "dst.log"
+    prefix = os.urandom(APPEND_MIN_BYTES)
+    _write(dst, prefix, mtime=3000)
+    _write(src, prefix + b"more", mtime=2000)
+    assert not append_tail(str(src), str(dst))
+
+
+def test_tracker_releases_on_close_and_when_quiet(tmp_path, monkeypatch):
+    monkeypatch.setattr(stability, "STABILITY_POLL_INTERVAL", 0.05)
+    released = []
+    stop = threading.Event()
+    tracker = StabilityTracker("t", 0.2, lambda rel, src: released.append(rel), stop)
+    tracker.start()
+    try:
+        quiet, closed = tmp_path / "quiet", tmp_path / "closed"
+        _write(quiet, b"x")
+        _write(closed, b"y")
+        tracker.hold("quiet", str(quiet))
+        tracker.hold("closed", str(closed))
+        assert tracker.closed("closed", str(closed))
+        assert not tracker.closed("closed", str(closed)) and not tracker.closed("never held", str(quiet))
+        assert released == ["closed"]
+        deadline = time.monotonic() + 5
+        while "quiet" not in released and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert released == ["closed", "quiet"] and tracker.held_paths() == []
+    finally:
+        stop.set()
+        tracker.join(5)
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import subprocess
+from collections import deque
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("customtkinter")
+
+
+def test_import_loads_no_task_machinery():
+    script = ("import sys, sync_app\n"
+              "print(sorted(m for m in ('profiling', 'remote_transport', 'sync_core', 'watchdog', 'process_pool')"
+              " if m in sys.modules))\n")
+    out = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip() == "[]", out.stderr
+
+
+def test_clearing_runtime_state_drops_the_last_run():
+    import sync_app
+
+    class FakeApp:
+        sync_tasks = {"T": {"source": "/src", "thread": object(), "observer": object(), "shard": 0,
+                            "stop_event": threading.Event(), "handler": object(), "dest_queues": [object()],
+                            "two_way": object(), "throttle": object()}}
+        update_button_states = lambda self: None
+
+    app = FakeApp()
+    sync_app.SyncApp._clear_task_runtime_state(app, "T")
+    task = app.sync_tasks["T"]
+    assert task["thread"] is None and task["observer"] is None and task["shard"] is None
+    assert not task["stop_event"].is_set()
+    assert not {"handler", "dest_queues", "two_way", "throttle"} & set(task)
+    assert task["source"] == "/src"
+
+
+def test_queued_starts_are_staggered_and_limited():
+    import sync_app
+
+    class FakeApp:
+        queue_task_starts = sync_app.SyncApp.queue_task_starts
+        _pump_start_queue = sync_app.SyncApp._pump_start_queue
+        _note_task_start_progress = sync_app.SyncApp._note_task_start_progress
+        start_task = sync_app.SyncApp.start_task
+
+        def __init__(self):
+            self.sync_tasks = {f"t{i}": {"status": "Stopped", "stop_event": threading.Event()} for i in range(5)}
+            self._start_queue = deque()
+            self._starting_task_ids = set()
+            self._startup_pending_ids = set()
+            self.scheduled = []
+
+        def after(self, ms, func, *args):
+            self.scheduled.append((func, args))
+
+        def run_scheduled(self):
+            scheduled, self.scheduled = self.scheduled, []
+            for func, args in scheduled:
+                func(*args)
+
+        def _start_worker_thread(self, task_id):
+            pass # The worker itself is not under test
+
+        def update_task_status(self, task_id, status):
+            self.sync_tasks[task_id]["status"] = status
+            self._note_task_start_progress(task_id, status)
+
+        def starting(self):
+            return sorted(t for t, info in self.sync_tasks.items() if info["status"] == "Starting...")
+
+    app = FakeApp()
+    app.queue_task_starts(list(app.sync_tasks))
+    assert app.starting() == ["t0"] # The rest start one stagger interval apart
+    app.run_scheduled()
+    assert app.starting() == ["t0", "t1"]
+    app.run_scheduled()
+    assert app.starting() == ["t0", "t1"] # At most MAX_CONCURRENT_STARTS initial syncs at once
+    app.update_task_status("t0", "Running")
+    app.run_scheduled()
+    assert app.starting() == ["t1", "t2"]
+    assert [t for t, info in app.sync_tasks.items() if info["status"] == "Queued"] == ["t3", "t4"]
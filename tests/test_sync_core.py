@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+import time
+import subprocess
+
+import pytest
+from watchdog.events import (DirCreatedEvent, FileClosedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent,
+                             FileMovedEvent)
+
+from async_engine import AsyncSyncEngine
+from dest_queue import DestinationQueue
+from stability import StabilityTracker
+from sync_core import SyncEventHandler, make_copytree_ignore
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Host:
+    def after(self, ms, func, *args):
+        func(*args)
+
+    def update_task_status(self, task_id, status):
+        pass
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def make_handler(tmp_path):
+    queues = []
+
+    def make(engine=None, options=None):
+        src, dst = tmp_path / "src", tmp_path / "dst"
+        src.mkdir()
+        dst.mkdir()
+        handler = SyncEventHandler("T", str(src), [str(dst)], _Host(), engine, options)
+        queue = DestinationQueue("T", 0, str(dst), handler, backlog_dir=str(tmp_path / "backlog"))
+        handler.dest_queues = [queue]
+        queues.append(queue)
+        queue.start()
+        return src, dst, handler
+
+    yield make
+    for queue in queues:
+        queue.stop()
+        queue.join(10)
+
+
+def test_events_are_mirrored_to_the_destination(make_handler):
+    src, dst, handler = make_handler()
+    (src / "sub").mkdir()
+    handler.on_created(DirCreatedEvent(str(src / "sub")))
+    (src / "sub" / "a.txt").write_text("one")
+    handler.on_created(FileCreatedEvent(str(src / "sub" / "a.txt")))
+    _wait_for(lambda: (dst / "sub" / "a.txt").exists() and (dst / "sub" / "a.txt").read_text() == "one")
+
+    (src / "sub" / "a.txt").write_text("two")
+    handler.on_modified(FileModifiedEvent(str(src / "sub" / "a.txt")))
+    _wait_for(lambda: (dst / "sub" / "a.txt").read_text() == "two")
+
+    os.rename(str(src / "sub" / "a.txt"), str(src / "b.txt"))
+    handler.on_moved(FileMovedEvent(str(src / "sub" / "a.txt"), str(src / "b.txt")))
+    _wait_for(lambda: (dst / "b.txt").exists() and not (dst / "sub" / "a.txt").exists())
+    assert (dst / "b.txt").read_text() == "two"
+
+    (src / "b.txt").unlink()
+    handler.on_deleted(FileDeletedEvent(str(src / "b.txt")))
+    _wait_for(lambda: not (dst / "b.txt").exists())
+
+
+def test_filtered_paths_are_not_synced(make_handler):
+    src, dst, handler = make_handler(options={"filters": {"include": [], "exclude": ["*.tmp"]}})
+    (src / "keep.txt").write_text("k")
+    (src / "skip.tmp").write_text("s")
+    handler.on_created(FileCreatedEvent(str(src / "skip.tmp")))
+    handler.on_created(FileCreatedEvent(str(src / "keep.txt")))
+    _wait_for(lambda: (dst / "keep.txt").exists())
+    assert sorted(os.listdir(str(dst))) == ["keep.txt"]
+    ignore = make_copytree_ignore(str(src), {"include": [], "exclude": ["*.tmp"]})
+    assert ignore(str(src), ["keep.txt", "skip.tmp"]) == {"skip.tmp"}
+
+
+def test_destination_queues_apply_events_through_the_engine(make_handler):
+    engine = AsyncSyncEngine(max_workers=4, per_dest_limit=4)
+    try:
+        src, dst, handler = make_handler(engine=engine)
+        submitted = []
+        engine_submit = engine.submit
+        engine.submit = lambda *args, **kwargs: submitted.append(kwargs["key"]) or engine_submit(*args, **kwargs)
+        (src / "a.txt").write_text("a")
+        handler.on_created(FileCreatedEvent(str(src / "a.txt")))
+        _wait_for(lambda: (dst / "a.txt").exists())
+        (src / "a.txt").unlink()
+        handler.on_deleted(FileDeletedEvent(str(src / "a.txt")))
+        _wait_for(lambda: not (dst / "a.txt").exists())
+        assert submitted == ["a.txt", "a.txt"]
+    finally:
+        engine.shutdown()
+
+
+def test_stopping_an_async_task_does_not_start_the_engine(monkeypatch):
+    import async_engine
+    from sync_core import stop_task_runtime
+    monkeypatch.setattr(async_engine, "_engine", None)
+    stop_task_runtime("T", {"engine": "async", "stop_event": threading.Event()})
+    assert async_engine._engine is None
+
+
+def test_relative_paths_keep_dotfiles_and_normalize_dot_components(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    handler = SyncEventHandler("T", str(src), [str(tmp_path / "dst")], _Host())
+    assert handler._get_relative_path(os.path.join(str(src), ".git", "HEAD")) == os.path.join(".git", "HEAD")
+    assert handler._get_relative_path(os.path.join(str(src), "a", ".", "b")) == os.path.join("a", "b")
+    assert handler._get_relative_path(os.path.join(str(src), "a", "..", "b")) == "b"
+    assert handler._get_relative_path(os.path.join(str(src), "a") + os.sep * 2 + "b") == os.path.join("a", "b")
+    assert handler._get_relative_path(str(src)) == "."
+
+
+def test_close_events_only_release_held_files(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_text("a")
+    handler = SyncEventHandler("T", str(src), [str(tmp_path / "dst")], _Host())
+    handler.stability = StabilityTracker("T", 60, lambda rel, path: released.append(rel), threading.Event())
+    released = []
+    handler.on_closed(FileClosedEvent(str(src / "a.txt")))
+    assert released == [] and handler.event_count == 0
+    handler.on_modified(FileModifiedEvent(str(src / "a.txt")))
+    assert handler.stability.held_paths() == ["a.txt"] and handler.event_count == 1
+    handler.on_closed(FileClosedEvent(str(src / "a.txt")))
+    assert released == ["a.txt"] and handler.event_count == 1
+
+
+def test_import_leaves_optional_subsystems_unloaded():
+    script = ("import sys, sync_core\n"
+              "print(sorted(m for m in ('bidirectional', 'planner', 'remote_transport') if m in sys.modules))\n")
+    out = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip() == "[]", out.stderr
@@ -0,0 +1,52 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import trash
+from sync_core import remove_dest_path
+
+
+def _tree(root):
+    (root / "big" / "a").mkdir(parents=True)
+    for i in range(20):
+        (root / "big" / "a" / f"f{i}.txt").write_text(str(i))
+    (root / "big" / "b.txt").write_text("b")
+
+
+def test_delete_moves_to_trash_and_restores(tmp_path):
+    _tree(tmp_path)
+    remove_dest_path(str(tmp_path), "big", {"trash_retention_hours": 1})
+    assert not (tmp_path / "big").exists()
+    [(entry_id, relative_path, _)] = trash.list_trash(str(tmp_path))
+    assert relative_path == "big"
+
+    (tmp_path / "big").mkdir()
+    with pytest.raises(FileExistsError):
+        trash.restore(str(tmp_path), entry_id)
+    assert trash.restore(str(tmp_path), entry_id, overwrite=True) == "big"
+    assert len(os.listdir(str(tmp_path / "big" / "a"))) == 20
+    assert trash.list_trash(str(tmp_path)) == []
+
+
+def test_delete_without_retention_removes_in_place(tmp_path):
+    _tree(tmp_path)
+    remove_dest_path(str(tmp_path), "big", {"trash_retention_hours": 0})
+    assert not (tmp_path / "big").exists() and not os.path.exists(trash.trash_root(str(tmp_path)))
+
+
+def test_reaper_empties_only_expired_entries(tmp_path):
+    _tree(tmp_path)
+    (tmp_path / "recent.txt").write_text("r")
+    old_id = trash.move_to_trash(str(tmp_path), "big")
+    recent_id = trash.move_to_trash(str(tmp_path), "recent.txt")
+    manifest_path = os.path.join(trash.trash_root(str(tmp_path)), old_id, trash.MANIFEST_NAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"relative_path": "big", "deleted_at": time.time() - 7200}, f)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        trash.TrashReaper()._reap(pool, str(tmp_path), 3600)
+    assert [entry[0] for entry in trash.list_trash(str(tmp_path))] == [recent_id]
+    assert os.listdir(trash.trash_root(str(tmp_path))) == [recent_id]
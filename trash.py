@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+TRASH_DIR_NAME = ".sync_trash"   # Per-destination trash, at the top of the destination
+MANIFEST_NAME = "manifest.json"
+ITEM_NAME = "item"
+REAP_INTERVAL = 60.0             # Seconds between passes of the background deleter
+REAP_WORKERS = 8                 # Parallel deletions per pass
+
+
+def trash_root(dest_root):
+    return os.path.join(dest_root, TRASH_DIR_NAME)
+
+def move_to_trash(dest_root, relative_path):
+    """Moves ``dest_root/relative_path`` into the destination's trash with a single rename.
+
+    Returns the trash entry ID. Raises ``OSError`` if the rename is not
+    possible (e.g. the item sits on another filesystem); callers then delete directly.
+    """
+    full_path = os.path.join(dest_root, relative_path)
+    entry_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    entry_dir = os.path.join(trash_root(dest_root), entry_id)
+    os.makedirs(entry_dir)
+    try:
+        os.rename(full_path, os.path.join(entry_dir, ITEM_NAME))
+    except OSError:
+        os.rmdir(entry_dir)
+        raise
+    with open(os.path.join(entry_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"relative_path": relative_path, "deleted_at": time.time()}, f)
+    return entry_id
+
+def list_trash(dest_root):
+    """Returns ``[(entry_id, relative_path, deleted_at)]`` for a destination, oldest first."""
+    entries = []
+    root = trash_root(dest_root)
+    if not os.path.isdir(root):
+        return entries
+    for entry_id in sorted(os.listdir(root)):
+        manifest = _read_manifest(os.path.join(root, entry_id))
+        if manifest:
+            entries.append((entry_id, manifest["relative_path"], manifest["deleted_at"]))
+    entries.sort(key=lambda entry: entry[2])
+    return entries
+
+def restore(dest_root, entry_id, overwrite=False):
+    """Moves a trashed item back to where it was deleted from. Returns its relative path."""
+    entry_dir = os.path.join(trash_root(dest_root), entry_id)
+    manifest = _read_manifest(entry_dir)
+    if not manifest:
+        raise FileNotFoundError(f"No trash entry {entry_id} in {dest_root}")
+    target = os.path.join(dest_root, manifest["relative_path"])
+    if os.path.lexists(target):
+        if not overwrite:
+            raise FileExistsError(f"{target} already exists")
+        _delete_path(target)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.rename(os.path.join(entry_dir, ITEM_NAME), target)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    return manifest["relative_path"]
+
+def _read_manifest(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _delete_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class TrashReaper(threading.Thread):
+    """Background deleter that empties trash entries older than their destination's retention."""
+
+    def __init__(self, interval=REAP_INTERVAL, workers=REAP_WORKERS):
+        super().__init__(name="TrashReaper", daemon=True)
+        self.interval = interval
+        self.workers = workers
+        self._retention = {}  # dest_root -> seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def register(self, dest_root, retention_hours):
+        with self._lock:
+            self._retention[os.path.abspath(dest_root)] = retention_hours * 3600.0
+        self._wake.set()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="TrashDelete") as pool:
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                with self._lock:
+                    retention = dict(self._retention)
+                for dest_root, keep_seconds in retention.items():
+                    try:
+                        self._reap(pool, dest_root, keep_seconds)
+                    except OSError as e:
+                        logging.error(f"Trash: could not empty trash of {dest_root}: {e}")
+
+    def _reap(self, pool, dest_root, keep_seconds):
+        cutoff = time.time() - keep_seconds
+        expired = [os.path.join(trash_root(dest_root), entry_id)
+                   for entry_id, _, deleted_at in list_trash(dest_root) if deleted_at <= cutoff]
+        if not expired:
+            return
+        # Spread big trees over the pool by deleting their top-level children separately
+        jobs = []
+        for entry_dir in expired:
+            item = os.path.join(entry_dir, ITEM_NAME)
+            if os.path.isdir(item) and not os.path.islink(item):
+                jobs.extend(pool.submit(_delete_path, os.path.join(item, name)) for name in os.listdir(item))
+        for job in jobs:
+            job.result()
+        for entry_dir in expired:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        logging.info(f"Trash: reclaimed {len(expired)} expired item(s) in {dest_root}")
+
+
+# --- Shared Reaper ---
+_reaper = None
+_reaper_lock = threading.Lock()
+
+def get_reaper():
+    global _reaper
+    with _reaper_lock:
+        if _reaper is None:
+            _reaper = TrashReaper()
+            _reaper.start()
+        return _reaper
+
+
+# --- Command Line (list / restore) ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="List or restore items deleted into a destination's sync trash.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List trashed items")
+    list_parser.add_argument("destination")
+    restore_parser = sub.add_parser("restore", help="Restore a trashed item")
+    restore_parser.add_argument("destination")
+    restore_parser.add_argument("entry_id")
+    restore_parser.add_argument("--overwrite", action="store_true", help="Replace an existing item at the original path")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for entry_id, relative_path, deleted_at in list_trash(args.destination):
+            print(f"{entry_id}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(deleted_at))}  {relative_path}")
+    else:
+        try:
+            print(f"Restored {restore(args.destination, args.entry_id, args.overwrite)}")
+        except OSError as e:
+            print(f"Restore failed: {e}")
+            sys.exit(1)